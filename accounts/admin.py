@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, SubscriptionPlan, Subscription, Module, UserModule
+from .models import User, SubscriptionPlan, Subscription, Module, UserModule, OutgoingEmail
 
 
 @admin.register(User)
@@ -42,3 +42,11 @@ class UserModuleAdmin(admin.ModelAdmin):
     list_display = ('user', 'module', 'purchased_at', 'expires_at', 'is_active')
     list_filter = ('is_active', 'module')
     search_fields = ('user__email', 'module__name')
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'recipients')
+    readonly_fields = ('created_at', 'updated_at', 'sent_at')
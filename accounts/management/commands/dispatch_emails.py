@@ -0,0 +1,57 @@
+"""
+Фоновый диспетчер очереди исходящих писем
+
+Использование:
+    python manage.py dispatch_emails            # отправить все ожидающие письма и выйти
+    python manage.py dispatch_emails --loop     # работать постоянно (для systemd)
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from accounts.services.email_outbox import dispatch_pending_emails
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди OutgoingEmail'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, опрашивая очередь',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Пауза между опросами пустой очереди в секундах (по умолчанию 2)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Количество писем в одной пачке (по умолчанию EMAIL_OUTBOX_BATCH_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        loop = options['loop']
+        interval = options['interval']
+        batch_size = options.get('batch_size')
+
+        total_sent = 0
+        total_failed = 0
+        while True:
+            close_old_connections()
+            sent, failed = dispatch_pending_emails(batch_size=batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Отправлено: {sent}, ошибок: {failed}')
+
+            if sent + failed == 0:
+                if not loop:
+                    break
+                time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Очередь обработана. Отправлено: {total_sent}, ошибок: {total_failed}'
+        ))
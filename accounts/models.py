@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 
@@ -73,6 +74,43 @@ class Subscription(models.Model):
         """Проверка валидности подписки"""
         return self.is_active and timezone.now() <= self.end_date and self.remaining_tests > 0
 
+    @classmethod
+    def reserve_tests(cls, user, count=1):
+        """
+        Атомарно списать тесты с активной подписки пользователя
+
+        Выполняется одним условным UPDATE: строка подписки блокируется самой
+        базой, а условие remaining_tests >= count перепроверяется после
+        получения блокировки, поэтому параллельные запросы не уводят
+        остаток в минус. Вызывать внутри transaction.atomic() вместе с
+        созданием сессий - при откате транзакции списание тоже откатится.
+
+        Args:
+            user: пользователь-владелец подписки
+            count: количество списываемых тестов
+
+        Returns:
+            bool: True, если тесты списаны
+        """
+        if count <= 0:
+            return False
+
+        # Самая свежая подписка с достаточным остатком
+        subscription_id = cls.objects.filter(
+            user=user,
+            is_active=True,
+            remaining_tests__gte=count
+        ).order_by('-start_date').values('pk')[:1]
+
+        updated = cls.objects.filter(
+            pk__in=models.Subquery(subscription_id),
+            remaining_tests__gte=count
+        ).update(
+            remaining_tests=F('remaining_tests') - count,
+            updated_at=timezone.now()
+        )
+        return updated == 1
+
 
 class Module(models.Model):
     """Модуль (дополнительный функционал)"""
@@ -107,3 +145,41 @@ class UserModule(models.Model):
 
     def __str__(self):
         return f'{self.user.email} - {self.module.name}'
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди отправки (outbox)"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Ошибка отправки'),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name='Тема')
+    body = models.TextField(verbose_name='Текст письма')
+    from_email = models.CharField(max_length=255, verbose_name='Отправитель')
+    recipients = models.JSONField(default=list, verbose_name='Получатели')
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='Статус')
+    attempts = models.IntegerField(default=0, verbose_name='Попыток отправки')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Следующая попытка')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.recipients)}'
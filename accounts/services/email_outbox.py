@@ -0,0 +1,156 @@
+"""
+Очередь исходящих писем (transactional outbox)
+
+Обработчики запросов не ходят в SMTP: письмо записывается в таблицу
+OutgoingEmail в той же транзакции, что и бизнес-данные, а отправку выполняет
+фоновый диспетчер (команда dispatch_emails) пачками через одно SMTP соединение.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import OutgoingEmail
+from personnel_testing.prometheus_metrics import EMAIL_SEND_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, body, recipients, from_email=None):
+    """
+    Поставить письмо в очередь отправки
+
+    Вызывается внутри транзакции обработчика: если транзакция откатится,
+    письмо не уйдет.
+
+    Args:
+        subject: тема письма
+        body: текст письма
+        recipients: список адресов получателей
+        from_email: отправитель (по умолчанию DEFAULT_FROM_EMAIL)
+
+    Returns:
+        OutgoingEmail: созданная запись
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject[:255],
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+    )
+
+
+def enqueue_emails(messages):
+    """
+    Поставить в очередь пачку писем одним INSERT
+
+    Args:
+        messages: список кортежей (тема, текст, отправитель, [получатели]) - как в send_mass_mail
+    """
+    return OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(
+            subject=subject[:255],
+            body=body,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            recipients=list(recipients),
+        )
+        for subject, body, from_email, recipients in messages
+    ], batch_size=500)
+
+
+def _retry_delay(attempts):
+    """Экспоненциальная задержка перед повторной попыткой"""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE_SECONDS', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def dispatch_pending_emails(batch_size=None, max_attempts=None):
+    """
+    Отправить пачку ожидающих писем через одно SMTP соединение
+
+    Строки блокируются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько диспетчеров могут работать параллельно, не отправляя одно
+    письмо дважды.
+
+    Returns:
+        tuple: (отправлено, ошибок)
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    max_attempts = max_attempts or getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+
+    sent = 0
+    failed = 0
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if not emails:
+            return 0, 0
+
+        connection = get_connection(fail_silently=False)
+        connection_error = None
+        try:
+            connection.open()
+        except Exception as e:
+            connection_error = e
+            logger.error(f'[Email outbox] Не удалось подключиться к SMTP: {type(e).__name__}: {e}')
+
+        now = timezone.now()
+        try:
+            for email in emails:
+                error = connection_error
+                if error is None:
+                    message = EmailMessage(
+                        email.subject,
+                        email.body,
+                        email.from_email,
+                        email.recipients,
+                        connection=connection,
+                    )
+                    started = time.perf_counter()
+                    try:
+                        if not connection.send_messages([message]):
+                            error = Exception('Email backend не отправил письмо')
+                    except Exception as e:
+                        error = e
+                    EMAIL_SEND_LATENCY.labels('sent' if error is None else 'error').observe(
+                        time.perf_counter() - started
+                    )
+
+                email.attempts += 1
+                email.updated_at = now
+                if error is None:
+                    email.status = OutgoingEmail.STATUS_SENT
+                    email.sent_at = now
+                    email.last_error = ''
+                    sent += 1
+                else:
+                    email.last_error = f'{type(error).__name__}: {error}'
+                    if email.attempts >= max_attempts:
+                        email.status = OutgoingEmail.STATUS_FAILED
+                    else:
+                        email.next_attempt_at = now + _retry_delay(email.attempts)
+                    failed += 1
+                    logger.error(
+                        f'[Email outbox] Ошибка отправки письма {email.pk} '
+                        f'(попытка {email.attempts}/{max_attempts}): {email.last_error}'
+                    )
+        finally:
+            if connection_error is None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+        OutgoingEmail.objects.bulk_update(
+            emails,
+            ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'updated_at']
+        )
+
+    return sent, failed
@@ -5,10 +5,11 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.utils.crypto import get_random_string
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from .models import User, Subscription, SubscriptionPlan, Module, UserModule
 from .serializers import UserSerializer, SubscriptionSerializer, SubscriptionPlanSerializer
+from .services.email_outbox import enqueue_email
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -21,17 +22,16 @@ class UserViewSet(viewsets.ModelViewSet):
         """Регистрация нового пользователя"""
         serializer = self.get_serializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            user = serializer.save()
-            
-            # Отправка email с подтверждением
-            verification_link = f"{settings.SITE_URL}/verify-email/{user.email_verification_token}/"
-            send_mail(
-                'Подтверждение регистрации',
-                f'Перейдите по ссылке для подтверждения: {verification_link}',
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=False,
-            )
+            with transaction.atomic():
+                user = serializer.save()
+                
+                # Письмо с подтверждением ставится в очередь в той же транзакции
+                verification_link = f"{settings.SITE_URL}/verify-email/{user.email_verification_token}/"
+                enqueue_email(
+                    'Подтверждение регистрации',
+                    f'Перейдите по ссылке для подтверждения: {verification_link}',
+                    [user.email],
+                )
             
             return Response({'message': 'Регистрация успешна. Проверьте email для подтверждения.'}, 
                           status=status.HTTP_201_CREATED)
@@ -1,5 +1,14 @@
 # Конфигурация Gunicorn для продакшн
 import multiprocessing
+import os
+import re
+
+from decouple import config
+
+# ASGI_MODE=True в .env: воркеры uvicorn и personnel_testing.asgi, завершение
+# теста и скачивание PDF обслуживают асинхронные представления (tests/async_views.py),
+# и ожидание ответа Gemini не занимает процесс
+ASGI_MODE = config('ASGI_MODE', default=False, cast=bool)
 
 # Базовые настройки
 bind = "unix:/var/www/personnel_testing/personnel_testing.sock"
@@ -7,7 +16,14 @@ bind = "unix:/var/www/personnel_testing/personnel_testing.sock"
 cpu_count = multiprocessing.cpu_count()
 workers = min(cpu_count * 2 + 1, 4)  # Максимум 4 воркера
 
-worker_class = "sync"
+if ASGI_MODE:
+    wsgi_app = "personnel_testing.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "personnel_testing.wsgi:application"
+    worker_class = "sync"
+# Действует только для асинхронных воркеров gevent/eventlet; sync обрабатывает
+# один запрос за раз, uvicorn ограничения числа соединений не имеет
 worker_connections = 1000
 timeout = 300  # Увеличить таймаут до 5 минут для длинных запросов к Gemini API
 keepalive = 2
@@ -33,3 +49,38 @@ preload_app = True
 # Максимальное количество запросов перед перезапуском воркера
 max_requests = 1000
 max_requests_jitter = 50
+
+# Метрики Prometheus (personnel_testing/prometheus_metrics.py): воркеры пишут
+# значения в файлы общего каталога, /metrics суммирует их. Каталог задается
+# до загрузки приложения (preload_app) и должен совпадать у всех процессов,
+# включая диспетчер писем и expire_sessions (см. systemd_*.example).
+# Заданный в окружении каталог должен уже существовать и быть доступен на
+# запись пользователю всех этих сервисов; каталог по умолчанию создается здесь
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    PROMETHEUS_MULTIPROC_DIR = os.environ['PROMETHEUS_MULTIPROC_DIR']
+else:
+    PROMETHEUS_MULTIPROC_DIR = os.environ['PROMETHEUS_MULTIPROC_DIR'] = '/var/www/personnel_testing/prometheus'
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def on_starting(server):
+    # Файлы завершившихся процессов от прошлых запусков больше не нужны;
+    # файлы живых процессов (диспетчер писем) не трогаем
+    for name in os.listdir(PROMETHEUS_MULTIPROC_DIR):
+        match = re.search(r'_(\d+)\.db$', name)
+        if not match:
+            continue
+        try:
+            os.kill(int(match.group(1)), 0)
+        except ProcessLookupError:
+            os.remove(os.path.join(PROMETHEUS_MULTIPROC_DIR, name))
+        except PermissionError:
+            pass
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
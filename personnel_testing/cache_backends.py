@@ -0,0 +1,37 @@
+"""
+Cache backends с подсчетом попаданий и промахов для метрик запросов
+
+Ведут себя как стандартные RedisCache и LocMemCache; чтения учитываются
+в personnel_testing.request_metrics (Server-Timing и журнал
+RequestMetricsMiddleware), если запрос выбран для сбора метрик.
+"""
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from .request_metrics import record_cache_lookup
+
+_MISSING = object()
+
+
+class _CountingGetMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            record_cache_lookup(0, 1)
+            return default
+        record_cache_lookup(1)
+        return value
+
+
+class InstrumentedRedisCache(_CountingGetMixin, RedisCache):
+    def get_many(self, keys, version=None):
+        # RedisCache.get_many читает одним запросом, минуя get
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        record_cache_lookup(len(found), len(keys) - len(found))
+        return found
+
+
+class InstrumentedLocMemCache(_CountingGetMixin, LocMemCache):
+    # get_many базового класса вызывает get для каждого ключа
+    pass
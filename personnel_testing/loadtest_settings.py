@@ -0,0 +1,31 @@
+"""
+Настройки для нагрузочного тестирования (manage.py loadtest)
+
+Те же настройки, что и в продакшн, но Gemini и SMTP заменены локальными
+заглушками с настраиваемой задержкой и долей ошибок, чтобы прогон не тратил
+квоту API и не рассылал письма. Сервер запускается с этим модулем:
+    DJANGO_SETTINGS_MODULE=personnel_testing.loadtest_settings gunicorn -c gunicorn_config.py ...
+(подробнее в DEPLOYMENT.md, раздел «Нагрузочное тестирование»).
+"""
+from decouple import config
+
+from .settings import *  # noqa: F401,F403
+
+# Заглушка LLM (tests/services/llm_providers.py); задержка по умолчанию близка
+# к ответу Gemini на промпт отчета
+LLM_PROVIDER = config('LLM_PROVIDER', default='fake')
+LLM_FAKE_LATENCY_MS = config('LLM_FAKE_LATENCY_MS', default=8000, cast=int)
+LLM_FAKE_LATENCY_SIGMA = config('LLM_FAKE_LATENCY_SIGMA', default=0.3, cast=float)
+# LLM_HEDGE_PROVIDER из .env продакшн не действует: иначе медленные ответы
+# заглушки дублировались бы в настоящий API. Хеджирование под нагрузкой
+# проверяется с основным gemini через fake_gemini_server и
+# LOADTEST_HEDGE_PROVIDER=fake
+LLM_HEDGE_PROVIDER = config('LOADTEST_HEDGE_PROVIDER', default='')
+
+# Заглушка SMTP для диспетчера писем (personnel_testing/mail_backends.py)
+EMAIL_BACKEND = 'personnel_testing.mail_backends.FakeSMTPEmailBackend'
+LOADTEST_SMTP_LATENCY_MS = config('LOADTEST_SMTP_LATENCY_MS', default=300, cast=int)
+LOADTEST_SMTP_FAILURE_RATE = config('LOADTEST_SMTP_FAILURE_RATE', default=0.0, cast=float)
+
+# Кэш ответов Gemini исказил бы время завершения теста
+GEMINI_RESPONSE_CACHE_TTL = 0
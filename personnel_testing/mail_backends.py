@@ -0,0 +1,197 @@
+"""
+Email backends: пул постоянных SMTP соединений и заглушка для нагрузочного теста
+
+Стандартный smtp.EmailBackend на каждую отправку заново открывает TCP
+соединение, выполняет STARTTLS и AUTH, что для Gmail стоит сотни миллисекунд.
+Этот backend возвращает соединение в пул процесса вместо QUIT и выдает его
+следующему отправителю, проверяя живость командой NOOP.
+
+Подключение в .env:
+    EMAIL_BACKEND=personnel_testing.mail_backends.PooledSMTPEmailBackend
+
+FakeSMTPEmailBackend ничего не отправляет, а только имитирует задержку и
+ошибки SMTP сервера (personnel_testing/loadtest_settings.py).
+"""
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends import smtp
+from django.core.mail.backends.base import BaseEmailBackend
+
+logger = logging.getLogger(__name__)
+
+
+class _ConnectionPool:
+    """Пул SMTP соединений одного сервера с ограничением на число соединений"""
+
+    def __init__(self, size):
+        self.size = size
+        self.semaphore = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []  # [(connection, время возврата в пул)]
+
+    def checkout(self, idle_timeout):
+        """Взять живое соединение из пула или None"""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection, released_at = self.idle.pop()
+
+            if time.monotonic() - released_at > idle_timeout:
+                _quit(connection)
+                continue
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            _quit(connection)
+
+    def checkin(self, connection):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append((connection, time.monotonic()))
+                return
+        _quit(connection)
+
+
+def _quit(connection):
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, OSError):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = None
+
+
+def _get_pool(key):
+    """Пул для параметров сервера; после fork воркера пулы создаются заново"""
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _ConnectionPool(getattr(settings, 'EMAIL_POOL_SIZE', 4))
+            _pools[key] = pool
+        return pool
+
+
+class PooledSMTPEmailBackend(smtp.EmailBackend):
+    """SMTP backend, переиспользующий авторизованные соединения между отправками"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = _get_pool((
+            self.host, self.port, self.username, self.use_tls, self.use_ssl,
+        ))
+        self._slot_acquired = False
+
+    def open(self):
+        if self.connection:
+            return False
+
+        wait = getattr(settings, 'EMAIL_POOL_WAIT_SECONDS', 30)
+        if not self._pool.semaphore.acquire(timeout=wait):
+            if not self.fail_silently:
+                raise smtplib.SMTPException(
+                    f'Нет свободного SMTP соединения в пуле за {wait} секунд'
+                )
+            return None
+        self._slot_acquired = True
+
+        connection = self._pool.checkout(getattr(settings, 'EMAIL_POOL_IDLE_SECONDS', 60))
+        if connection is not None:
+            self.connection = connection
+            return True
+
+        try:
+            opened = super().open()
+        except Exception:
+            self._release_slot()
+            raise
+        if not opened:
+            self._release_slot()
+        return opened
+
+    def close(self):
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        try:
+            self._pool.checkin(connection)
+        finally:
+            self._release_slot()
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        new_conn_created = self.open()
+        if not self.connection:
+            return 0
+        try:
+            # По одному письму: при обрыве повторяется только письмо, на
+            # котором он случился, а не уже отправленные
+            return sum(self._send_with_reconnect(message) for message in email_messages)
+        finally:
+            if new_conn_created:
+                self.close()
+
+    def _send_with_reconnect(self, message):
+        try:
+            return super().send_messages([message])
+        except smtplib.SMTPServerDisconnected:
+            # Сервер закрыл соединение из пула - переподключаемся и повторяем один раз
+            logger.warning('[SMTP pool] Соединение разорвано сервером, переподключение')
+            self._discard_connection()
+            if self.open() is None:
+                return 0
+            return super().send_messages([message])
+
+    def _discard_connection(self):
+        if self.connection is not None:
+            _quit(self.connection)
+            self.connection = None
+        self._release_slot()
+
+    def _release_slot(self):
+        if self._slot_acquired:
+            self._slot_acquired = False
+            self._pool.semaphore.release()
+
+
+class FakeSMTPEmailBackend(BaseEmailBackend):
+    """
+    Заглушка SMTP для нагрузочного теста
+
+    На каждое письмо ждет LOADTEST_SMTP_LATENCY_MS и с вероятностью
+    LOADTEST_SMTP_FAILURE_RATE обрывает отправку, как отключившийся сервер;
+    ошибка уходит в очередь писем и проходит обычный путь повторов.
+    """
+
+    def send_messages(self, email_messages):
+        latency = getattr(settings, 'LOADTEST_SMTP_LATENCY_MS', 0) / 1000
+        failure_rate = getattr(settings, 'LOADTEST_SMTP_FAILURE_RATE', 0.0)
+        sent = 0
+        for message in email_messages:
+            if latency:
+                time.sleep(latency)
+            if random.random() < failure_rate:
+                if not self.fail_silently:
+                    raise smtplib.SMTPServerDisconnected('Соединение закрыто сервером (нагрузочный тест)')
+                continue
+            sent += 1
+        return sent
@@ -1,18 +1,143 @@
 """
-Middleware для отключения CSRF проверки для API endpoints
+Middleware проекта: отключение CSRF для API и метрики запросов
 """
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .prometheus_metrics import REQUEST_LATENCY
+from .request_metrics import collect_metrics
+
+metrics_logger = logging.getLogger('personnel_testing.request_metrics')
 
 
 class DisableCSRFForAPI:
     """
     Middleware для отключения CSRF проверки для API endpoints
+
+    Поддерживает и ASGI: иначе Django оборачивает асинхронные представления
+    в синхронный поток, который занят все время ожидания ответа.
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._disable_csrf(request)
+        response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        self._disable_csrf(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def _disable_csrf(request):
         # Отключить CSRF для всех API endpoints
         if request.path.startswith('/api/'):
             setattr(request, '_dont_enforce_csrf_checks', True)
-        response = self.get_response(request)
+
+
+def _view_name(request):
+    """Имя представления (для DRF - basename-действие, например test-session-complete)"""
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class RequestMetricsMiddleware:
+    """
+    Время обработки запроса, число и время запросов к БД, попадания в кэш
+
+    Время каждого запроса попадает в гистограмму Prometheus
+    http_request_duration_seconds (по имени представления). Для доли запросов REQUEST_METRICS_SAMPLE_RATE метрики собираются
+    полностью, возвращаются в заголовке Server-Timing и пишутся в журнал
+    personnel_testing.request_metrics строкой JSON. У остальных запросов
+    измеряется только общее время: в журнал попадают те, что дольше
+    REQUEST_METRICS_SLOW_MS. Работает и в WSGI, и в ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        self.slow_ms = settings.REQUEST_METRICS_SLOW_MS
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        if self._sampled():
+            with collect_metrics() as metrics:
+                response = self.get_response(request)
+        else:
+            metrics = None
+            response = self.get_response(request)
+        return self._finish(request, response, started, metrics)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        # collect_metrics хранит счетчики в contextvar, они доходят и до
+        # запросов к БД из sync_to_async
+        if self._sampled():
+            with collect_metrics() as metrics:
+                response = await self.get_response(request)
+        else:
+            metrics = None
+            response = await self.get_response(request)
+        return self._finish(request, response, started, metrics)
+
+    def _sampled(self):
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def _finish(self, request, response, started, metrics):
+        duration_ms = (time.perf_counter() - started) * 1000
+        view = _view_name(request)
+        REQUEST_LATENCY.labels(view, request.method, str(response.status_code)).observe(duration_ms / 1000)
+
+        if metrics is not None:
+            response['Server-Timing'] = self._server_timing(duration_ms, metrics)
+        if metrics is not None or (self.slow_ms and duration_ms >= self.slow_ms):
+            metrics_logger.info(json.dumps(self._log_record(request, view, response, duration_ms, metrics)))
         return response
+
+    @staticmethod
+    def _server_timing(duration_ms, metrics):
+        return ', '.join([
+            f'app;dur={duration_ms:.1f}',
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"',
+            f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+        ])
+
+    @staticmethod
+    def _log_record(request, view, response, duration_ms, metrics):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 1),
+            'sampled': metrics is not None,
+        }
+        if metrics is not None:
+            record.update({
+                'db_queries': metrics.db_queries,
+                'db_ms': round(metrics.db_time * 1000, 1),
+                'cache_hits': metrics.cache_hits,
+                'cache_misses': metrics.cache_misses,
+            })
+        return record
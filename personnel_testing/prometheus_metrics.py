@@ -0,0 +1,122 @@
+"""
+Метрики Prometheus и endpoint /metrics
+
+Гистограммы времени обработки запросов (по представлениям DRF), вызовов
+Gemini, генерации PDF и отправки писем; счетчики повторов и ответов 429
+Gemini и хеджированных запросов к LLM; глубина очередей (письма в outbox, сессии по статусам) считается
+запросом к БД в момент опроса.
+
+Gunicorn запускает несколько воркеров (preload_app = True), поэтому
+значения пишутся в файлы каталога PROMETHEUS_MULTIPROC_DIR (задается
+в окружении до запуска, см. gunicorn_config.py и systemd_service.example)
+и суммируются по всем процессам при опросе /metrics. Без переменной
+метрики ведутся в памяти процесса (runserver).
+
+Без пакета prometheus_client метрики не собираются, /metrics отвечает 503.
+"""
+import os
+
+from django.http import HttpResponse
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+    )
+    from prometheus_client.core import GaugeMetricFamily
+    from prometheus_client.multiprocess import MultiProcessCollector
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+class _NoopMetric:
+    """Заглушка метрики, если prometheus_client не установлен"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+if PROMETHEUS_AVAILABLE:
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds',
+        'Время обработки запроса',
+        ['view', 'method', 'status'],
+    )
+    GEMINI_LATENCY = Histogram(
+        'gemini_request_duration_seconds',
+        'Время одной попытки вызова Gemini API',
+        ['outcome'],
+        buckets=(1, 2, 5, 10, 20, 30, 60, 90, 120, 180, 300),
+    )
+    GEMINI_RETRIES = Counter(
+        'gemini_retries_total',
+        'Повторы вызова Gemini API',
+        ['reason'],
+    )
+    GEMINI_RATE_LIMITED = Counter(
+        'gemini_rate_limited_total',
+        'Ответы Gemini API о превышении квоты (429)',
+    )
+    PDF_RENDER_LATENCY = Histogram(
+        'pdf_render_duration_seconds',
+        'Время генерации PDF отчета',
+        ['test_type'],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+    )
+    EMAIL_SEND_LATENCY = Histogram(
+        'email_send_duration_seconds',
+        'Время отправки письма из очереди',
+        ['outcome'],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+    )
+    LLM_HEDGED_REQUESTS = Counter(
+        'llm_hedged_requests_total',
+        'Запросы к LLM, продублированные резервному провайдеру, по источнику ответа',
+        ['winner'],
+    )
+else:
+    REQUEST_LATENCY = GEMINI_LATENCY = GEMINI_RETRIES = GEMINI_RATE_LIMITED = _NoopMetric()
+    PDF_RENDER_LATENCY = EMAIL_SEND_LATENCY = LLM_HEDGED_REQUESTS = _NoopMetric()
+
+
+class QueueDepthCollector:
+    """Глубина очередей на момент опроса"""
+
+    def collect(self):
+        from django.db.models import Count
+        from accounts.models import OutgoingEmail
+        from tests.models import TestSession
+
+        outbox = GaugeMetricFamily('email_outbox_pending', 'Письма, ожидающие отправки')
+        outbox.add_metric([], OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_PENDING).count())
+        yield outbox
+
+        sessions = GaugeMetricFamily('test_sessions', 'Сессии тестирования по статусам', labels=['status'])
+        counts = dict(TestSession.objects.order_by().values_list('status').annotate(total=Count('pk')))
+        for status, _ in TestSession.STATUS_CHOICES:
+            sessions.add_metric([status], counts.get(status, 0))
+        yield sessions
+
+
+if PROMETHEUS_AVAILABLE and 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    REGISTRY.register(QueueDepthCollector())
+
+
+def metrics_view(request):
+    """Экспозиция метрик в текстовом формате Prometheus"""
+    if not PROMETHEUS_AVAILABLE:
+        return HttpResponse('prometheus_client не установлен\n', status=503, content_type='text/plain')
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        registry.register(QueueDepthCollector())
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
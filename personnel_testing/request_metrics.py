@@ -0,0 +1,76 @@
+"""
+Метрики обрабатываемого запроса: запросы к БД и обращения к кэшу
+
+Собираются только для запросов, выбранных RequestMetricsMiddleware
+(REQUEST_METRICS_SAMPLE_RATE); для остальных счетчики не ведутся.
+Текущие метрики хранятся в contextvar, а обертка запросов к БД стоит на
+каждом соединении и берет метрики из него. Поэтому учитываются и запросы
+из sync_to_async асинхронных представлений: у потока sync_to_async свои
+соединения, но тот же контекст.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счетчики одного запроса"""
+
+    __slots__ = ('db_queries', 'db_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обертка connection.execute_wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_queries += 1
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def _install_execute_wrapper(connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+connection_created.connect(_install_execute_wrapper)
+
+
+@contextmanager
+def collect_metrics():
+    """Собирать метрики запросов к БД и кэшу внутри блока"""
+    # Соединения, открытые до импорта модуля, не прошли через connection_created
+    for connection in connections.all(initialized_only=True):
+        _install_execute_wrapper(connection)
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def record_cache_lookup(hits, misses=0):
+    """Учесть чтение из кэша (вызывается из personnel_testing.cache_backends)"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
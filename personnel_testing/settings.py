@@ -4,8 +4,9 @@ Django settings for personnel_testing project.
 
 from pathlib import Path
 import os
+import sys
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'personnel_testing.middleware.RequestMetricsMiddleware',  # Server-Timing и журнал метрик
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -174,25 +176,174 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@personnel-testing.com')
 SERVER_EMAIL = DEFAULT_FROM_EMAIL
 
-# Логирование email для отладки
+# Пул SMTP соединений (для EMAIL_BACKEND=personnel_testing.mail_backends.PooledSMTPEmailBackend)
+EMAIL_POOL_SIZE = config('EMAIL_POOL_SIZE', default=4, cast=int)
+EMAIL_POOL_IDLE_SECONDS = config('EMAIL_POOL_IDLE_SECONDS', default=60, cast=int)
+EMAIL_POOL_WAIT_SECONDS = config('EMAIL_POOL_WAIT_SECONDS', default=30, cast=int)
+
+# Очередь исходящих писем (отправляет python manage.py dispatch_emails)
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=50, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = config('EMAIL_OUTBOX_RETRY_BASE_SECONDS', default=60, cast=int)
+
+# Логирование email для отладки (в stderr, чтобы не смешиваться с выводом команд)
 if DEBUG and EMAIL_BACKEND == 'django.core.mail.backends.console.EmailBackend':
-    print("\n" + "="*60)
-    print("EMAIL НАСТРОЙКИ:")
-    print(f"EMAIL_BACKEND: {EMAIL_BACKEND}")
-    print(f"EMAIL_HOST: {EMAIL_HOST}")
-    print(f"EMAIL_PORT: {EMAIL_PORT}")
-    print(f"EMAIL_HOST_USER: {EMAIL_HOST_USER if EMAIL_HOST_USER else '(не задан)'}")
-    print(f"DEFAULT_FROM_EMAIL: {DEFAULT_FROM_EMAIL}")
-    print("\nДля реальной отправки email настройте в .env:")
-    print("EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend")
-    print("EMAIL_HOST=smtp.gmail.com")
-    print("EMAIL_HOST_USER=your-email@gmail.com")
-    print("EMAIL_HOST_PASSWORD=your-app-password")
-    print("="*60 + "\n")
+    print("\n" + "="*60, file=sys.stderr)
+    print("EMAIL НАСТРОЙКИ:", file=sys.stderr)
+    print(f"EMAIL_BACKEND: {EMAIL_BACKEND}", file=sys.stderr)
+    print(f"EMAIL_HOST: {EMAIL_HOST}", file=sys.stderr)
+    print(f"EMAIL_PORT: {EMAIL_PORT}", file=sys.stderr)
+    print(f"EMAIL_HOST_USER: {EMAIL_HOST_USER if EMAIL_HOST_USER else '(не задан)'}", file=sys.stderr)
+    print(f"DEFAULT_FROM_EMAIL: {DEFAULT_FROM_EMAIL}", file=sys.stderr)
+    print("\nДля реальной отправки email настройте в .env:", file=sys.stderr)
+    print("EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend", file=sys.stderr)
+    print("EMAIL_HOST=smtp.gmail.com", file=sys.stderr)
+    print("EMAIL_HOST_USER=your-email@gmail.com", file=sys.stderr)
+    print("EMAIL_HOST_PASSWORD=your-app-password", file=sys.stderr)
+    print("="*60 + "\n", file=sys.stderr)
 
 # OpenAI settings for AI processing
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
 
+# Сколько секунд хранить в кэше ответ Gemini на тот же промпт (0 - не кэшировать).
+# Промпт IQ-теста зависит только от баллов по сериям и возраста, поэтому
+# повторяется часто; попадания видны в журнале LLMCallLog (cache_hit)
+GEMINI_RESPONSE_CACHE_TTL = config('GEMINI_RESPONSE_CACHE_TTL', default=0, cast=int)
+
+# Реестр провайдеров LLM (tests/services/llm_providers.py): класс и таймаут
+# запроса в секундах; таймауты меньше таймаута Gunicorn (300 секунд)
+LLM_PROVIDERS = {
+    'gemini': {
+        'class': 'tests.services.llm_providers.GeminiProvider',
+        'timeout': config('GEMINI_TIMEOUT', default=180, cast=int),
+    },
+    'openai': {
+        'class': 'tests.services.llm_providers.OpenAIProvider',
+        'timeout': config('OPENAI_TIMEOUT', default=120, cast=int),
+    },
+    'fake': {
+        'class': 'tests.services.llm_providers.FakeProvider',
+        'timeout': config('LLM_FAKE_TIMEOUT', default=180, cast=int),
+    },
+}
+# Основной провайдер: gemini, openai или fake (локальная заглушка без сети)
+LLM_PROVIDER = config('LLM_PROVIDER', default='gemini')
+OPENAI_MODEL = config('OPENAI_MODEL', default='gpt-4o-mini')
+
+# Хеджирование (tests/services/llm_hedging.py): если основной провайдер не
+# выдал первый фрагмент ответа за LLM_HEDGE_PERCENTILE времени до первого
+# фрагмента по последним LLM_HEDGE_WINDOW вызовам, запрос дублируется
+# LLM_HEDGE_PROVIDER (пусто - без хеджирования) и берется первый ответ.
+# Пока замеров меньше LLM_HEDGE_MIN_SAMPLES, ожидание LLM_HEDGE_DEFAULT_DELAY_MS
+LLM_HEDGE_PROVIDER = config('LLM_HEDGE_PROVIDER', default='')
+LLM_HEDGE_PERCENTILE = config('LLM_HEDGE_PERCENTILE', default=0.9, cast=float)
+LLM_HEDGE_WINDOW = config('LLM_HEDGE_WINDOW', default=200, cast=int)
+LLM_HEDGE_MIN_SAMPLES = config('LLM_HEDGE_MIN_SAMPLES', default=20, cast=int)
+LLM_HEDGE_DEFAULT_DELAY_MS = config('LLM_HEDGE_DEFAULT_DELAY_MS', default=20000, cast=int)
+# Адрес Gemini API для GeminiProvider (пусто - Google); например,
+# http://127.0.0.1:8090 для локального сервера manage.py fake_gemini_server
+GEMINI_API_ENDPOINT = config('GEMINI_API_ENDPOINT', default='')
+
+# Заглушка FakeProvider: медиана и разброс (sigma логнормального распределения)
+# задержки, доли ответов 429 и таймаутов, сценарий исходов по порядку
+# (например, 429,timeout,ok), зерно генератора для повторяемых прогонов,
+# каталог заготовленных отчетов <тип теста>.md, длина шаблонного отчета
+# и размер фрагмента потоковой выдачи
+LLM_FAKE_LATENCY_MS = config('LLM_FAKE_LATENCY_MS', default=0, cast=int)
+LLM_FAKE_LATENCY_SIGMA = config('LLM_FAKE_LATENCY_SIGMA', default=0.0, cast=float)
+LLM_FAKE_FAILURE_RATE = config('LLM_FAKE_FAILURE_RATE', default=0.0, cast=float)
+LLM_FAKE_TIMEOUT_RATE = config('LLM_FAKE_TIMEOUT_RATE', default=0.0, cast=float)
+LLM_FAKE_SCRIPT = config('LLM_FAKE_SCRIPT', default='', cast=Csv())
+LLM_FAKE_SEED = config('LLM_FAKE_SEED', default='', cast=lambda v: int(v) if v else None)
+LLM_FAKE_RESPONSES_DIR = config('LLM_FAKE_RESPONSES_DIR', default='')
+LLM_FAKE_REPORT_CHARS = config('LLM_FAKE_REPORT_CHARS', default=6000, cast=int)
+LLM_FAKE_CHUNK_CHARS = config('LLM_FAKE_CHUNK_CHARS', default=400, cast=int)
+
+# Допуск после дедлайна сессии (сетевые задержки последнего ответа), секунды
+SESSION_DEADLINE_GRACE_SECONDS = config('SESSION_DEADLINE_GRACE_SECONDS', default=30, cast=int)
+
+# Через сколько секунд незавершенная обработка результатов считается зависшей
+# и может быть перехвачена повторным запросом завершения
+SESSION_PROCESSING_STALE_SECONDS = config('SESSION_PROCESSING_STALE_SECONDS', default=600, cast=int)
+
+# Хранить ответы IQ-теста и теста личностных качеств упакованным массивом
+# на сессии вместо отдельной записи TestAnswer на каждый вопрос
+COMPACT_ANSWER_STORAGE = config('COMPACT_ANSWER_STORAGE', default=False, cast=bool)
+
+# Массовое приглашение (bulk_create_sessions): кандидат, которому этот же тест
+# уже отправлен за последние N секунд, пропускается (повтор запроса,
+# двойное нажатие)
+BULK_INVITATION_DUPLICATE_SECONDS = config('BULK_INVITATION_DUPLICATE_SECONDS', default=600, cast=int)
+
+# Максимум ответов в одной пачке журнала страницы теста (submit_answers)
+ANSWER_JOURNAL_MAX_BATCH = config('ANSWER_JOURNAL_MAX_BATCH', default=200, cast=int)
+
+# Запуск через personnel_testing.asgi с воркерами uvicorn (см. gunicorn_config.py):
+# завершение теста и скачивание PDF обслуживают асинхронные представления
+# tests/async_views.py, ожидание Gemini не занимает поток
+ASGI_MODE = config('ASGI_MODE', default=False, cast=bool)
+
+# Уменьшенные копии изображений вопросов (python manage.py build_question_images):
+# ширины в пикселях и форматы в порядке предпочтения
+QUESTION_IMAGE_WIDTHS = config('QUESTION_IMAGE_WIDTHS', default='480,960', cast=Csv(int))
+QUESTION_IMAGE_FORMATS = config('QUESTION_IMAGE_FORMATS', default='avif,webp', cast=Csv())
+QUESTION_IMAGE_QUALITY = config('QUESTION_IMAGE_QUALITY', default=80, cast=int)
+
+# Манифест изображений теста: сколько следующих вопросов страница теста
+# загружает заранее и сколько секунд манифест хранится в кэше
+QUESTION_IMAGE_PREFETCH_AHEAD = config('QUESTION_IMAGE_PREFETCH_AHEAD', default=5, cast=int)
+QUESTION_ASSET_MANIFEST_TTL = config('QUESTION_ASSET_MANIFEST_TTL', default=300, cast=int)
+
+# Кэш: Redis при заданном REDIS_URL, иначе память процесса
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'personnel_testing.cache_backends.InstrumentedRedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'personnel_testing',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'personnel_testing.cache_backends.InstrumentedLocMemCache',
+        }
+    }
+
+# Кэш состояния сессий тестирования (секунды): общий (CACHES) и в памяти воркера
+SESSION_STATE_CACHE_TTL = config('SESSION_STATE_CACHE_TTL', default=600, cast=int)
+SESSION_STATE_LOCAL_TTL = config('SESSION_STATE_LOCAL_TTL', default=2, cast=float)
+
+# Метрики запросов (personnel_testing.middleware.RequestMetricsMiddleware):
+# доля запросов с полным сбором (число и время запросов к БД, попадания
+# в кэш, заголовок Server-Timing) и порог в миллисекундах, после которого
+# в журнал пишется любой запрос (0 - не писать)
+REQUEST_METRICS_SAMPLE_RATE = config('REQUEST_METRICS_SAMPLE_RATE', default=1.0 if DEBUG else 0.05, cast=float)
+REQUEST_METRICS_SLOW_MS = config('REQUEST_METRICS_SLOW_MS', default=2000, cast=int)
+
+# Метрики запросов пишутся строками JSON в stderr (журнал systemd / errorlog gunicorn)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'request_metrics': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'personnel_testing.request_metrics': {
+            'handlers': ['request_metrics'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Site URL for test links
 SITE_URL = config('SITE_URL', default='http://localhost:8000')
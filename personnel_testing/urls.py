@@ -8,6 +8,8 @@ from django.http import JsonResponse
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .prometheus_metrics import metrics_view
+
 
 def api_root(request):
     """Корневой endpoint для API"""
@@ -38,6 +40,10 @@ urlpatterns = [
     path('api/', api_root, name='api_root'),
     path('api/accounts/', include('accounts.urls')),
     path('api/tests/', include('tests.urls')),
+    # Метрики Prometheus (доступ ограничен в nginx)
+    path('metrics', metrics_view, name='metrics'),
+    # Service worker страницы теста: область действия /test/
+    path('test/sw.js', TemplateView.as_view(template_name='test_sw.js', content_type='application/javascript'), name='test_service_worker'),
     re_path(r'^test/(?P<session_id>[^/]+)/$', TemplateView.as_view(template_name='test_page.html'), name='test_page'),
 ]
 
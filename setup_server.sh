@@ -66,6 +66,19 @@ sudo chmod -R 755 /var/www/personnel_testing
 
 echo "✅ Директории созданы"
 
+# Режим запуска приложения
+echo "⚙️ Режим запуска приложения:"
+echo "  wsgi - синхронные воркеры Gunicorn (по умолчанию)"
+echo "  asgi - воркеры uvicorn: запросы, ожидающие Gemini, не занимают процесс"
+read -p "Режим [wsgi/asgi]: " APP_MODE
+if [ "$APP_MODE" = "asgi" ]; then
+    ASGI_MODE=True
+else
+    ASGI_MODE=False
+fi
+
+echo "✅ Режим: ASGI_MODE=$ASGI_MODE"
+
 # Настройка файрвола
 echo "🔥 Настройка файрвола..."
 sudo ufw allow 22/tcp
@@ -83,7 +96,7 @@ echo "1. Клонируйте репозиторий: cd /var/www/personnel_test
 echo "2. Создайте виртуальное окружение: python3.11 -m venv venv"
 echo "3. Активируйте окружение: source venv/bin/activate"
 echo "4. Установите зависимости: pip install -r requirements.txt"
-echo "5. Создайте .env файл с настройками"
+echo "5. Создайте .env файл с настройками (укажите ASGI_MODE=$ASGI_MODE)"
 echo "6. Примените миграции: python manage.py migrate"
 echo "7. Соберите статические файлы: python manage.py collectstatic"
 echo "8. Настройте Gunicorn и Nginx (см. DEPLOYMENT.md)"
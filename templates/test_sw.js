@@ -0,0 +1,75 @@
+// Service worker страницы теста (/test/<session_id>/)
+//
+// Кэширует вопросы, манифест изображений и сами изображения, чтобы при
+// кратковременной потере связи соискатель мог продолжать тест. Ответы
+// не проходят через service worker: их хранит журнал на странице
+// (localStorage) и отправляет пачками в submit_answers.
+
+const CACHE_VERSION = 'test-page-v1';
+
+self.addEventListener('install', event => {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(
+                keys.filter(key => key.startsWith('test-page-') && key !== CACHE_VERSION)
+                    .map(key => caches.delete(key))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+// Сначала кэш: копии изображений неизменяемы (хэш в имени), исходники меняются редко
+async function cacheFirst(request) {
+    const cache = await caches.open(CACHE_VERSION);
+    const cached = await cache.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+// Сначала сеть, при ее недоступности - последний сохраненный ответ
+async function networkFirst(request) {
+    const cache = await caches.open(CACHE_VERSION);
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request);
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (url.pathname.startsWith('/media/')) {
+        event.respondWith(cacheFirst(request));
+    } else if (/^\/api\/tests\/sessions\/[^/]+\/(questions|assets)\/$/.test(url.pathname)) {
+        event.respondWith(networkFirst(request));
+    } else if (request.mode === 'navigate' && url.pathname.startsWith('/test/')) {
+        event.respondWith(networkFirst(request));
+    }
+});
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Test, TestQuestion, TestSession, TestAnswer, TestResult
+from .models import Test, TestQuestion, TestSession, TestAnswer, TestSessionScore, TestResult, LLMCallLog
 
 
 class TestQuestionInline(admin.TabularInline):
@@ -108,6 +108,12 @@ class TestAnswerAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
 
 
+@admin.register(TestSessionScore)
+class TestSessionScoreAdmin(admin.ModelAdmin):
+    list_display = ('session', 'key', 'points', 'answered')
+    search_fields = ('session__candidate_email', 'key')
+
+
 @admin.register(TestResult)
 class TestResultAdmin(admin.ModelAdmin):
     list_display = ('session', 'raw_score', 'final_score', 'iq_score', 'is_processed', 'created_at')
@@ -135,3 +141,19 @@ class TestResultAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
     )
+
+
+@admin.register(LLMCallLog)
+class LLMCallLogAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'test_type', 'model_name', 'input_tokens', 'output_tokens', 'latency_ms', 'attempts', 'error_class', 'cache_hit')
+    list_filter = ('test_type', 'model_name', 'cache_hit', 'error_class', 'created_at')
+    search_fields = ('prompt_hash', 'session__candidate_email')
+    raw_id_fields = ('session',)
+    date_hierarchy = 'created_at'
+    
+    def has_add_permission(self, request):
+        # Записи создает только call_gemini
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
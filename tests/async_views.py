@@ -0,0 +1,143 @@
+"""
+Асинхронные обработчики для ASGI-режима (ASGI_MODE)
+
+Завершение теста и скачивание PDF дольше всего ждут: первое - ответа
+Gemini, второе - генерации отчета. В ASGI-режиме эти адреса обслуживаются
+здесь, и ожидание не занимает рабочий поток: запрос к Gemini выполняется
+асинхронно, обращения к БД - через sync_to_async, генерация PDF - в
+отдельном пуле потоков. Ответы и коды ошибок совпадают с действиями
+complete и download_pdf TestSessionViewSet.
+"""
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .models import TestSession, TestResult
+from .serializers import TestResultSerializer
+from .services.session_results import aprocess_session_results, save_session_result, ResultProcessingError
+from .utils.pdf_generator import generate_pdf_report
+from .views import is_overdue, pdf_report_response, unclaimed_completion_response
+
+
+def _json_response(data, status_code):
+    # Как JSONRenderer DRF: кириллица без экранирования
+    return JsonResponse(data, status=status_code, json_dumps_params={'ensure_ascii': False})
+
+
+def _exception_response(exc):
+    # Как exception_handler DRF: словарь ошибок как есть, строка - в 'detail'
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return JsonResponse(data, status=exc.status_code, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def _authenticate(request):
+    """Пользователь запроса по аутентификаторам DRF (JWT, сессия)"""
+    drf_request = Request(
+        request,
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    return drf_request.user
+
+
+async def _get_session(pk, user):
+    """Сессия с тестом; авторизованный пользователь видит только свои сессии"""
+    try:
+        pk = uuid.UUID(str(pk))
+    except ValueError:
+        return None
+    queryset = TestSession.objects.select_related('test').filter(pk=pk)
+    if user.is_authenticated:
+        queryset = queryset.filter(user=user)
+    return await queryset.afirst()
+
+
+async def complete_session(request, pk):
+    """Асинхронный вариант TestSessionViewSet.complete"""
+    if request.method != 'POST':
+        return _json_response({'detail': f'Метод "{request.method}" не разрешен.'},
+                              status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except APIException as e:
+        return _exception_response(e)
+
+    session = await _get_session(pk, user)
+    if session is None:
+        return _json_response({'detail': 'Сессия не найдена'}, status.HTTP_404_NOT_FOUND)
+
+    if is_overdue(session):
+        return _json_response({'error': 'Время прохождения теста истекло'}, status.HTTP_400_BAD_REQUEST)
+
+    claimed = await sync_to_async(session.claim_processing)(settings.SESSION_PROCESSING_STALE_SECONDS)
+    if not claimed:
+        data, status_code = await sync_to_async(unclaimed_completion_response)(session)
+        return _json_response(data, status_code)
+
+    try:
+        result_data = await aprocess_session_results(session)
+    except ResultProcessingError as e:
+        await sync_to_async(session.release_processing)()
+        return _json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        await sync_to_async(session.release_processing)()
+        return _json_response({'error': f'Ошибка обработки результатов: {str(e)}'},
+                              status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    if not result_data:
+        await sync_to_async(session.release_processing)()
+        return _json_response({'error': 'Не удалось обработать результаты'},
+                              status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    test_result = await sync_to_async(save_session_result)(session, result_data)
+    data = await sync_to_async(lambda: TestResultSerializer(test_result).data)()
+    return _json_response(data, status.HTTP_201_CREATED)
+
+
+async def download_session_pdf(request, pk):
+    """Асинхронный вариант TestSessionViewSet.download_pdf"""
+    if request.method != 'GET':
+        return _json_response({'detail': f'Метод "{request.method}" не разрешен.'},
+                              status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except APIException as e:
+        return _exception_response(e)
+    if not user.is_authenticated:
+        return _json_response({'detail': str(NotAuthenticated.default_detail)}, status.HTTP_401_UNAUTHORIZED)
+
+    session = await _get_session(pk, user)
+    if session is None:
+        return _json_response({'detail': 'Сессия не найдена'}, status.HTTP_404_NOT_FOUND)
+
+    if session.status != TestSession.STATUS_COMPLETED:
+        return _json_response({'error': 'Тест еще не завершен'}, status.HTTP_400_BAD_REQUEST)
+
+    test_result = await TestResult.objects.filter(session=session).afirst()
+    if test_result is None:
+        return _json_response({'error': 'Результаты теста не найдены'}, status.HTTP_404_NOT_FOUND)
+
+    try:
+        result_data = await sync_to_async(lambda: TestResultSerializer(test_result).data)()
+        # Генерация PDF не обращается к БД и не должна ждать общий поток
+        pdf_buffer = await sync_to_async(generate_pdf_report, thread_sensitive=False)(result_data)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return _json_response({'error': f'Ошибка генерации PDF: {str(e)}'},
+                              status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return pdf_report_response(session, pdf_buffer)
+
+
+# csrf_exempt в Django 4.2 не поддерживает корутины, поэтому флаг ставится
+# напрямую (как и для представлений DRF, аутентификация - по JWT)
+complete_session.csrf_exempt = True
+download_session_pdf.csrf_exempt = True
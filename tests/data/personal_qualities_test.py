@@ -273,6 +273,23 @@ def calculate_personal_qualities_score(answers):
     return scores
 
 
+def get_answer_points(question_type, answer):
+    """
+    Балл за ответ на вопрос
+    
+    Для вопроса типа (+): Да = 1, Нет = 0, Иногда = 0.5
+    Для вопроса типа (-): Нет = 1, Да = 0, Иногда = 0.5
+    """
+    answer = str(answer).strip().lower()
+    if answer in ('sometimes', 'иногда'):
+        return 0.5
+    if answer in ('yes', 'да'):
+        return 1 if question_type != '-' else 0
+    if answer in ('no', 'нет'):
+        return 1 if question_type == '-' else 0
+    return 0
+
+
 def get_quality_level(score):
     """Получить уровень качества по баллу (0-20)"""
     if 0 <= score <= 6:
@@ -0,0 +1,321 @@
+"""
+Бенчмарк генерации PDF отчетов с порогами регрессии
+
+Рендерит через generate_pdf_report типичные данные TestResultSerializer:
+    iq_test            - IQ с графиком шкалы
+    personal_qualities - профиль из 10 полос и длинный отчет
+    productivity       - длинный текстовый отчет
+и выводит p50/p95 времени генерации, пиковый RSS процесса и размер PDF.
+Команда завершается с ошибкой, если превышен порог (--max-p95-ms,
+--max-rss-mb) или результат хуже прошлого прогона (--baseline) больше чем
+на --max-regression процентов.
+
+Использование:
+    python manage.py benchmark_pdf
+    python manage.py benchmark_pdf --output bench/pdf.json
+    python manage.py benchmark_pdf --baseline bench/pdf.json --max-regression 15
+    python manage.py benchmark_pdf --max-p95-ms 400 --max-rss-mb 300
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tests.data.personal_qualities_test import PERSONAL_QUALITIES_BLOCKS
+from tests.utils.benchmarking import load_results, run_metadata, save_results, summarize
+from tests.utils.pdf_generator import generate_pdf_report
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BAR_WIDTH = 20
+
+
+def _session(test_type, test_name):
+    return {
+        'id': '00000000-0000-0000-0000-000000000000',
+        'candidate_name': 'Иванов Иван Иванович',
+        'candidate_email': 'candidate@example.com',
+        'created_at': '2025-01-15T10:30:00Z',
+        'status': 'completed',
+        'test': {'name': test_name, 'test_type': test_type},
+    }
+
+
+def _paragraphs(chars, sentences):
+    """Текст отчета длиной около chars символов из повторяющихся предложений"""
+    text = []
+    length = 0
+    index = 0
+    while length < chars:
+        sentence = sentences[index % len(sentences)]
+        text.append(sentence)
+        length += len(sentence) + 1
+        index += 1
+    # Абзацы по 4 предложения, как в ответах модели
+    return '\n\n'.join(' '.join(text[i:i + 4]) for i in range(0, len(text), 4))
+
+
+def iq_payload(report_chars):
+    report = '\n'.join([
+        '## ОТЧЕТ ПО ТЕСТУ ИНТЕЛЛЕКТА (LOGIS/RAVEN)',
+        '',
+        '1. РЕЗУЛЬТАТЫ ПО СЕРИЯМ:',
+        '- Серия A (Мышление по аналогии): 11 из 12',
+        '- Серия B (Линейная дифференциация): 10 из 12',
+        '- Серия C (Прогрессивные изменения): 9 из 12',
+        '- Серия D (Перегруппировка фигур): 8 из 12',
+        '- Серия E (Анализ и синтез): 6 из 12',
+        '**Общий сырой балл:** 44 из 60.',
+        '',
+        '2. ПОКАЗАТЕЛЬ IQ:',
+        '- Базовый IQ (по таблице): 100',
+        '- **Итоговый IQ (с учетом возраста 35 лет): 103**',
+        '- **Уровень развития:** Средний интеллект',
+        '',
+        '3. РЕКОМЕНДАЦИЯ ПО ДОЛЖНОСТИ:',
+        _paragraphs(report_chars // 4, [
+            'Кандидат способен справляться со стандартными задачами.',
+            'Рекомендован на позиции линейного сотрудника, специалиста, исполнителя.',
+        ]),
+        '',
+        '4. АНАЛИЗ НАДЕЖНОСТИ:',
+        'Результаты теста соответствуют ожидаемому паттерну.',
+    ])
+    return {
+        'session': _session('iq_test', 'IQ-тест (прогрессивные матрицы Равена)'),
+        'raw_score': 44,
+        'final_score': 103,
+        'iq_score': 103,
+        'iq_level': 'Средний интеллект',
+        'scores_json': {},
+        'report': report,
+        'report_json': {},
+    }
+
+
+def personal_qualities_payload(report_chars):
+    bars = []
+    scores = {}
+    for index, block_name in enumerate(PERSONAL_QUALITIES_BLOCKS):
+        score = 4.5 + (index * 1.7) % 15
+        filled = round(score * BAR_WIDTH / 20)
+        level = 'Высокий уровень' if score >= 15 else ('Низкий уровень' if score <= 6 else 'Средний уровень')
+        bars.append(f"{block_name} [{'█' * filled}{'░' * (BAR_WIDTH - filled)}] {score:.1f}/20 ({level})")
+        scores[block_name] = {'score': score, 'level': level}
+
+    details = []
+    for block_name in PERSONAL_QUALITIES_BLOCKS:
+        details.append(f'**{block_name}:** ' + _paragraphs(report_chars // 20, [
+            'Балл соответствует норме, выраженных рисков не выявлено.',
+            'В стрессовой ситуации качество может проявляться слабее.',
+        ]))
+    report = '\n'.join([
+        '#### ЧАСТЬ 1: ЦИФРОВОЙ ПРОФИЛЬ',
+        *bars,
+        '',
+        '#### ЧАСТЬ 2: ДЕТАЛЬНАЯ РАСШИФРОВКА',
+        *details,
+        '',
+        '#### ЧАСТЬ 3: ОБЩАЯ КАРТИНА ЛИЧНОСТИ',
+        '1. **Сильные стороны:** ' + _paragraphs(report_chars // 6, [
+            'Кандидат уверенно доводит дела до конца и сохраняет самообладание.',
+            'Общительность помогает ему выстраивать рабочие отношения.',
+        ]),
+        '2. **Зоны риска:** ' + _paragraphs(report_chars // 6, [
+            'Сниженная внимательность может приводить к ошибкам в рутинной работе.',
+        ]),
+        '3. **Рекомендация по должности:** ' + _paragraphs(report_chars // 6, [
+            'Подходит для работы с клиентами и проектной деятельности.',
+            'Не рекомендуется кропотливая работа с документами.',
+        ]),
+    ])
+    return {
+        'session': _session('personal_qualities', 'Оценка личностных качеств'),
+        'raw_score': None,
+        'final_score': None,
+        'iq_score': None,
+        'iq_level': '',
+        'scores_json': scores,
+        'report': report,
+        'report_json': {'scores': scores},
+    }
+
+
+def productivity_payload(report_chars):
+    sections = [
+        'ПОНИМАНИЕ ОЖИДАНИЙ (Блок "Продукт должности")',
+        'ИЗМЕРЕНИЕ РЕЗУЛЬТАТОВ',
+        'КОНТЕКСТ И СРАВНЕНИЕ',
+        'ДИНАМИКА И ОТВЕТСТВЕННОСТЬ',
+        'ЛИЧНЫЙ ПОТЕНЦИАЛ (ВНЕ РАБОТЫ)',
+    ]
+    lines = []
+    for number, title in enumerate(sections, start=1):
+        lines.extend([
+            f'### {number}. {title}',
+            '- Цитата: «Увеличил продажи отдела на 23% за полгода».',
+            '- Цитата: «Внедрил CRM и сократил время обработки заявки до 4 часов».',
+            _paragraphs(report_chars // len(sections), [
+                'Кандидат формулирует результат своей работы через конкретные показатели.',
+                'Ответы содержат глаголы совершенного вида и сравнение с планом.',
+                'Отдельные ответы описывают процесс, а не итог, что снижает уверенность в оценке.',
+            ]),
+            '',
+        ])
+    lines.append('**ИТОГОВЫЙ ВЕРДИКТ:** Результатник. Рекомендован на должность с высокой автономностью.')
+    return {
+        'session': _session('productivity', 'Оценка продуктивности'),
+        'raw_score': None,
+        'final_score': None,
+        'iq_score': None,
+        'iq_level': '',
+        'scores_json': {},
+        'report': '\n'.join(lines),
+        'report_json': {'candidate_type': 'Результатник'},
+    }
+
+
+PAYLOADS = {
+    'iq_test': iq_payload,
+    'personal_qualities': personal_qualities_payload,
+    'productivity': productivity_payload,
+}
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в МБ (None, если недоступно)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк генерации PDF отчетов с порогами регрессии'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--test-type',
+            choices=sorted(PAYLOADS),
+            action='append',
+            help='Тип отчета (можно указать несколько раз; по умолчанию все)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=30,
+            help='Число замеряемых генераций на тип отчета (по умолчанию 30)',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Генерации без замера перед измерением (по умолчанию 2)',
+        )
+        parser.add_argument(
+            '--report-chars',
+            type=int,
+            default=12000,
+            help='Примерная длина текста отчета (по умолчанию 12000 символов)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Сохранить результаты в JSON файл',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON файл прошлого прогона (--output) для проверки регрессии',
+        )
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            default=20.0,
+            help='Допустимый рост p95 и размера PDF относительно --baseline, %% (по умолчанию 20)',
+        )
+        parser.add_argument(
+            '--max-p95-ms',
+            type=float,
+            help='Порог p95 времени генерации в миллисекундах',
+        )
+        parser.add_argument(
+            '--max-rss-mb',
+            type=float,
+            help='Порог пикового RSS процесса в МБ',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] <= 0:
+            raise CommandError('--iterations должно быть больше 0')
+        baseline = load_results(options['baseline']) if options['baseline'] else None
+
+        results = {}
+        for test_type in options['test_type'] or sorted(PAYLOADS):
+            payload = PAYLOADS[test_type](options['report_chars'])
+
+            timings = []
+            size = 0
+            for index in range(options['warmup'] + options['iterations']):
+                started = time.perf_counter()
+                buffer = generate_pdf_report(payload)
+                elapsed = time.perf_counter() - started
+                size = buffer.getbuffer().nbytes
+                if index >= options['warmup']:
+                    timings.append(elapsed)
+
+            results[test_type] = {
+                **summarize(timings),
+                'size_bytes': size,
+                'peak_rss_mb': peak_rss_mb(),
+            }
+            result = results[test_type]
+            self.stdout.write(self.style.SUCCESS(test_type))
+            self.stdout.write(
+                f"  p50 {result['p50_ms']:.1f} мс  p95 {result['p95_ms']:.1f} мс  "
+                f"размер {result['size_bytes'] / 1024:.1f} КБ  пиковый RSS {result['peak_rss_mb']} МБ"
+            )
+
+        if options['output']:
+            meta = run_metadata(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                report_chars=options['report_chars'],
+            )
+            save_results(options['output'], meta, results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+        violations = self._check_thresholds(results, baseline, options)
+        if violations:
+            for violation in violations:
+                self.stderr.write(self.style.ERROR(violation))
+            raise CommandError(f'Превышены пороги производительности PDF: {len(violations)}')
+        self.stdout.write(self.style.SUCCESS('Пороги не превышены'))
+
+    def _check_thresholds(self, results, baseline, options):
+        violations = []
+        allowed = 1 + options['max_regression'] / 100
+        for test_type, result in results.items():
+            if options['max_p95_ms'] is not None and result['p95_ms'] > options['max_p95_ms']:
+                violations.append(
+                    f"{test_type}: p95 {result['p95_ms']:.1f} мс больше порога {options['max_p95_ms']} мс"
+                )
+            if (options['max_rss_mb'] is not None and result['peak_rss_mb'] is not None
+                    and result['peak_rss_mb'] > options['max_rss_mb']):
+                violations.append(
+                    f"{test_type}: пиковый RSS {result['peak_rss_mb']} МБ больше порога {options['max_rss_mb']} МБ"
+                )
+            before = (baseline or {}).get(test_type)
+            if not before:
+                continue
+            for key, label in (('p95_ms', 'p95'), ('size_bytes', 'размер PDF')):
+                if before.get(key) and result[key] > before[key] * allowed:
+                    change = (result[key] - before[key]) / before[key] * 100
+                    violations.append(
+                        f"{test_type}: {label} вырос на {change:.1f}% "
+                        f"({before[key]} -> {result[key]}), допустимо {options['max_regression']}%"
+                    )
+        return violations
@@ -0,0 +1,262 @@
+"""
+Бенчмарк обработчиков результатов тестов
+
+Генерирует синтетические наборы ответов для трех типов тестов и прогоняет
+process_raven_test, process_personal_qualities_test и
+process_productivity_test, подменяя call_gemini заглушкой FakeProvider
+(tests/services/llm_providers.py) с заданной задержкой и длиной отчета.
+Время меряется по этапам:
+    prepare  - разбор ответов, подсчет баллов и сборка промпта
+    llm      - заглушка LLM (задержка --latency-ms)
+    finalize - разбор ответа модели и сборка результата
+БД и сеть не используются; при одинаковом --seed входные данные совпадают.
+
+Использование:
+    python manage.py benchmark_processors
+    python manage.py benchmark_processors --iterations 500 --latency-ms 20
+    python manage.py benchmark_processors --test-type iq_test --output bench/before.json
+    python manage.py benchmark_processors --compare bench/before.json --output bench/after.json
+"""
+import random
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tests.data.personal_qualities_test import PERSONAL_QUALITIES_BLOCKS, get_answer_points
+from tests.data.productivity_test import PRODUCTIVITY_QUESTIONS
+from tests.data.raven_test import get_correct_answer
+from tests.services import personal_qualities_processor, productivity_processor, raven_processor
+from tests.services.llm_ledger import llm_call_context
+from tests.services.llm_providers import FakeProvider
+from tests.utils.benchmarking import PRODUCTIVITY_ANSWER_PARTS, load_results, run_metadata, save_results, summarize
+
+STAGES = ('prepare', 'llm', 'finalize')
+
+def fake_call_gemini(provider, test_type):
+    """call_gemini на заглушке: шаблонный отчет для типа теста"""
+    def call(prompt, *args, **kwargs):
+        with llm_call_context(test_type=test_type):
+            return provider.generate(prompt).text
+    return call
+
+
+def raven_case(rng):
+    """Ответы на 60 заданий: доля верных падает от серии A к серии E"""
+    answers = []
+    for question_number in range(1, 61):
+        accuracy = 0.9 - 0.12 * ((question_number - 1) // 12)
+        correct = get_correct_answer(question_number)
+        answer = correct if rng.random() < accuracy else rng.randint(1, 8)
+        answers.append({'question_number': question_number, 'answer': answer})
+    session = SimpleNamespace(candidate_age=rng.randint(18, 60))
+    return lambda: raven_processor.process_raven_test(session, answers=answers)
+
+
+def personal_qualities_case(rng):
+    """Ответы на 200 вопросов по 10 блокам и баллы по блокам, как при завершении сессии"""
+    answers = []
+    block_scores = {}
+    question_number = 0
+    for block_name, block in PERSONAL_QUALITIES_BLOCKS.items():
+        block_scores[block_name] = 0
+        for question in block['questions']:
+            question_number += 1
+            answer = rng.choice(('yes', 'no', 'sometimes'))
+            block_scores[block_name] += get_answer_points(question['type'], answer)
+            answers.append({
+                'question_number': question_number,
+                'answer': answer,
+                'block_name': block_name,
+                'question_type': question['type'],
+            })
+    return lambda: personal_qualities_processor.process_personal_qualities_test(answers, block_scores=block_scores)
+
+
+def productivity_case(rng):
+    """Развернутые текстовые ответы на 20 вопросов"""
+    answers = [
+        {
+            'question_number': question['number'],
+            'answer': ' '.join(rng.choice(PRODUCTIVITY_ANSWER_PARTS) for _ in range(rng.randint(2, 6))),
+        }
+        for question in PRODUCTIVITY_QUESTIONS
+    ]
+    return lambda: productivity_processor.process_productivity_test(answers)
+
+
+CASES = {
+    'iq_test': (raven_case, raven_processor, 'prepare_raven_test', 'finalize_raven_test'),
+    'personal_qualities': (
+        personal_qualities_case, personal_qualities_processor,
+        'prepare_personal_qualities_test', 'finalize_personal_qualities_test',
+    ),
+    'productivity': (productivity_case, productivity_processor, 'prepare_productivity_test', 'finalize_productivity_test'),
+}
+
+
+@contextmanager
+def instrumented(module, prepare_name, finalize_name, fake, timings):
+    """
+    Подменить этапы обработчика в модуле на обертки с замером времени
+
+    process_* вызывает prepare, call_gemini и finalize через глобальные имена
+    модуля, поэтому меряется настоящая точка входа.
+    """
+    originals = {
+        'prepare': getattr(module, prepare_name),
+        'llm': fake,
+        'finalize': getattr(module, finalize_name),
+    }
+    saved = {
+        prepare_name: getattr(module, prepare_name),
+        'call_gemini': module.call_gemini,
+        finalize_name: getattr(module, finalize_name),
+    }
+
+    def timed(stage):
+        func = originals[stage]
+
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[stage].append(time.perf_counter() - started)
+        return wrapper
+
+    setattr(module, prepare_name, timed('prepare'))
+    module.call_gemini = timed('llm')
+    setattr(module, finalize_name, timed('finalize'))
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк обработчиков результатов тестов с заглушкой LLM'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--test-type',
+            choices=sorted(CASES),
+            action='append',
+            help='Тип теста (можно указать несколько раз; по умолчанию все)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Число замеряемых прогонов на тип теста (по умолчанию 200)',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            help='Прогоны без замера перед измерением (по умолчанию 10)',
+        )
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=0.0,
+            help='Задержка заглушки LLM в миллисекундах (по умолчанию 0)',
+        )
+        parser.add_argument(
+            '--report-chars',
+            type=int,
+            default=6000,
+            help='Длина отчета, который возвращает заглушка (по умолчанию 6000 символов)',
+        )
+        parser.add_argument(
+            '--cases',
+            type=int,
+            default=20,
+            help='Число разных синтетических наборов ответов на тип теста (по умолчанию 20)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора ответов (по умолчанию 42)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Сохранить результаты в JSON файл',
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON файл прошлого прогона (--output): показать изменение среднего времени этапов',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] <= 0 or options['cases'] <= 0:
+            raise CommandError('--iterations и --cases должны быть больше 0')
+
+        baseline = load_results(options['compare']) if options['compare'] else None
+
+        # Параметры заглушки заданы явно, настройки LLM_FAKE_* на замер не влияют
+        provider = FakeProvider(
+            latency_ms=options['latency_ms'],
+            latency_sigma=0,
+            failure_rate=0,
+            timeout_rate=0,
+            script=[],
+            responses_dir='',
+            report_chars=options['report_chars'],
+        )
+        results = {}
+        for test_type in options['test_type'] or sorted(CASES):
+            build_case, module, prepare_name, finalize_name = CASES[test_type]
+            rng = random.Random(f"{options['seed']}:{test_type}")
+            cases = [build_case(rng) for _ in range(options['cases'])]
+            fake = fake_call_gemini(provider, test_type)
+
+            timings = {stage: [] for stage in STAGES}
+            totals = []
+            for index in range(options['warmup'] + options['iterations']):
+                run = cases[index % len(cases)]
+                measured = index >= options['warmup']
+                stage_timings = timings if measured else {stage: [] for stage in STAGES}
+                with instrumented(module, prepare_name, finalize_name, fake, stage_timings):
+                    started = time.perf_counter()
+                    run()
+                    elapsed = time.perf_counter() - started
+                if measured:
+                    totals.append(elapsed)
+
+            results[test_type] = {
+                'throughput_per_s': round(len(totals) / sum(totals), 2),
+                'total': summarize(totals),
+                'stages': {stage: summarize(samples) for stage, samples in timings.items()},
+            }
+            self._print_result(test_type, results[test_type], (baseline or {}).get(test_type))
+
+        if options['output']:
+            meta = run_metadata(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                cases=options['cases'],
+                latency_ms=options['latency_ms'],
+                report_chars=options['report_chars'],
+                seed=options['seed'],
+            )
+            save_results(options['output'], meta, results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    def _print_result(self, test_type, result, baseline=None):
+        self.stdout.write(self.style.SUCCESS(f"{test_type}: {result['throughput_per_s']} обработок/с"))
+        for stage in STAGES + ('total',):
+            summary = result['total'] if stage == 'total' else result['stages'][stage]
+            line = (
+                f"  {stage:<9} mean {summary['mean_ms']:>9.3f} мс  "
+                f"p50 {summary['p50_ms']:>9.3f} мс  p95 {summary['p95_ms']:>9.3f} мс"
+            )
+            if baseline:
+                before = baseline['total'] if stage == 'total' else baseline['stages'].get(stage)
+                if before and before['mean_ms']:
+                    change = (summary['mean_ms'] - before['mean_ms']) / before['mean_ms'] * 100
+                    line += f"  ({change:+.1f}% к прошлому прогону)"
+            self.stdout.write(line)
@@ -0,0 +1,56 @@
+"""
+Команда для построения уменьшенных копий изображений вопросов (WebP/AVIF)
+
+Использование:
+    python manage.py build_question_images               # все вопросы с изображениями
+    python manage.py build_question_images --test-id 1
+    python manage.py build_question_images --force       # пересоздать все копии
+
+Запускается после импорта вопросов (import_raven_questions) и при замене
+изображений; неизмененные изображения пропускаются.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from tests.models import TestQuestion
+from tests.services.question_images import build_image_variants, supported_formats
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии изображений вопросов с хэшем содержимого в имени'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--test-id',
+            type=int,
+            help='Обработать только вопросы указанного теста',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии даже для неизмененных изображений',
+        )
+
+    def handle(self, *args, **options):
+        formats = supported_formats()
+        if not formats:
+            raise CommandError('Ни один из форматов QUESTION_IMAGE_FORMATS не поддерживается Pillow')
+        self.stdout.write(f'Форматы: {", ".join(formats)}')
+
+        questions = TestQuestion.objects.exclude(question_image='').exclude(question_image__isnull=True)
+        if options.get('test_id'):
+            questions = questions.filter(test_id=options['test_id'])
+
+        built = skipped = 0
+        errors = []
+        for question in questions.order_by('test_id', 'question_number').iterator():
+            try:
+                if build_image_variants(question, force=options['force']):
+                    built += 1
+                else:
+                    skipped += 1
+            except Exception as e:
+                errors.append(f'Вопрос {question.question_number} (тест {question.test_id}): {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {built}'))
+        self.stdout.write(f'Без изменений: {skipped}')
+        for error in errors:
+            self.stdout.write(self.style.ERROR(f'  {error}'))
@@ -0,0 +1,57 @@
+"""
+Команда для перевода просроченных сессий тестирования в статус «Истек»
+
+Использование:
+    python manage.py expire_sessions                     # один проход
+    python manage.py expire_sessions --auto-complete     # сначала обработать частичные ответы
+    python manage.py expire_sessions --loop --interval 60
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from tests.services.session_expiry import expire_overdue_sessions, auto_complete_overdue_sessions
+
+
+class Command(BaseCommand):
+    help = 'Переводит просроченные сессии тестирования в статус «Истек»'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--auto-complete',
+            action='store_true',
+            help='Завершать просроченные сессии с ответами и формировать отчет по частичным ответам',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=50,
+            help='Максимум сессий для автозавершения за один проход (по умолчанию 50)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60.0,
+            help='Пауза между проходами в секундах (по умолчанию 60)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+
+            if options['auto_complete']:
+                completed, failed = auto_complete_overdue_sessions(limit=options['limit'])
+                if completed or failed:
+                    self.stdout.write(f'Автозавершено сессий: {completed}, без результата: {failed}')
+
+            expired = expire_overdue_sessions()
+            if expired:
+                self.stdout.write(self.style.SUCCESS(f'Переведено в «Истек»: {expired}'))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
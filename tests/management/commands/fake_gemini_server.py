@@ -0,0 +1,190 @@
+"""
+Локальный сервер, отвечающий вместо Gemini API
+
+Принимает REST-запросы google.generativeai (generateContent и
+streamGenerateContent) и отвечает отчетами FakeProvider
+(tests/services/llm_providers.py) с теми же настройками задержки, ошибок
+429 и таймаутов. В отличие от LLM_PROVIDER=fake, через сервер
+проходит настоящий клиент GeminiProvider: сериализация запроса, HTTP и
+разбор ответа.
+
+Подключение в .env приложения:
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8090
+    GEMINI_API_KEY=fake
+
+Использование:
+    python manage.py fake_gemini_server
+    python manage.py fake_gemini_server --port 8090 --latency-ms 8000 --latency-sigma 0.3
+    python manage.py fake_gemini_server --script 429,timeout,ok --seed 1
+"""
+import json
+import re
+from itertools import chain
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from decouple import Csv
+from django.core.management.base import BaseCommand
+
+from tests.services.llm_ledger import llm_call_context
+from tests.services.llm_providers import DeadlineExceeded, FakeProvider, ResourceExhausted
+
+ROUTE = re.compile(r'^/v1beta/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)$')
+
+# Тип теста по характерной строке промпта (для шаблона отчета)
+PROMPT_MARKERS = (
+    ('LOGIS', 'iq_test'),
+    ('ЦИФРОВОЙ ПРОФИЛЬ', 'personal_qualities'),
+    ('Результатник', 'productivity'),
+)
+
+
+def detect_test_type(prompt):
+    for marker, test_type in PROMPT_MARKERS:
+        if marker in prompt:
+            return test_type
+    return ''
+
+
+def response_body(text, prompt):
+    return {
+        'candidates': [{
+            'content': {'parts': [{'text': text}], 'role': 'model'},
+            'finishReason': 'STOP',
+            'index': 0,
+        }],
+        'usageMetadata': {
+            'promptTokenCount': len(prompt) // 4,
+            'candidatesTokenCount': len(text) // 4,
+            'totalTokenCount': (len(prompt) + len(text)) // 4,
+        },
+    }
+
+
+def error_body(status, message):
+    return {'error': {'code': status.value, 'message': message, 'status': status.name}}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    provider = None
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        path, _, query = self.path.partition('?')
+        match = ROUTE.match(path)
+        if match is None:
+            self._send_json(HTTPStatus.NOT_FOUND, error_body(HTTPStatus.NOT_FOUND, f'Неизвестный метод: {path}'))
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            self._send_json(HTTPStatus.BAD_REQUEST, error_body(HTTPStatus.BAD_REQUEST, 'Некорректный JSON'))
+            return
+        prompt = '\n'.join(
+            part.get('text', '')
+            for content in payload.get('contents', [])
+            for part in content.get('parts', [])
+        )
+
+        with llm_call_context(test_type=detect_test_type(prompt)):
+            if match.group('method') == 'streamGenerateContent':
+                self._stream(prompt, sse='alt=sse' in query)
+            else:
+                self._generate(prompt)
+
+    def _generate(self, prompt):
+        try:
+            response = self.provider.generate(prompt)
+        except (ResourceExhausted, DeadlineExceeded) as e:
+            self._send_error(e)
+            return
+        self._send_json(HTTPStatus.OK, response_body(response.text, prompt))
+
+    def _stream(self, prompt, sse):
+        chunks = self.provider.stream(prompt)
+        try:
+            first = next(chunks)
+        except (ResourceExhausted, DeadlineExceeded) as e:
+            self._send_error(e)
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/event-stream' if sse else 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        if not sse:
+            self._write_chunk('[')
+        separator = ''
+        for chunk in chain([first], chunks):
+            body = json.dumps(response_body(chunk, prompt), ensure_ascii=False)
+            self._write_chunk(f'data: {body}\r\n\r\n' if sse else separator + body)
+            separator = ','
+        if not sse:
+            self._write_chunk(']')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def _send_error(self, error):
+        if isinstance(error, ResourceExhausted):
+            status = HTTPStatus.TOO_MANY_REQUESTS
+            body = error_body(status, 'Resource has been exhausted (e.g. check quota).')
+            body['error']['status'] = 'RESOURCE_EXHAUSTED'
+        else:
+            status = HTTPStatus.GATEWAY_TIMEOUT
+            body = error_body(status, 'Deadline Exceeded')
+            body['error']['status'] = 'DEADLINE_EXCEEDED'
+        self._send_json(status, body)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Локальный сервер вместо Gemini API (ответы FakeProvider)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес (по умолчанию 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8090, help='Порт (по умолчанию 8090)')
+        parser.add_argument('--latency-ms', type=int, help='Медиана задержки ответа (LLM_FAKE_LATENCY_MS)')
+        parser.add_argument('--latency-sigma', type=float, help='Разброс задержки (LLM_FAKE_LATENCY_SIGMA)')
+        parser.add_argument('--failure-rate', type=float, help='Доля ответов 429 (LLM_FAKE_FAILURE_RATE)')
+        parser.add_argument('--timeout-rate', type=float, help='Доля таймаутов (LLM_FAKE_TIMEOUT_RATE)')
+        parser.add_argument('--script', type=Csv(), help='Исходы вызовов по порядку, например 429,timeout,ok')
+        parser.add_argument('--seed', type=int, help='Зерно генератора (LLM_FAKE_SEED)')
+        parser.add_argument('--responses-dir', help='Каталог заготовленных отчетов (LLM_FAKE_RESPONSES_DIR)')
+        parser.add_argument('--report-chars', type=int, help='Длина шаблонного отчета (LLM_FAKE_REPORT_CHARS)')
+        parser.add_argument('--chunk-chars', type=int, help='Размер фрагмента потоковой выдачи (LLM_FAKE_CHUNK_CHARS)')
+
+    def handle(self, *args, **options):
+        # Не заданные параметры берутся из настроек LLM_FAKE_*
+        provider_options = {
+            name: options[name] for name in (
+                'latency_ms', 'latency_sigma', 'failure_rate', 'timeout_rate', 'script',
+                'seed', 'responses_dir', 'report_chars', 'chunk_chars',
+            )
+            if options[name] is not None
+        }
+        handler = type('Handler', (FakeGeminiHandler,), {'provider': FakeProvider(**provider_options)})
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Gemini API: http://{options['host']}:{options['port']} (Ctrl+C для остановки)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
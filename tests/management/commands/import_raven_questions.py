@@ -3,24 +3,39 @@
 
 Использование:
     python manage.py import_raven_questions path/to/file.csv
+    python manage.py import_raven_questions path/to/file.csv --bulk  # пакетный импорт больших банков вопросов
+    python manage.py generate_raven_csv - | python manage.py import_raven_questions - --bulk
+
+После импорта изображений: python manage.py build_question_images (копии WebP/AVIF)
 
 Формат CSV:
     id,question_number,question_text,question_image,series,...,correct_answer,order,...,test_id,answer_options,display_type
 """
 import csv
 import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from django.core.management.base import BaseCommand, CommandError
 from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
 from tests.models import Test, TestQuestion
 from tests.data.raven_test import RAVEN_TEST_ANSWER_KEY
+from tests.services.question_images import invalidate_asset_manifest
+from tests.utils.raven_csv import load_answer_key, series_offsets
+
+STORAGE_SUFFIX_RE = re.compile(r'^(.*)_[A-Za-z0-9]{7}(\.[^.]*)?$')
+
+# Поля вопроса, заполняемые из CSV
+QUESTION_FIELDS = ['question_text', 'series', 'display_type', 'answer_options', 'correct_answer', 'order']
 
 
 class Command(BaseCommand):
     help = 'Импортирует вопросы IQ-теста из CSV файла'
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Путь к CSV файлу')
+        parser.add_argument('csv_file', type=str, help='Путь к CSV файлу или "-" для stdin')
         parser.add_argument(
             '--test-id',
             type=int,
@@ -31,6 +46,28 @@ class Command(BaseCommand):
             action='store_true',
             help='Проверить файл без создания записей в БД',
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Пакетный импорт: сверка одним запросом, bulk_create/bulk_update, параллельное копирование изображений',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Размер пачки для bulk_create/bulk_update (по умолчанию 500)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Число потоков для копирования изображений (по умолчанию 8)',
+        )
+        parser.add_argument(
+            '--answer-key',
+            type=str,
+            help='Ключ ответов в виде module.path:NAME (по умолчанию RAVEN_TEST_ANSWER_KEY)',
+        )
 
     def handle(self, *args, **options):
         csv_file_path = options['csv_file']
@@ -38,9 +75,16 @@ class Command(BaseCommand):
         dry_run = options['dry_run']
 
         # Проверяем существование файла
-        if not os.path.exists(csv_file_path):
+        if csv_file_path != '-' and not os.path.exists(csv_file_path):
             raise CommandError(f'Файл не найден: {csv_file_path}')
 
+        # Ключ ответов и границы серий (для параллельных форм - свой ключ)
+        try:
+            self.answer_key = load_answer_key(options['answer_key']) if options.get('answer_key') else RAVEN_TEST_ANSWER_KEY
+            self.series_offsets = series_offsets(self.answer_key)
+        except ValueError as e:
+            raise CommandError(str(e))
+
         # Находим IQ-тест
         if test_id:
             try:
@@ -63,45 +107,19 @@ class Command(BaseCommand):
         }
 
         try:
-            with open(csv_file_path, 'r', encoding='utf-8') as f:
-                # Пытаемся определить разделитель
-                sample = f.read(1024)
-                f.seek(0)
-                sniffer = csv.Sniffer()
-                delimiter = sniffer.sniff(sample).delimiter
-
-                reader = csv.reader(f, delimiter=delimiter)
-                
-                # Пропускаем заголовок, если есть
-                first_row = next(reader, None)
-                row_counter = 1
-                
-                if first_row:
-                    # Проверяем, является ли первая строка заголовком
-                    # Заголовок обычно содержит слова типа "id", "question_number" и т.д.
-                    is_header = False
-                    if len(first_row) > 0:
-                        first_col = first_row[0].strip().lower()
-                        # Если первая колонка содержит слова-заголовки, это заголовок
-                        if first_col in ['id', 'question_number', 'question_text']:
-                            is_header = True
-                            self.stdout.write('Обнаружен заголовок, пропускаем...')
-                    
-                    if not is_header:
-                        # Это данные, обрабатываем первую строку
-                        self._process_row(first_row, test, dry_run, stats, row_counter)
-                        row_counter += 1
-
-                # Обрабатываем остальные строки
-                for row in reader:
-                    if not row or (len(row) > 0 and not row[0].strip() and len([c for c in row if c.strip()]) == 0):
-                        continue
+            rows = self._read_rows(csv_file_path)
+            if options['bulk']:
+                self._bulk_import(rows, test, dry_run, stats, options['batch_size'], options['workers'])
+            else:
+                for row_counter, row in rows:
                     self._process_row(row, test, dry_run, stats, row_counter)
-                    row_counter += 1
 
         except Exception as e:
             raise CommandError(f'Ошибка при чтении CSV файла: {str(e)}')
 
+        if not dry_run:
+            invalidate_asset_manifest(test.id)
+
         # Выводим результаты
         self.stdout.write(self.style.SUCCESS(f'\nИмпорт завершен:'))
         self.stdout.write(f'  Создано: {stats["created"]}')
@@ -115,15 +133,167 @@ class Command(BaseCommand):
             if len(stats['errors']) > 10:
                 self.stdout.write(self.style.ERROR(f'  ... и еще {len(stats["errors"]) - 10} ошибок'))
 
-    def _process_row(self, row, test, dry_run, stats, row_num=None):
-        """Обрабатывает одну строку CSV"""
+    def _read_rows(self, csv_file_path):
+        """Читает CSV файл построчно: (номер строки, строка), без заголовка и пустых строк"""
+        if csv_file_path == '-':
+            # stdin нельзя перемотать для определения разделителя: ожидаем запятую,
+            # как в выводе generate_raven_csv
+            yield from self._iter_reader(csv.reader(sys.stdin))
+            return
+
+        with open(csv_file_path, 'r', encoding='utf-8') as f:
+            # Пытаемся определить разделитель
+            sample = f.read(1024)
+            f.seek(0)
+            sniffer = csv.Sniffer()
+            delimiter = sniffer.sniff(sample).delimiter
+
+            yield from self._iter_reader(csv.reader(f, delimiter=delimiter))
+
+    def _iter_reader(self, reader):
+        """Строки CSV с номерами, без заголовка и пустых строк"""
+        # Пропускаем заголовок, если есть
+        first_row = next(reader, None)
+        row_counter = 1
+        
+        if first_row:
+            # Проверяем, является ли первая строка заголовком
+            # Заголовок обычно содержит слова типа "id", "question_number" и т.д.
+            is_header = False
+            if len(first_row) > 0:
+                first_col = first_row[0].strip().lower()
+                # Если первая колонка содержит слова-заголовки, это заголовок
+                if first_col in ['id', 'question_number', 'question_text']:
+                    is_header = True
+                    self.stdout.write('Обнаружен заголовок, пропускаем...')
+            
+            if not is_header:
+                # Это данные, обрабатываем первую строку
+                yield row_counter, first_row
+                row_counter += 1
+
+        # Обрабатываем остальные строки
+        for row in reader:
+            if not row or (len(row) > 0 and not row[0].strip() and len([c for c in row if c.strip()]) == 0):
+                continue
+            yield row_counter, row
+            row_counter += 1
+
+    def _bulk_import(self, rows, test, dry_run, stats, batch_size, workers):
+        """
+        Пакетный импорт: весь файл сверяется с существующими вопросами одним
+        запросом, затем bulk_create/bulk_update пачками; изображения копируются
+        параллельно, неизмененные изображения не копируются повторно
+        """
+        parsed = {}
+        for row_num, row in rows:
+            data = self._parse_row(row, stats, row_num)
+            if data is not None:
+                # При повторе номера вопроса в файле побеждает последняя строка
+                parsed[data['question_number']] = data
+
+        existing = {
+            question.question_number: question
+            for question in TestQuestion.objects.filter(test=test, question_number__in=list(parsed))
+        }
+
+        to_create = []
+        to_update = []
+        image_jobs = []
+        for question_number, data in parsed.items():
+            question = existing.get(question_number)
+            if question is None:
+                question = TestQuestion(test=test, question_number=question_number)
+                to_create.append(question)
+            elif any(getattr(question, field) != data[field] for field in QUESTION_FIELDS):
+                to_update.append(question)
+            for field in QUESTION_FIELDS:
+                setattr(question, field, data[field])
+
+            source_path = self._resolve_image_path(data['image_path'])
+            if source_path and not self._image_is_current(question, source_path):
+                image_jobs.append((question, source_path))
+                if question.pk and question not in to_update:
+                    to_update.append(question)
+
+        if dry_run:
+            self.stdout.write(
+                f'  [DRY RUN] Будет создано: {len(to_create)}, обновлено: {len(to_update)}, '
+                f'изображений к копированию: {len(image_jobs)}'
+            )
+            return
+
+        if image_jobs:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                names = list(executor.map(lambda job: self._copy_image(*job), image_jobs))
+            for (question, _), name in zip(image_jobs, names):
+                question.question_image.name = name
+
+        now = timezone.now()
+        for question in to_update:
+            question.updated_at = now
+
+        with transaction.atomic():
+            TestQuestion.objects.bulk_create(to_create, batch_size=batch_size)
+            TestQuestion.objects.bulk_update(
+                to_update,
+                QUESTION_FIELDS + ['question_image', 'updated_at'],
+                batch_size=batch_size,
+            )
+
+        stats['created'] += len(to_create)
+        stats['updated'] += len(to_update)
+        self.stdout.write(f'  Скопировано изображений: {len(image_jobs)}')
+
+    def _resolve_image_path(self, question_image_path):
+        """Путь к файлу изображения на диске или None"""
+        if not question_image_path:
+            return None
+        if os.path.exists(question_image_path):
+            return question_image_path
+        if question_image_path.startswith('test_questions/'):
+            # Файл может быть в media директории
+            media_path = os.path.join('media', question_image_path)
+            if os.path.exists(media_path):
+                return media_path
+        return None
+
+    def _image_is_current(self, question, source_path):
+        """Уже сохранено ли у вопроса это же изображение (то же имя и размер)"""
+        name = question.question_image.name
+        if not name:
+            return False
+        # Хранилище добавляет к имени суффикс (A1_Xy12AbC.png), если файл с таким именем уже есть
+        stored_name = STORAGE_SUFFIX_RE.sub(r'\1\2', os.path.basename(name))
+        if stored_name != os.path.basename(source_path):
+            return False
+        storage = question.question_image.storage
+        try:
+            return storage.exists(name) and storage.size(name) == os.path.getsize(source_path)
+        except (OSError, NotImplementedError):
+            return False
+
+    def _copy_image(self, question, source_path):
+        """Копирует изображение в хранилище, возвращает имя сохраненного файла"""
+        field = question.question_image.field
+        name = field.generate_filename(question, os.path.basename(source_path))
+        with open(source_path, 'rb') as img_file:
+            return field.storage.save(name, File(img_file), max_length=field.max_length)
+
+    def _parse_row(self, row, stats, row_num=None):
+        """
+        Разбирает строку CSV в поля вопроса
+
+        Returns:
+            dict или None, если строку нужно пропустить (ошибка записана в stats)
+        """
         try:
             # Парсим строку CSV
             # Формат: id,question_number,question_text,question_image,series,...,correct_answer,order,...,test_id,answer_options,display_type
             if len(row) < 10:
                 stats['errors'].append(f'Строка {row_num or "?"}: недостаточно колонок ({len(row)})')
                 stats['skipped'] += 1
-                return
+                return None
 
             # Извлекаем данные (индексы могут варьироваться, но обычно так)
             csv_id = row[0].strip() if row[0] else None
@@ -179,28 +349,22 @@ class Command(BaseCommand):
             if not series or question_number_in_series is None:
                 stats['errors'].append(f'Строка {row_num or "?"}: не удалось определить серию или номер вопроса')
                 stats['skipped'] += 1
-                return
-
-            # Вычисляем общий номер вопроса (1-60)
-            series_map = {
-                'A': (1, 12),
-                'B': (13, 24),
-                'C': (25, 36),
-                'D': (37, 48),
-                'E': (49, 60),
-            }
-            
+                return None
+
+            # Вычисляем общий номер вопроса по таблице серий ключа ответов
+            series_map = self.series_offsets
+
             if series not in series_map:
                 stats['errors'].append(f'Строка {row_num or "?"}: неизвестная серия "{series}"')
                 stats['skipped'] += 1
-                return
+                return None
 
             start_num, end_num = series_map[series]
             question_number = start_num + question_number_in_series - 1
 
             # Получаем правильный ответ из ключа
             answer_key = f'{series}{question_number_in_series}'
-            correct_answer = RAVEN_TEST_ANSWER_KEY.get(answer_key)
+            correct_answer = self.answer_key.get(answer_key)
             
             if correct_answer is None:
                 stats['errors'].append(f'Строка {row_num or "?"}: правильный ответ не найден для {answer_key}')
@@ -210,7 +374,7 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.WARNING(f'  Использован ответ из CSV для {answer_key}: {correct_answer}'))
                 else:
                     stats['skipped'] += 1
-                    return
+                    return None
 
             # Парсим варианты ответов
             answer_options = [1, 2, 3, 4, 5, 6]  # По умолчанию
@@ -225,28 +389,46 @@ class Command(BaseCommand):
                     if numbers:
                         answer_options = [int(n) for n in numbers]
 
+            return {
+                'question_number': question_number,
+                'question_number_in_series': question_number_in_series,
+                'question_text': question_text,
+                'series': series,
+                'display_type': display_type,
+                'answer_options': answer_options,
+                'correct_answer': str(correct_answer),
+                'order': order if order > 0 else question_number,
+                'image_path': question_image_path,
+            }
+
+        except Exception as e:
+            stats['errors'].append(f'Строка {row_num or "?"}: {str(e)}')
+            stats['skipped'] += 1
+            return None
+
+    def _process_row(self, row, test, dry_run, stats, row_num=None):
+        """Обрабатывает одну строку CSV"""
+        data = self._parse_row(row, stats, row_num)
+        if data is None:
+            return
+
+        question_number = data['question_number']
+        series = data['series']
+        question_number_in_series = data['question_number_in_series']
+        question_image_path = data['image_path']
+
+        try:
             # Проверяем, существует ли вопрос
             question, created = TestQuestion.objects.get_or_create(
                 test=test,
                 question_number=question_number,
-                defaults={
-                    'question_text': question_text,
-                    'series': series,
-                    'display_type': display_type,
-                    'answer_options': answer_options,
-                    'correct_answer': str(correct_answer),
-                    'order': order if order > 0 else question_number,
-                }
+                defaults={field: data[field] for field in QUESTION_FIELDS}
             )
 
             if not created:
                 # Обновляем существующий вопрос
-                question.question_text = question_text
-                question.series = series
-                question.display_type = display_type
-                question.answer_options = answer_options
-                question.correct_answer = str(correct_answer)
-                question.order = order if order > 0 else question_number
+                for field in QUESTION_FIELDS:
+                    setattr(question, field, data[field])
 
             # Обрабатываем изображение
             if question_image_path and not dry_run:
@@ -0,0 +1,403 @@
+"""
+Нагрузочный тест сценария соискателя
+
+Виртуальные соискатели проходят полный сценарий через HTTP API:
+    create_session -> start -> questions -> N x submit_answer -> complete -> download_pdf
+Конкурентность повышается ступенями (--concurrency 1,2,4,8,16); на каждой
+ступени считаются пропускная способность, доля ошибок и p50/p95 по шагам.
+Насыщение - первая ступень, после которой пропускная способность перестает
+расти (прирост меньше --min-gain) или растет доля ошибок; с ним сравнивается
+каждое изменение масштабирования (--output, затем --baseline).
+
+Сервер запускается с заглушками Gemini и SMTP (personnel_testing/loadtest_settings.py),
+см. DEPLOYMENT.md, раздел «Нагрузочное тестирование». Нужен пакет httpx.
+
+Использование:
+    python manage.py loadtest --create-user
+    python manage.py loadtest --base-url http://127.0.0.1:8001 --concurrency 1,2,4,8,16 --duration 60
+    python manage.py loadtest --test-type productivity --answers 20 --output bench/load.json
+    python manage.py loadtest --baseline bench/load.json --output bench/load_after.json
+"""
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tests.utils.benchmarking import PRODUCTIVITY_ANSWER_PARTS, load_results, run_metadata, save_results, summarize
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
+STEPS = ('create_session', 'start', 'questions', 'submit_answer', 'complete', 'download_pdf')
+
+LOADTEST_PLAN_NAME = 'Нагрузочный тест'
+
+class JourneyFailed(Exception):
+    """Шаг сценария завершился ошибкой; сценарий соискателя прерывается"""
+
+
+def answer_value(test_type, rng):
+    if test_type == 'iq_test':
+        return rng.randint(1, 6)
+    if test_type == 'personal_qualities':
+        return rng.choice(('yes', 'no', 'sometimes'))
+    return ' '.join(rng.sample(PRODUCTIVITY_ANSWER_PARTS, 2))
+
+
+class LevelStats:
+    """Замеры одной ступени конкурентности"""
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = Counter()
+        self.failures = Counter()
+        self.journey_times = []
+
+    async def request(self, client, step, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.errors[step] += 1
+            raise JourneyFailed(f'{step}: {type(e).__name__}')
+        self.timings[step].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[step] += 1
+            raise JourneyFailed(f'{step}: HTTP {response.status_code} {response.text[:120]}')
+        return response
+
+    def summary(self, concurrency, elapsed):
+        requests = sum(len(samples) for samples in self.timings.values()) + sum(self.errors.values())
+        errors = sum(self.errors.values())
+        return {
+            'concurrency': concurrency,
+            'elapsed_s': round(elapsed, 2),
+            'journeys': len(self.journey_times),
+            'failed_journeys': sum(self.failures.values()),
+            'journeys_per_s': round(len(self.journey_times) / elapsed, 3),
+            'requests_per_s': round(requests / elapsed, 2),
+            'error_rate': round(errors / requests, 4) if requests else 0.0,
+            'journey': summarize(self.journey_times) if self.journey_times else None,
+            'steps': {
+                step: {
+                    'requests': len(self.timings[step]),
+                    'errors': self.errors[step],
+                    **(summarize(self.timings[step]) if self.timings[step] else {}),
+                }
+                for step in STEPS
+            },
+            'failures': dict(self.failures.most_common(5)),
+        }
+
+
+async def run_journey(client, stats, test, token, options, rng, number):
+    """Один соискатель от создания сессии до скачивания PDF"""
+    auth = {'Authorization': f'Bearer {token}'}
+    response = await stats.request(client, 'create_session', 'POST', '/api/tests/sessions/create_session/', json={
+        'test_id': test['id'],
+        'candidate_email': f'loadtest+{number}-{rng.getrandbits(32):x}@example.com',
+        'candidate_name': f'Соискатель {number}',
+        'candidate_age': rng.randint(20, 55),
+    }, headers=auth)
+    session_url = f"/api/tests/sessions/{response.json()['id']}/"
+
+    await stats.request(client, 'start', 'GET', session_url + 'start/')
+    response = await stats.request(client, 'questions', 'GET', session_url + 'questions/')
+    numbers = [question['question_number'] for question in response.json()]
+    numbers = numbers or list(range(1, test['questions_count'] + 1))
+    if options['answers']:
+        numbers = numbers[:options['answers']]
+
+    think = options['think_ms'] / 1000
+    for question_number in numbers:
+        await stats.request(client, 'submit_answer', 'POST', session_url + 'submit_answer/', json={
+            'question_number': question_number,
+            'answer_value': answer_value(test['test_type'], rng),
+        })
+        if think:
+            await asyncio.sleep(think)
+
+    await stats.request(client, 'complete', 'POST', session_url + 'complete/')
+    await stats.request(client, 'download_pdf', 'GET', session_url + 'download_pdf/', headers=auth)
+
+
+async def run_level(concurrency, test, token, options):
+    """Ступень: concurrency соискателей повторяют сценарий до конца --duration"""
+    stats = LevelStats()
+    deadline = time.monotonic() + options['duration']
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    counter = iter(range(1, 10 ** 9))
+
+    async with httpx.AsyncClient(base_url=options['base_url'], timeout=options['timeout'], limits=limits) as client:
+        async def candidate(index):
+            rng = random.Random(f"{options['seed']}:{concurrency}:{index}")
+            # Новые сценарии не начинаются после дедлайна, начатые доходят до конца
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    await run_journey(client, stats, test, token, options, rng, next(counter))
+                except JourneyFailed as e:
+                    stats.failures[str(e)] += 1
+                else:
+                    stats.journey_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(candidate(index) for index in range(concurrency)))
+        return stats.summary(concurrency, time.perf_counter() - started)
+
+
+def find_saturation(levels, min_gain, max_error_rate):
+    """
+    Ступень насыщения: последняя, после которой пропускная способность еще росла
+
+    Returns:
+        dict | None: {'concurrency', 'requests_per_s', 'reason'} или None,
+                     если насыщение в пройденном диапазоне не достигнуто
+    """
+    for previous, current in zip(levels, levels[1:]):
+        if current['error_rate'] > max_error_rate:
+            reason = f"доля ошибок {current['error_rate']:.1%} при конкурентности {current['concurrency']}"
+        elif previous['requests_per_s'] and (
+            current['requests_per_s'] / previous['requests_per_s'] - 1 < min_gain
+        ):
+            reason = (
+                f"пропускная способность {previous['requests_per_s']} -> {current['requests_per_s']} "
+                f"запросов/с при конкурентности {current['concurrency']}"
+            )
+        else:
+            continue
+        return {
+            'concurrency': previous['concurrency'],
+            'requests_per_s': previous['requests_per_s'],
+            'reason': reason,
+        }
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест сценария соискателя с повышением конкурентности'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            default='http://127.0.0.1:8001',
+            help='Адрес сервера (по умолчанию http://127.0.0.1:8001)',
+        )
+        parser.add_argument(
+            '--email',
+            default='loadtest@example.com',
+            help='Пользователь, создающий сессии (по умолчанию loadtest@example.com)',
+        )
+        parser.add_argument(
+            '--password',
+            default='loadtest-password',
+            help='Пароль пользователя',
+        )
+        parser.add_argument(
+            '--create-user',
+            action='store_true',
+            help='Создать пользователя с подпиской в БД этих настроек и выйти',
+        )
+        parser.add_argument(
+            '--test-type',
+            choices=('iq_test', 'personal_qualities', 'productivity'),
+            default='productivity',
+            help='Тип теста в сценарии (по умолчанию productivity)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            default='1,2,4,8,16',
+            help='Ступени конкурентности через запятую (по умолчанию 1,2,4,8,16)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=60.0,
+            help='Длительность ступени в секундах (по умолчанию 60)',
+        )
+        parser.add_argument(
+            '--answers',
+            type=int,
+            default=0,
+            help='Сколько ответов отправлять (по умолчанию все вопросы теста)',
+        )
+        parser.add_argument(
+            '--think-ms',
+            type=float,
+            default=0.0,
+            help='Пауза соискателя между ответами в миллисекундах (по умолчанию 0)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=300.0,
+            help='Таймаут запроса в секундах (по умолчанию 300, как у gunicorn)',
+        )
+        parser.add_argument(
+            '--min-gain',
+            type=float,
+            default=10.0,
+            help='Минимальный прирост пропускной способности между ступенями, %% (по умолчанию 10)',
+        )
+        parser.add_argument(
+            '--max-error-rate',
+            type=float,
+            default=1.0,
+            help='Доля ошибок, при которой ступень считается насыщенной, %% (по умолчанию 1)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора ответов (по умолчанию 42)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Сохранить результаты в JSON файл',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON файл прошлого прогона (--output): сравнить насыщение и пропускную способность',
+        )
+
+    def handle(self, *args, **options):
+        if options['create_user']:
+            self._create_user(options['email'], options['password'])
+            return
+
+        if not HTTPX_AVAILABLE:
+            raise CommandError('Для нагрузочного теста нужен пакет httpx: pip install httpx')
+        try:
+            levels = sorted({int(value) for value in options['concurrency'].split(',') if value.strip()})
+        except ValueError:
+            raise CommandError('--concurrency: список целых чисел через запятую')
+        if not levels or levels[0] <= 0:
+            raise CommandError('--concurrency: ступени должны быть больше 0')
+        baseline = load_results(options['baseline']) if options['baseline'] else None
+
+        token, test = asyncio.run(self._prepare(options))
+        self.stdout.write(f"Тест «{test['name']}» ({test['test_type']}), сервер {options['base_url']}")
+
+        results = {'levels': []}
+        for concurrency in levels:
+            self.stdout.write(f'Конкурентность {concurrency}, {options["duration"]:.0f} с...')
+            level = asyncio.run(run_level(concurrency, test, token, options))
+            results['levels'].append(level)
+            self._print_level(level)
+
+        results['saturation'] = find_saturation(
+            results['levels'], options['min_gain'] / 100, options['max_error_rate'] / 100,
+        )
+        self._print_saturation(results['saturation'], (baseline or {}).get('saturation'), bool(baseline))
+        if baseline:
+            self._print_comparison(results['levels'], baseline.get('levels', []))
+
+        if options['output']:
+            meta = run_metadata(**{
+                key: options[key] for key in (
+                    'base_url', 'test_type', 'concurrency', 'duration', 'answers', 'think_ms', 'seed',
+                )
+            })
+            save_results(options['output'], meta, results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    async def _prepare(self, options):
+        """JWT токен пользователя и тест нужного типа"""
+        async with httpx.AsyncClient(base_url=options['base_url'], timeout=options['timeout']) as client:
+            try:
+                response = await client.post('/api/accounts/users/login/', json={
+                    'email': options['email'], 'password': options['password'],
+                })
+            except httpx.HTTPError as e:
+                raise CommandError(f"Сервер {options['base_url']} недоступен: {e}")
+            if response.status_code != 200:
+                raise CommandError(
+                    f'Не удалось войти ({response.status_code}): {response.text[:200]}. '
+                    f'Создайте пользователя: python manage.py loadtest --create-user'
+                )
+            token = response.json()['access']
+
+            data = (await client.get('/api/tests/tests/')).json()
+            tests = data['results'] if isinstance(data, dict) else data
+        for test in tests:
+            if test['test_type'] == options['test_type']:
+                return token, test
+        raise CommandError(f"Тест {options['test_type']} не найден: выполните python manage.py init_tests")
+
+    def _create_user(self, email, password):
+        from accounts.models import Subscription, SubscriptionPlan, User
+
+        user, created = User.objects.get_or_create(
+            email=email, defaults={'username': email.split('@')[0]},
+        )
+        user.set_password(password)
+        user.is_email_verified = True
+        user.save()
+
+        plan, _ = SubscriptionPlan.objects.get_or_create(
+            name=LOADTEST_PLAN_NAME,
+            defaults={'price': 0, 'duration_days': 365, 'tests_count': 1_000_000, 'is_active': False},
+        )
+        subscription = Subscription.objects.filter(user=user, plan=plan).first()
+        if subscription is None:
+            Subscription.objects.create(user=user, plan=plan)
+        else:
+            # Пополнение остатка после прошлых прогонов
+            subscription.remaining_tests = plan.tests_count
+            subscription.is_active = True
+            subscription.save(update_fields=['remaining_tests', 'is_active', 'updated_at'])
+
+        action = 'создан' if created else 'обновлен'
+        self.stdout.write(self.style.SUCCESS(f'Пользователь {email} {action}, подписка на {plan.tests_count} тестов'))
+
+    def _print_level(self, level):
+        self.stdout.write(self.style.SUCCESS(
+            f"  {level['journeys_per_s']} сценариев/с  {level['requests_per_s']} запросов/с  "
+            f"ошибок {level['error_rate']:.1%}  сценариев {level['journeys']} (сбоев {level['failed_journeys']})"
+        ))
+        for step in STEPS:
+            summary = level['steps'][step]
+            if not summary['requests']:
+                continue
+            self.stdout.write(
+                f"  {step:<15} p50 {summary['p50_ms']:>10.1f} мс  p95 {summary['p95_ms']:>10.1f} мс  "
+                f"запросов {summary['requests']}  ошибок {summary['errors']}"
+            )
+        for failure, count in level['failures'].items():
+            self.stdout.write(self.style.WARNING(f'  сбой {failure}: {count}'))
+
+    def _print_saturation(self, saturation, before, has_baseline):
+        if saturation is None:
+            self.stdout.write(self.style.WARNING('Насыщение в пройденном диапазоне не достигнуто'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Насыщение при конкурентности {saturation['concurrency']} "
+                f"({saturation['requests_per_s']} запросов/с): {saturation['reason']}"
+            ))
+        if has_baseline:
+            if before:
+                self.stdout.write(
+                    f"  в прошлом прогоне: конкурентность {before['concurrency']}, "
+                    f"{before['requests_per_s']} запросов/с"
+                )
+            else:
+                self.stdout.write('  в прошлом прогоне насыщение не достигнуто')
+
+    def _print_comparison(self, levels, baseline_levels):
+        before_by_concurrency = {level['concurrency']: level for level in baseline_levels}
+        for level in levels:
+            before = before_by_concurrency.get(level['concurrency'])
+            if not before or not before['requests_per_s']:
+                continue
+            change = (level['requests_per_s'] - before['requests_per_s']) / before['requests_per_s'] * 100
+            line = f"  конкурентность {level['concurrency']}: {change:+.1f}% запросов/с"
+            journey, journey_before = level['journey'], before.get('journey')
+            if journey and journey_before:
+                line += f", p95 сценария {journey_before['p95_ms']:.0f} -> {journey['p95_ms']:.0f} мс"
+            self.stdout.write(line)
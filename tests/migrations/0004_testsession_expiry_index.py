@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0003_testquestion_answer_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testsession',
+            index=models.Index(condition=models.Q(('status', 'in_progress')), fields=['expires_at'], name='session_in_progress_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0004_testsession_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testsession',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Начало обработки результатов'),
+        ),
+        migrations.AlterField(
+            model_name='testsession',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает прохождения'), ('in_progress', 'В процессе'), ('processing', 'Обработка результатов'), ('completed', 'Завершен'), ('expired', 'Истек')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0005_testsession_processing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testsession',
+            name='answer_storage',
+            field=models.CharField(choices=[('rows', 'Отдельные записи'), ('packed', 'Упакованный массив')], default='rows', max_length=10, verbose_name='Хранение ответов'),
+        ),
+        migrations.AddField(
+            model_name='testsession',
+            name='packed_answers',
+            field=models.BinaryField(blank=True, default=b'', verbose_name='Упакованные ответы'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0006_testsession_packed_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestSessionScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, verbose_name='Серия или блок')),
+                ('points', models.DecimalField(decimal_places=1, default=0, max_digits=6, verbose_name='Баллы')),
+                ('answered', models.IntegerField(default=0, verbose_name='Отвечено вопросов')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='tests.testsession', verbose_name='Сессия')),
+            ],
+            options={
+                'verbose_name': 'Промежуточный балл сессии',
+                'verbose_name_plural': 'Промежуточные баллы сессий',
+                'unique_together': {('session', 'key')},
+            },
+        ),
+    ]
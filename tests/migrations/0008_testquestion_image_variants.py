@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0007_testsessionscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testquestion',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Варианты изображения'),
+        ),
+    ]
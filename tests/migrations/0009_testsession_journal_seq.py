@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0008_testquestion_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testsession',
+            name='journal_seq',
+            field=models.PositiveIntegerField(default=0, verbose_name='Номер записи журнала ответов'),
+        ),
+    ]
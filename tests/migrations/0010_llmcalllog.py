@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0009_testsession_journal_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCallLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_type', models.CharField(blank=True, max_length=50, verbose_name='Тип теста')),
+                ('model_name', models.CharField(blank=True, max_length=100, verbose_name='Модель')),
+                ('prompt_hash', models.CharField(max_length=64, verbose_name='Хэш промпта (SHA-256)')),
+                ('prompt_chars', models.PositiveIntegerField(default=0, verbose_name='Длина промпта (символов)')),
+                ('input_tokens', models.PositiveIntegerField(blank=True, null=True, verbose_name='Входные токены')),
+                ('output_tokens', models.PositiveIntegerField(blank=True, null=True, verbose_name='Выходные токены')),
+                ('latency_ms', models.PositiveIntegerField(default=0, verbose_name='Время вызова (мс)')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('error_class', models.CharField(blank=True, max_length=100, verbose_name='Класс ошибки')),
+                ('cache_hit', models.BooleanField(default=False, verbose_name='Ответ из кэша')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата вызова')),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to='tests.testsession', verbose_name='Сессия')),
+            ],
+            options={
+                'verbose_name': 'Вызов LLM',
+                'verbose_name_plural': 'Вызовы LLM',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at', 'test_type'], name='llm_call_created_type_idx')],
+            },
+        ),
+    ]
@@ -1,8 +1,11 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.utils import timezone
 from accounts.models import User
 import uuid
 
+from .utils.answer_packing import supports_packing, packed_size, unpack_answers, count_answers
+
 
 class TestType(models.TextChoices):
     IQ_TEST = 'iq_test', 'IQ-тест'
@@ -46,6 +49,8 @@ class TestQuestion(models.Model):
     question_number = models.IntegerField(verbose_name='Номер вопроса')
     question_text = models.TextField(blank=True, verbose_name='Текст вопроса')
     question_image = models.ImageField(upload_to='test_questions/', blank=True, null=True, verbose_name='Изображение вопроса')
+    # Уменьшенные копии изображения с хэшем содержимого в имени (tests/services/question_images.py)
+    image_variants = models.JSONField(default=dict, blank=True, verbose_name='Варианты изображения')
     series = models.CharField(max_length=10, blank=True, verbose_name='Серия (для IQ теста: A, B, C, D, E)')
     question_type = models.CharField(max_length=50, blank=True, verbose_name='Тип вопроса')  # Для личностных качеств: + или -
     block_name = models.CharField(max_length=100, blank=True, verbose_name='Название блока (для личностных качеств)')
@@ -86,12 +91,14 @@ class TestSession(models.Model):
     # Статус прохождения
     STATUS_PENDING = 'pending'
     STATUS_IN_PROGRESS = 'in_progress'
+    STATUS_PROCESSING = 'processing'
     STATUS_COMPLETED = 'completed'
     STATUS_EXPIRED = 'expired'
     
     STATUS_CHOICES = [
         (STATUS_PENDING, 'Ожидает прохождения'),
         (STATUS_IN_PROGRESS, 'В процессе'),
+        (STATUS_PROCESSING, 'Обработка результатов'),
         (STATUS_COMPLETED, 'Завершен'),
         (STATUS_EXPIRED, 'Истек'),
     ]
@@ -100,6 +107,23 @@ class TestSession(models.Model):
     started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало прохождения')
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершение прохождения')
     expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Истекает')
+    processing_started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало обработки результатов')
+    
+    # Хранение ответов: строки TestAnswer или упакованный массив на сессии
+    ANSWER_STORAGE_ROWS = 'rows'
+    ANSWER_STORAGE_PACKED = 'packed'
+    
+    ANSWER_STORAGE_CHOICES = [
+        (ANSWER_STORAGE_ROWS, 'Отдельные записи'),
+        (ANSWER_STORAGE_PACKED, 'Упакованный массив'),
+    ]
+    
+    answer_storage = models.CharField(max_length=10, choices=ANSWER_STORAGE_CHOICES, default=ANSWER_STORAGE_ROWS, verbose_name='Хранение ответов')
+    packed_answers = models.BinaryField(blank=True, default=b'', verbose_name='Упакованные ответы')
+    
+    # Последний примененный номер записи журнала ответов страницы теста
+    # (пакетная отправка submit_answers; записи с меньшим номером пропускаются)
+    journal_seq = models.PositiveIntegerField(default=0, verbose_name='Номер записи журнала ответов')
     
     # Время ограничения
     time_limit_minutes = models.IntegerField(null=True, blank=True, verbose_name='Лимит времени (минуты)')
@@ -111,6 +135,14 @@ class TestSession(models.Model):
         verbose_name = 'Сессия тестирования'
         verbose_name_plural = 'Сессии тестирования'
         ordering = ['-created_at']
+        indexes = [
+            # Частичный индекс для поиска просроченных сессий (команда expire_sessions)
+            models.Index(
+                fields=['expires_at'],
+                name='session_in_progress_expiry_idx',
+                condition=models.Q(status='in_progress'),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.test.name} - {self.candidate_email}'
@@ -122,14 +154,125 @@ class TestSession(models.Model):
             self.started_at = timezone.now()
             if self.time_limit_minutes:
                 self.expires_at = self.started_at + timezone.timedelta(minutes=self.time_limit_minutes)
-            self.save()
+            if settings.COMPACT_ANSWER_STORAGE and supports_packing(self.test.test_type):
+                self.answer_storage = self.ANSWER_STORAGE_PACKED
+                self.packed_answers = bytes(packed_size(self.test.test_type, self.test.questions_count))
+            self.save(update_fields=[
+                'status', 'started_at', 'expires_at', 'answer_storage', 'packed_answers', 'updated_at',
+            ])
+            self.invalidate_cached_state()
 
     def complete_test(self):
-        """Завершить тест"""
-        if self.status == self.STATUS_IN_PROGRESS:
-            self.status = self.STATUS_COMPLETED
-            self.completed_at = timezone.now()
-            self.save()
+        """
+        Завершить тест условным UPDATE
+
+        Вызывается после запроса к LLM, который идет минутами, поэтому строка
+        не перезаписывается целиком (ответы и journal_seq за это время могли
+        измениться), а сессия в обработке завершается, только если захват
+        еще принадлежит этому вызову (его не перехватил другой воркер).
+
+        Returns:
+            bool: True, если сессия завершена этим вызовом
+        """
+        if self.status not in (self.STATUS_IN_PROGRESS, self.STATUS_PROCESSING, self.STATUS_EXPIRED):
+            return False
+
+        now = timezone.now()
+        queryset = TestSession.objects.filter(pk=self.pk, status=self.status)
+        if self.status == self.STATUS_PROCESSING:
+            queryset = queryset.filter(processing_started_at=self.processing_started_at)
+        completed = queryset.update(
+            status=self.STATUS_COMPLETED, completed_at=now, processing_started_at=None, updated_at=now,
+        )
+        if not completed:
+            return False
+
+        self.status = self.STATUS_COMPLETED
+        self.completed_at = now
+        self.processing_started_at = None
+        self.invalidate_cached_state()
+        return True
+
+    def claim_processing(self, stale_seconds, from_status=STATUS_IN_PROGRESS, now=None):
+        """
+        Захватить обработку результатов условным UPDATE
+
+        Переводит сессию из from_status (или из зависшей обработки, начатой более
+        stale_seconds назад) в статус «Обработка результатов». Повторный запрос
+        завершения, пришедший во время обработки, захват не получит.
+
+        Returns:
+            bool: True, если обработка захвачена этим вызовом
+        """
+        now = now or timezone.now()
+        stale_before = now - timezone.timedelta(seconds=stale_seconds)
+        claimed = TestSession.objects.filter(pk=self.pk).filter(
+            models.Q(status=from_status)
+            | models.Q(status=self.STATUS_PROCESSING, processing_started_at__lt=stale_before)
+        ).update(status=self.STATUS_PROCESSING, processing_started_at=now, updated_at=now)
+        if not claimed:
+            return False
+
+        self.status = self.STATUS_PROCESSING
+        self.processing_started_at = now
+        self.invalidate_cached_state()
+        return True
+
+    def release_processing(self, status=STATUS_IN_PROGRESS):
+        """Снять захват обработки (после ошибки), если он еще принадлежит этому вызову"""
+        released = TestSession.objects.filter(
+            pk=self.pk,
+            status=self.STATUS_PROCESSING,
+            processing_started_at=self.processing_started_at,
+        ).update(status=status, processing_started_at=None, updated_at=timezone.now())
+        if released:
+            self.status = status
+            self.processing_started_at = None
+            self.invalidate_cached_state()
+
+    def invalidate_cached_state(self):
+        """Сбросить кэш состояния сессии после фиксации транзакции"""
+        from .services.session_cache import invalidate_session_state
+
+        session_id = self.pk
+        transaction.on_commit(lambda: invalidate_session_state(session_id))
+
+    @property
+    def uses_packed_answers(self):
+        return self.answer_storage == self.ANSWER_STORAGE_PACKED
+
+    def get_answers(self):
+        """
+        Ответы сессии независимо от способа хранения
+
+        Returns:
+            list: [{'question_number': int, 'answer': str, 'series': str}, ...]
+        """
+        if self.uses_packed_answers:
+            return unpack_answers(self.packed_answers, self.test.test_type)
+        return [
+            {
+                'question_number': question_number,
+                'answer': answer_value,
+                'series': series,
+            }
+            for question_number, answer_value, series in self.answers.order_by('question_number').values_list(
+                'question_number', 'answer_value', 'series'
+            )
+        ]
+
+    def get_answers_count(self):
+        """Количество вопросов с ответом"""
+        if self.uses_packed_answers:
+            return count_answers(self.packed_answers, self.test.test_type)
+        return self.answers.count()
+
+    def is_deadline_passed(self, grace_seconds=0, now=None):
+        """Истекло ли время прохождения (с учетом допуска на сетевые задержки)"""
+        if not self.expires_at:
+            return False
+        now = now or timezone.now()
+        return now > self.expires_at + timezone.timedelta(seconds=grace_seconds)
 
 
 class TestAnswer(models.Model):
@@ -150,6 +293,22 @@ class TestAnswer(models.Model):
         return f'Session {self.session.id} - Q{self.question_number}'
 
 
+class TestSessionScore(models.Model):
+    """Накопленный балл сессии по серии (IQ-тест) или блоку (личностные качества)"""
+    session = models.ForeignKey(TestSession, on_delete=models.CASCADE, related_name='scores', verbose_name='Сессия')
+    key = models.CharField(max_length=100, verbose_name='Серия или блок')
+    points = models.DecimalField(max_digits=6, decimal_places=1, default=0, verbose_name='Баллы')
+    answered = models.IntegerField(default=0, verbose_name='Отвечено вопросов')
+
+    class Meta:
+        verbose_name = 'Промежуточный балл сессии'
+        verbose_name_plural = 'Промежуточные баллы сессий'
+        unique_together = ['session', 'key']
+
+    def __str__(self):
+        return f'Session {self.session_id} - {self.key}: {self.points}'
+
+
 class TestResult(models.Model):
     """Результат прохождения теста"""
     session = models.OneToOneField(TestSession, on_delete=models.CASCADE, related_name='result', verbose_name='Сессия')
@@ -182,3 +341,31 @@ class TestResult(models.Model):
 
     def __str__(self):
         return f'Result for {self.session}'
+
+
+class LLMCallLog(models.Model):
+    """Запись журнала обращений к LLM (Gemini): токены, задержка, попытки"""
+    session = models.ForeignKey(TestSession, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='llm_calls', verbose_name='Сессия')
+    test_type = models.CharField(max_length=50, blank=True, verbose_name='Тип теста')
+    model_name = models.CharField(max_length=100, blank=True, verbose_name='Модель')
+    prompt_hash = models.CharField(max_length=64, verbose_name='Хэш промпта (SHA-256)')
+    prompt_chars = models.PositiveIntegerField(default=0, verbose_name='Длина промпта (символов)')
+    input_tokens = models.PositiveIntegerField(null=True, blank=True, verbose_name='Входные токены')
+    output_tokens = models.PositiveIntegerField(null=True, blank=True, verbose_name='Выходные токены')
+    latency_ms = models.PositiveIntegerField(default=0, verbose_name='Время вызова (мс)')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    error_class = models.CharField(max_length=100, blank=True, verbose_name='Класс ошибки')
+    cache_hit = models.BooleanField(default=False, verbose_name='Ответ из кэша')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата вызова')
+
+    class Meta:
+        verbose_name = 'Вызов LLM'
+        verbose_name_plural = 'Вызовы LLM'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'test_type'], name='llm_call_created_type_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model_name} {self.test_type or "-"} {self.latency_ms} мс'
@@ -3,12 +3,19 @@ from .models import Test, TestQuestion, TestSession, TestAnswer, TestResult
 
 
 class TestQuestionSerializer(serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = TestQuestion
-        fields = ('id', 'question_number', 'question_text', 'question_image', 'series', 
+        fields = ('id', 'question_number', 'question_text', 'question_image', 'image_srcset', 'series',
                  'question_type', 'block_name', 'answer_options', 'display_type', 'order')
         read_only_fields = ('id',)
 
+    def get_image_srcset(self, obj):
+        # Копии строит python manage.py build_question_images; без них - пустой словарь
+        from .services.question_images import get_srcset
+        return get_srcset(obj.image_variants)
+
 
 class TestSerializer(serializers.ModelSerializer):
     class Meta:
@@ -32,12 +39,12 @@ class TestSessionSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'user', 'test', 'candidate_email', 'candidate_name', 'candidate_age',
             'status', 'started_at', 'completed_at', 'expires_at', 'time_limit_minutes',
-            'created_at', 'updated_at', 'answers_count'
+            'journal_seq', 'created_at', 'updated_at', 'answers_count'
         )
-        read_only_fields = ('id', 'user', 'created_at', 'updated_at', 'started_at', 'completed_at')
+        read_only_fields = ('id', 'user', 'journal_seq', 'created_at', 'updated_at', 'started_at', 'completed_at')
     
     def get_answers_count(self, obj):
-        return TestAnswer.objects.filter(session=obj).count()
+        return obj.get_answers_count()
 
 
 class TestResultSerializer(serializers.ModelSerializer):
@@ -0,0 +1,126 @@
+"""
+Пакетная запись ответов из журнала страницы теста
+
+Страница теста складывает ответы в локальный журнал, где каждая запись
+получает возрастающий номер (seq), и отправляет их пачками. На сессии
+хранится номер последней примененной записи (TestSession.journal_seq):
+повторно присланные записи пропускаются, поэтому повтор пачки после обрыва
+связи безопасен. Номера пропущенных записей возвращаются в stale: если
+страница начала нумерацию заново (журнал потерян или ответы идут с другого
+устройства), она перенумеровывает эти записи и отправляет их снова. Пачки одной сессии применяются по очереди под блокировкой
+строки сессии; пачка записывается несколькими запросами независимо от числа
+ответов в ней.
+"""
+from django.db import transaction
+
+from tests.models import TestSession
+from tests.services.answer_storage import save_packed_answers
+from tests.services.session_scores import record_answers
+
+
+class JournalError(Exception):
+    """Пачка не может быть применена (сессия не в процессе прохождения)"""
+
+
+def parse_entries(raw_entries):
+    """
+    Проверить записи журнала из запроса
+
+    Returns:
+        tuple: (записи [{'seq', 'question_number', 'answer_value', 'series'}], отклоненные [{'seq', 'error'}])
+    """
+    entries = []
+    rejected = []
+    for raw in raw_entries:
+        if not isinstance(raw, dict):
+            continue
+        try:
+            seq = int(raw.get('seq'))
+        except (ValueError, TypeError):
+            continue
+        if seq <= 0:
+            continue
+        try:
+            question_number = int(raw.get('question_number'))
+        except (ValueError, TypeError):
+            rejected.append({'seq': seq, 'error': 'question_number должен быть числом'})
+            continue
+        answer_value = raw.get('answer_value')
+        if answer_value is None:
+            rejected.append({'seq': seq, 'error': 'answer_value обязателен'})
+            continue
+        entries.append({
+            'seq': seq,
+            'question_number': question_number,
+            'answer_value': answer_value,
+            'series': raw.get('series') or '',
+        })
+    return entries, rejected
+
+
+def apply_entries(state, entries, rejected=()):
+    """
+    Применить записи журнала с номерами больше уже примененного
+
+    Args:
+        state: состояние сессии из session_cache.get_session_state
+        rejected: записи, отклоненные при разборе (тоже подтверждаются,
+                  чтобы страница не отправляла их повторно)
+
+    Returns:
+        dict: {'acked_seq': номер последней примененной записи,
+               'applied': число записанных ответов, 'rejected': [{'seq', 'error'}],
+               'stale': номера пропущенных записей с seq не больше acked_seq}
+
+    Raises:
+        JournalError: если сессия не в процессе прохождения
+    """
+    session_id = state['id']
+    test_type = state['test__test_type']
+    packed = state['answer_storage'] == TestSession.ANSWER_STORAGE_PACKED
+    rejected = list(rejected)
+    applied = 0
+
+    with transaction.atomic():
+        acked_seq = TestSession.objects.select_for_update().filter(
+            pk=session_id, status=TestSession.STATUS_IN_PROGRESS
+        ).values_list('journal_seq', flat=True).first()
+        if acked_seq is None:
+            raise JournalError('Тест не начат')
+
+        # Для каждого вопроса важен только последний ответ
+        latest = {}
+        stale = []
+        for entry in sorted(entries, key=lambda e: e['seq']):
+            if entry['seq'] > acked_seq:
+                latest[entry['question_number']] = entry
+            else:
+                stale.append(entry['seq'])
+
+        if packed:
+            valid = {}
+            for question_number, entry in latest.items():
+                if not 1 <= question_number <= state['test__questions_count']:
+                    rejected.append({'seq': entry['seq'], 'error': 'Неверный номер вопроса'})
+                else:
+                    valid[question_number] = entry['answer_value']
+            if valid:
+                _, errors = save_packed_answers(session_id, test_type, valid)
+                rejected.extend(
+                    {'seq': latest[question_number]['seq'], 'error': error}
+                    for question_number, error in errors.items()
+                )
+                applied = len(valid) - len(errors)
+        elif latest:
+            record_answers(state, {
+                question_number: (entry['answer_value'], entry['series'])
+                for question_number, entry in latest.items()
+            })
+            applied = len(latest)
+
+        max_seq = max([e['seq'] for e in entries] + [r['seq'] for r in rejected], default=0)
+        if max_seq > acked_seq:
+            acked_seq = max_seq
+            TestSession.objects.filter(pk=session_id).update(journal_seq=acked_seq)
+
+    return {'acked_seq': acked_seq, 'applied': applied, 'rejected': rejected, 'stale': stale}
@@ -0,0 +1,90 @@
+"""
+Запись ответов в упакованный массив сессии (TestSession.packed_answers)
+
+В PostgreSQL ответ записывается одним UPDATE с set_byte/get_byte, без чтения
+строки сессии и без гонки между параллельными ответами одного соискателя.
+На других СУБД используется блокировка строки и запись массива целиком.
+"""
+from django.db import connection, models, transaction
+from django.db.models import F, Func, Value
+
+from tests.models import TestSession
+from tests.utils.answer_packing import answer_position, encode_answer, pack_answer
+
+
+class _GetByte(Func):
+    function = 'get_byte'
+    output_field = models.IntegerField()
+
+
+class _SetByte(Func):
+    function = 'set_byte'
+    output_field = models.BinaryField()
+
+
+def save_packed_answer(session_id, test_type, question_number, value):
+    """
+    Записать ответ сессии в упакованном виде
+
+    Returns:
+        bool: True, если ответ записан (сессия в процессе прохождения)
+
+    Raises:
+        ValueError: если значение ответа недопустимо для теста
+    """
+    code = encode_answer(test_type, value)
+    index, shift, mask = answer_position(test_type, question_number)
+    queryset = TestSession.objects.filter(
+        pk=session_id,
+        status=TestSession.STATUS_IN_PROGRESS,
+        answer_storage=TestSession.ANSWER_STORAGE_PACKED,
+    )
+
+    if connection.vendor == 'postgresql':
+        current = _GetByte(F('packed_answers'), Value(index))
+        return queryset.update(
+            packed_answers=_SetByte(
+                F('packed_answers'),
+                Value(index),
+                current.bitand(~mask & 0xFF).bitor(code << shift),
+            )
+        ) == 1
+
+    with transaction.atomic():
+        session = queryset.select_for_update().only('packed_answers').first()
+        if session is None:
+            return False
+        session.packed_answers = pack_answer(session.packed_answers, test_type, question_number, value)
+        session.save(update_fields=['packed_answers'])
+    return True
+
+
+def save_packed_answers(session_id, test_type, answers):
+    """
+    Записать несколько ответов сессии в упакованном виде одним UPDATE
+
+    Args:
+        answers: {номер вопроса: значение}
+
+    Returns:
+        tuple: (записаны ли ответы, {номер вопроса: ошибка} для недопустимых значений)
+    """
+    errors = {}
+    with transaction.atomic():
+        session = TestSession.objects.select_for_update().filter(
+            pk=session_id,
+            status=TestSession.STATUS_IN_PROGRESS,
+            answer_storage=TestSession.ANSWER_STORAGE_PACKED,
+        ).only('packed_answers').first()
+        if session is None:
+            return False, errors
+
+        data = session.packed_answers
+        for question_number, value in answers.items():
+            try:
+                data = pack_answer(data, test_type, question_number, value)
+            except ValueError as e:
+                errors[question_number] = str(e)
+        session.packed_answers = data
+        session.save(update_fields=['packed_answers'])
+    return True, errors
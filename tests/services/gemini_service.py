@@ -1,130 +1,214 @@
 """
 Сервис для работы с Gemini 2.5 Flash API
+
+Провайдер выбирается настройкой LLM_PROVIDER из реестра LLM_PROVIDERS
+(см. llm_providers): без сети вызовы обслуживает локальная заглушка fake.
+При заданном LLM_HEDGE_PROVIDER медленный ответ основного провайдера
+дублируется резервному (см. llm_hedging).
 """
-import os
+import asyncio
 import json
 import logging
+import re
+import time
 from django.conf import settings
+from django.core.cache import cache
+
+from personnel_testing.prometheus_metrics import GEMINI_LATENCY, GEMINI_RATE_LIMITED, GEMINI_RETRIES
+
+from . import llm_hedging
+from .llm_ledger import LLMCall
+from .llm_providers import get_hedge_provider, get_llm_provider
 
 logger = logging.getLogger(__name__)
 
-try:
-    # Используем старый пакет google.generativeai (новый google.genai имеет другой API)
-    # TODO: Обновить на google.genai после изучения нового API
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-    USE_NEW_API = False
-except ImportError:
-    GEMINI_AVAILABLE = False
-    USE_NEW_API = False
-    genai = None
-
-
-def get_gemini_client():
-    """Получить клиент Gemini API"""
-    if not GEMINI_AVAILABLE:
-        raise ImportError("Библиотека google-generativeai не установлена. Установите: pip install google-generativeai")
+
+# Уменьшаем max_output_tokens для более быстрого ответа
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 16384,  # Уменьшено для более быстрого ответа
+}
+
+
+def _response_cache_key(call):
+    return f'gemini_response:{call.model_name}:{call.prompt_hash}'
+
+
+def _retry_delay(error, attempt, max_retries, retry_delay):
+    """
+    Пауза перед повтором после ошибки вызова
+
+    Returns:
+        int: задержка в секундах, если запрос стоит повторить
+
+    Raises:
+        Exception: если повтор не поможет или попытки исчерпаны
+    """
+    error_str = str(error)
+    error_type = type(error).__name__
     
-    api_key = getattr(settings, 'GEMINI_API_KEY', os.getenv('GEMINI_API_KEY'))
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY не установлен в настройках или переменных окружения")
+    logger.error(f"[Gemini API] Ошибка (попытка {attempt + 1}/{max_retries}): {error_type}: {error_str[:200]}")
     
-    # Используем старый API (google.generativeai)
-    # Предупреждение о deprecation можно игнорировать, API все еще работает
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash')
+    # Проверка на таймаут или зависание
+    if ("timeout" in error_str.lower() or 
+        "deadline" in error_str.lower() or 
+        "timed out" in error_str.lower() or
+        "SIGKILL" in error_str or
+        error_type in ["Timeout", "DeadlineExceeded"]):
+        if attempt < max_retries - 1:
+            logger.warning(f"[Gemini API] Таймаут. Повтор через {retry_delay} секунд...")
+            GEMINI_RETRIES.labels('timeout').inc()
+            return retry_delay
+        raise Exception(f"Таймаут при вызове Gemini API после {max_retries} попыток. Запрос занял слишком много времени.")
+    
+    # Проверка на ошибку квоты (429)
+    if "429" in error_str or "quota" in error_str.lower() or "rate" in error_str.lower():
+        GEMINI_RATE_LIMITED.inc()
+        if attempt < max_retries - 1:
+            # Извлекаем время задержки из ошибки, если указано
+            delay = retry_delay
+            if "retry_delay" in error_str.lower():
+                # Пытаемся извлечь секунды из ошибки
+                match = re.search(r'seconds[:\s]+(\d+)', error_str, re.IGNORECASE)
+                if match:
+                    delay = int(match.group(1)) + 2  # Добавляем 2 секунды для безопасности
+            
+            logger.warning(f"Превышена квота Gemini API. Попытка {attempt + 1}/{max_retries}. Повтор через {delay} секунд...")
+            GEMINI_RETRIES.labels('quota').inc()
+            return delay
+        raise Exception(f"Превышена квота Gemini API после {max_retries} попыток. Попробуйте позже или проверьте ваш план подписки.")
     
-    return model
+    # Для других ошибок не повторяем
+    raise Exception(f"Ошибка при вызове Gemini API: {error_str}")
 
 
-def call_gemini(prompt, system_instruction=None, max_retries=2, retry_delay=5, timeout=180):
+def call_gemini(prompt, system_instruction=None, max_retries=2, retry_delay=5, timeout=None):
     """
     Вызвать Gemini API с промптом
     
+    Каждый вызов записывается в журнал LLMCallLog (см. llm_ledger) с моделью
+    провайдера, чей ответ получен. При GEMINI_RESPONSE_CACHE_TTL > 0 ответ
+    на тот же промпт берется из кэша.
+    
     Args:
         prompt: Текст промпта
         system_instruction: Системная инструкция (опционально)
         max_retries: Максимальное количество попыток при ошибке квоты
         retry_delay: Задержка между попытками в секундах
-        timeout: Таймаут запроса в секундах (по умолчанию 180 секунд = 3 минуты)
+        timeout: Таймаут запроса в секундах (по умолчанию timeout провайдера из LLM_PROVIDERS)
     
     Returns:
         str: Ответ от Gemini
     """
-    import time
+    try:
+        provider = get_llm_provider()
+    except Exception as e:
+        LLMCall(prompt, '', system_instruction).record(error=e)
+        raise
+    hedge = get_hedge_provider()
     
-    model = get_gemini_client()
+    call = LLMCall(prompt, provider.model_name, system_instruction)
+    cache_key = _response_cache_key(call)
+    cache_ttl = settings.GEMINI_RESPONSE_CACHE_TTL
+    if cache_ttl:
+        text = cache.get(cache_key)
+        if text is not None:
+            call.record(cache_hit=True)
+            return text
     
-    # Уменьшаем max_output_tokens для более быстрого ответа
-    generation_config = {
-        "temperature": 0.7,
-        "top_p": 0.95,
-        "top_k": 40,
-        "max_output_tokens": 16384,  # Уменьшено для более быстрого ответа
-    }
+    last_error = None
+    for attempt in range(max_retries):
+        call.attempts += 1
+        logger.info(f"[Gemini API] Попытка {attempt + 1}/{max_retries}. Длина промпта: {len(prompt)} символов")
+        started = time.perf_counter()
+        try:
+            # Таймаут провайдера должен быть меньше таймаута Gunicorn (300 секунд)
+            answered_by, response = llm_hedging.generate(
+                provider, hedge, prompt, system_instruction, GENERATION_CONFIG, timeout,
+            )
+            text = response.text
+        except Exception as e:
+            GEMINI_LATENCY.labels('error').observe(time.perf_counter() - started)
+            last_error = e
+            try:
+                delay = _retry_delay(e, attempt, max_retries, retry_delay)
+            except Exception:
+                call.record(error=e)
+                raise
+            time.sleep(delay)
+            continue
+        
+        GEMINI_LATENCY.labels('success').observe(time.perf_counter() - started)
+        logger.info(f"[Gemini API] Успешно получен ответ ({answered_by.name}), длина: {len(text)} символов")
+        call.model_name = answered_by.model_name
+        call.record(response=response)
+        if cache_ttl:
+            cache.set(cache_key, text, cache_ttl)
+        return text
+    
+    # Если все попытки исчерпаны
+    call.record(error=last_error)
+    raise Exception(f"Ошибка при вызове Gemini API после {max_retries} попыток: {str(last_error)}")
+
+
+async def call_gemini_async(prompt, system_instruction=None, max_retries=2, retry_delay=5, timeout=None):
+    """
+    Асинхронный вариант call_gemini для ASGI-режима
+    
+    Ожидание ответа не занимает поток: в одном процессе uvicorn одновременно
+    ждут ответа Gemini сотни запросов. Повторы, хеджирование, сообщения об
+    ошибках, журнал и кэш ответов те же, что у call_gemini.
+    
+    Returns:
+        str: Ответ от Gemini
+    """
+    try:
+        provider = get_llm_provider()
+    except Exception as e:
+        await LLMCall(prompt, '', system_instruction).arecord(error=e)
+        raise
+    hedge = get_hedge_provider()
+    
+    call = LLMCall(prompt, provider.model_name, system_instruction)
+    cache_key = _response_cache_key(call)
+    cache_ttl = settings.GEMINI_RESPONSE_CACHE_TTL
+    if cache_ttl:
+        text = await cache.aget(cache_key)
+        if text is not None:
+            await call.arecord(cache_hit=True)
+            return text
     
     last_error = None
     for attempt in range(max_retries):
+        call.attempts += 1
+        logger.info(f"[Gemini API] Попытка {attempt + 1}/{max_retries} (async). Длина промпта: {len(prompt)} символов")
+        started = time.perf_counter()
         try:
-            logger.info(f"[Gemini API] Попытка {attempt + 1}/{max_retries}. Длина промпта: {len(prompt)} символов")
-            
-            # Используем старый API (google.generativeai)
-            # Таймаут контролируется на уровне Gunicorn (300 секунд)
-            if system_instruction:
-                response = model.generate_content(
-                    prompt,
-                    generation_config=generation_config,
-                    system_instruction=system_instruction
-                )
-            else:
-                response = model.generate_content(
-                    prompt,
-                    generation_config=generation_config
-                )
-            
-            logger.info(f"[Gemini API] Успешно получен ответ, длина: {len(response.text)} символов")
-            return response.text
-            
+            answered_by, response = await llm_hedging.agenerate(
+                provider, hedge, prompt, system_instruction, GENERATION_CONFIG, timeout,
+            )
+            text = response.text
         except Exception as e:
-            error_str = str(e)
+            GEMINI_LATENCY.labels('error').observe(time.perf_counter() - started)
             last_error = e
-            error_type = type(e).__name__
-            
-            logger.error(f"[Gemini API] Ошибка (попытка {attempt + 1}/{max_retries}): {error_type}: {error_str[:200]}")
-            
-            # Проверка на таймаут или зависание
-            if ("timeout" in error_str.lower() or 
-                "deadline" in error_str.lower() or 
-                "timed out" in error_str.lower() or
-                "SIGKILL" in error_str or
-                error_type in ["Timeout", "DeadlineExceeded"]):
-                if attempt < max_retries - 1:
-                    logger.warning(f"[Gemini API] Таймаут. Повтор через {retry_delay} секунд...")
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    raise Exception(f"Таймаут при вызове Gemini API после {max_retries} попыток. Запрос занял слишком много времени.")
-            
-            # Проверка на ошибку квоты (429)
-            if "429" in error_str or "quota" in error_str.lower() or "rate" in error_str.lower():
-                if attempt < max_retries - 1:
-                    # Извлекаем время задержки из ошибки, если указано
-                    delay = retry_delay
-                    if "retry_delay" in error_str.lower():
-                        # Пытаемся извлечь секунды из ошибки
-                        import re
-                        match = re.search(r'seconds[:\s]+(\d+)', error_str, re.IGNORECASE)
-                        if match:
-                            delay = int(match.group(1)) + 2  # Добавляем 2 секунды для безопасности
-                    
-                    print(f"Превышена квота Gemini API. Попытка {attempt + 1}/{max_retries}. Повтор через {delay} секунд...")
-                    time.sleep(delay)
-                    continue
-                else:
-                    raise Exception(f"Превышена квота Gemini API после {max_retries} попыток. Попробуйте позже или проверьте ваш план подписки.")
-            else:
-                # Для других ошибок не повторяем
-                raise Exception(f"Ошибка при вызове Gemini API: {error_str}")
+            try:
+                delay = _retry_delay(e, attempt, max_retries, retry_delay)
+            except Exception:
+                await call.arecord(error=e)
+                raise
+            await asyncio.sleep(delay)
+            continue
+        
+        GEMINI_LATENCY.labels('success').observe(time.perf_counter() - started)
+        logger.info(f"[Gemini API] Успешно получен ответ ({answered_by.name}), длина: {len(text)} символов")
+        call.model_name = answered_by.model_name
+        await call.arecord(response=response)
+        if cache_ttl:
+            await cache.aset(cache_key, text, cache_ttl)
+        return text
     
     # Если все попытки исчерпаны
+    await call.arecord(error=last_error)
     raise Exception(f"Ошибка при вызове Gemini API после {max_retries} попыток: {str(last_error)}")
@@ -0,0 +1,113 @@
+"""
+Сервис приглашений соискателей: формирование писем и разбор списков кандидатов
+"""
+import csv
+import io
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+# Максимальное количество кандидатов в одном массовом приглашении
+MAX_BULK_CANDIDATES = 500
+
+
+def build_invitation_message(session, test=None):
+    """
+    Сформировать письмо-приглашение для сессии
+
+    Args:
+        session: TestSession объект
+        test: Test объект (чтобы не делать лишний запрос к session.test)
+
+    Returns:
+        tuple: (тема, текст письма)
+    """
+    test = test or session.test
+    test_link = f"{settings.SITE_URL}/test/{session.id}/"
+    candidate_name = session.candidate_name
+
+    subject = 'Приглашение пройти тестирование'
+    message = f'''Здравствуйте{f", {candidate_name}" if candidate_name else ""}!
+
+Вам направлено приглашение пройти тестирование.
+Перейдите по ссылке для начала: {test_link}
+
+Тест: {test.name}
+Длительность: {test.duration_minutes} минут
+
+С уважением,
+Команда системы тестирования персонала
+'''
+    return subject, message
+
+
+def parse_candidates(candidates=None, csv_text=None):
+    """
+    Разобрать список кандидатов из JSON или CSV
+
+    CSV: колонки email, name, age (заголовок необязателен).
+    Дубликаты email в списке отбрасываются.
+
+    Returns:
+        tuple: (список кандидатов [{'candidate_email', 'candidate_name', 'candidate_age'}], список ошибок)
+    """
+    rows = []
+    if candidates:
+        for item in candidates:
+            if isinstance(item, str):
+                item = {'candidate_email': item}
+            if not isinstance(item, dict):
+                rows.append({})
+                continue
+            rows.append({
+                'candidate_email': item.get('candidate_email') or item.get('email') or '',
+                'candidate_name': item.get('candidate_name') or item.get('name') or '',
+                'candidate_age': item.get('candidate_age') or item.get('age'),
+            })
+    elif csv_text:
+        reader = csv.reader(io.StringIO(csv_text))
+        for row in reader:
+            if not row or not any(c.strip() for c in row):
+                continue
+            # Пропускаем заголовок
+            if row[0].strip().lower() in ('email', 'candidate_email', 'e-mail'):
+                continue
+            rows.append({
+                'candidate_email': row[0],
+                'candidate_name': row[1] if len(row) > 1 else '',
+                'candidate_age': row[2] if len(row) > 2 else None,
+            })
+
+    result = []
+    errors = []
+    seen = set()
+    for index, row in enumerate(rows, start=1):
+        email = str(row.get('candidate_email') or '').strip()
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append(f'Строка {index}: некорректный email "{email}"')
+            continue
+
+        if email.lower() in seen:
+            continue
+        seen.add(email.lower())
+
+        age = row.get('candidate_age')
+        if age in (None, ''):
+            age = None
+        else:
+            try:
+                age = int(age)
+            except (ValueError, TypeError):
+                errors.append(f'Строка {index}: некорректный возраст "{age}"')
+                continue
+
+        result.append({
+            'candidate_email': email,
+            'candidate_name': str(row.get('candidate_name') or '').strip(),
+            'candidate_age': age,
+        })
+
+    return result, errors
@@ -0,0 +1,183 @@
+"""
+Хеджирование запросов к LLM
+
+Хвост времени завершения теста (complete) определяют медленные генерации
+Gemini. Если основной провайдер (LLM_PROVIDER) не выдал первый фрагмент
+ответа за p90 (LLM_HEDGE_PERCENTILE) времени до первого фрагмента, тот же
+промпт отправляется резервному провайдеру (LLM_HEDGE_PROVIDER), и берется
+ответ, пришедший первым. Процентиль считается по последним
+LLM_HEDGE_WINDOW вызовам в процессе; пока замеров меньше
+LLM_HEDGE_MIN_SAMPLES, ожидание равно LLM_HEDGE_DEFAULT_DELAY_MS.
+
+Каждый провайдер ограничен своим таймаутом из LLM_PROVIDERS. В ASGI-режиме
+проигравший запрос отменяется (для отмененного основного в окно попадает
+время до отмены); в синхронном он дорабатывает в фоновом потоке (не
+дольше своего таймаута), его ответ отбрасывается.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+
+from personnel_testing.prometheus_metrics import LLM_HEDGED_REQUESTS
+
+
+class FirstTokenLatency:
+    """Скользящее окно времени до первого фрагмента ответа по провайдерам"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            window = self.samples.get(name)
+            if window is None:
+                window = self.samples[name] = deque(maxlen=settings.LLM_HEDGE_WINDOW)
+            window.append(seconds)
+
+    def percentile(self, name, fraction, min_samples):
+        """Процентиль в секундах или None, если замеров меньше min_samples"""
+        with self.lock:
+            ordered = sorted(self.samples.get(name, ()))
+        if not ordered or len(ordered) < min_samples:
+            return None
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+first_token_latency = FirstTokenLatency()
+
+
+def hedge_delay(provider):
+    """Сколько ждать первого фрагмента от основного провайдера, секунды"""
+    delay = first_token_latency.percentile(
+        provider.name, settings.LLM_HEDGE_PERCENTILE, settings.LLM_HEDGE_MIN_SAMPLES,
+    )
+    return delay if delay is not None else settings.LLM_HEDGE_DEFAULT_DELAY_MS / 1000
+
+
+def generate(primary, hedge, prompt, system_instruction=None, generation_config=None, timeout=None):
+    """
+    Ответ основного провайдера, а при его задержке - первого из двух
+
+    Args:
+        primary: основной провайдер
+        hedge: резервный провайдер (None - без хеджирования)
+        timeout: таймаут запроса (None - таймаут каждого провайдера из реестра)
+
+    Returns:
+        tuple: (провайдер, ответ которого получен, ответ)
+    """
+    if hedge is None:
+        return primary, primary.generate(prompt, system_instruction, generation_config, timeout or primary.timeout)
+
+    delay = hedge_delay(primary)
+    started = time.perf_counter()
+    first_token = threading.Event()
+
+    def on_first_token():
+        first_token_latency.observe(primary.name, time.perf_counter() - started)
+        first_token.set()
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='llm-hedge')
+    try:
+        primary_future = executor.submit(
+            primary.generate, prompt, system_instruction, generation_config,
+            timeout or primary.timeout, on_first_token,
+        )
+        # Ошибка до первого фрагмента тоже прекращает ожидание
+        primary_future.add_done_callback(lambda future: first_token.set())
+        if first_token.wait(delay):
+            return primary, primary_future.result()
+
+        hedge_future = executor.submit(
+            hedge.generate, prompt, system_instruction, generation_config, timeout or hedge.timeout,
+        )
+        futures = {primary_future: primary, hedge_future: hedge}
+        error = None
+        for future in as_completed(futures):
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            LLM_HEDGED_REQUESTS.labels('primary' if future is primary_future else 'hedge').inc()
+            return futures[future], response
+        LLM_HEDGED_REQUESTS.labels('failed').inc()
+        raise error
+    finally:
+        executor.shutdown(wait=False)
+
+
+async def _with_timeout(coroutine, timeout):
+    try:
+        return await asyncio.wait_for(coroutine, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise Exception(f"Request timed out after {timeout} seconds")
+
+
+async def agenerate(primary, hedge, prompt, system_instruction=None, generation_config=None, timeout=None):
+    """Асинхронный вариант generate; проигравший запрос отменяется"""
+    primary_timeout = timeout or primary.timeout
+    if hedge is None:
+        response = await _with_timeout(
+            primary.agenerate(prompt, system_instruction, generation_config, primary_timeout),
+            primary_timeout,
+        )
+        return primary, response
+
+    loop = asyncio.get_running_loop()
+    delay = hedge_delay(primary)
+    started = time.perf_counter()
+    first_token = asyncio.Event()
+    observed = threading.Event()
+
+    def on_first_token():
+        first_token_latency.observe(primary.name, time.perf_counter() - started)
+        observed.set()
+        # Провайдер без асинхронного клиента вызывает это из своего потока
+        loop.call_soon_threadsafe(first_token.set)
+
+    primary_task = asyncio.ensure_future(_with_timeout(
+        primary.agenerate(prompt, system_instruction, generation_config, primary_timeout, on_first_token),
+        primary_timeout,
+    ))
+    primary_task.add_done_callback(lambda task: first_token.set())
+    tasks = {primary_task: primary}
+    try:
+        try:
+            await asyncio.wait_for(first_token.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        if first_token.is_set():
+            return primary, await primary_task
+
+        hedge_timeout = timeout or hedge.timeout
+        hedge_task = asyncio.ensure_future(_with_timeout(
+            hedge.agenerate(prompt, system_instruction, generation_config, hedge_timeout),
+            hedge_timeout,
+        ))
+        tasks[hedge_task] = hedge
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                LLM_HEDGED_REQUESTS.labels('primary' if task is primary_task else 'hedge').inc()
+                return tasks[task], task.result()
+        LLM_HEDGED_REQUESTS.labels('failed').inc()
+        raise error
+    finally:
+        # Отмененный основной запрос не дождался первого фрагмента: прошедшее
+        # время - нижняя граница его задержки. Без этого замера в окне
+        # остаются только быстрые ответы и процентиль занижается
+        if not primary_task.done() and not observed.is_set():
+            first_token_latency.observe(primary.name, time.perf_counter() - started)
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,149 @@
+"""
+Журнал обращений к LLM (LLMCallLog)
+
+call_gemini и call_gemini_async записывают каждое обращение: хэш промпта,
+токены из usage_metadata ответа, время с учетом повторов, число попыток,
+класс ошибки и попадание в кэш ответов. Сессия и тип теста берутся из
+контекста llm_call_context, который задает обработка результатов
+(session_results); contextvar передается и в корутины ASGI-режима.
+
+Ошибка записи журнала не должна ломать обработку результатов, поэтому она
+только пишется в лог.
+"""
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import Avg, Count, Q, Sum
+
+from tests.models import LLMCallLog
+
+logger = logging.getLogger(__name__)
+
+_call_context = ContextVar('llm_call_context', default={})
+
+
+@contextmanager
+def llm_call_context(session=None, test_type=''):
+    """Сессия и тип теста для записей журнала внутри блока"""
+    token = _call_context.set({
+        'session_id': session.pk if session is not None else None,
+        'test_type': test_type,
+    })
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def current_call_context():
+    """Контекст текущего обращения: {'session_id', 'test_type'} (пустой вне llm_call_context)"""
+    return _call_context.get()
+
+
+def prompt_hash(prompt, system_instruction=None):
+    """SHA-256 промпта вместе с системной инструкцией"""
+    digest = hashlib.sha256()
+    if system_instruction:
+        digest.update(system_instruction.encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(prompt.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class LLMCall:
+    """
+    Учет одного обращения к модели
+
+    Создается до первой попытки; attempts увеличивает вызывающий код,
+    record/arecord сохраняют запись по итогу обращения.
+    """
+
+    def __init__(self, prompt, model_name='', system_instruction=None):
+        self.prompt_hash = prompt_hash(prompt, system_instruction)
+        self.prompt_chars = len(prompt)
+        self.model_name = model_name
+        self.attempts = 0
+        self.context = current_call_context()
+        self.started = time.perf_counter()
+
+    def _build(self, response=None, error=None, cache_hit=False):
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMCallLog(
+            session_id=self.context.get('session_id'),
+            test_type=self.context.get('test_type', ''),
+            model_name=self.model_name,
+            prompt_hash=self.prompt_hash,
+            prompt_chars=self.prompt_chars,
+            input_tokens=getattr(usage, 'prompt_token_count', None),
+            output_tokens=getattr(usage, 'candidates_token_count', None),
+            latency_ms=int((time.perf_counter() - self.started) * 1000),
+            attempts=self.attempts,
+            error_class=type(error).__name__ if error is not None else '',
+            cache_hit=cache_hit,
+        )
+
+    def record(self, response=None, error=None, cache_hit=False):
+        try:
+            self._build(response, error, cache_hit).save()
+        except Exception as e:
+            logger.error(f'[LLM ledger] Не удалось записать вызов: {type(e).__name__}: {e}')
+
+    async def arecord(self, response=None, error=None, cache_hit=False):
+        try:
+            await self._build(response, error, cache_hit).asave()
+        except Exception as e:
+            logger.error(f'[LLM ledger] Не удалось записать вызов: {type(e).__name__}: {e}')
+
+
+def get_usage_summary(since=None):
+    """
+    Сводка журнала по типам тестов
+
+    Args:
+        since: учитывать вызовы не раньше этой даты (None - все)
+
+    Returns:
+        list: [{'test_type', 'calls', 'errors', 'cache_hits', 'retries',
+                'total_input_tokens', 'total_output_tokens', 'avg_input_tokens',
+                'avg_output_tokens', 'avg_latency_ms', 'p95_latency_ms'}, ...]
+    """
+    queryset = LLMCallLog.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+
+    rows = list(
+        queryset.order_by().values('test_type').annotate(
+            calls=Count('pk'),
+            errors=Count('pk', filter=~Q(error_class='')),
+            cache_hits=Count('pk', filter=Q(cache_hit=True)),
+            retries=Count('pk', filter=Q(attempts__gt=1)),
+            total_input_tokens=Sum('input_tokens'),
+            total_output_tokens=Sum('output_tokens'),
+            avg_input_tokens=Avg('input_tokens'),
+            avg_output_tokens=Avg('output_tokens'),
+            avg_latency_ms=Avg('latency_ms', filter=Q(cache_hit=False)),
+        ).order_by('test_type')
+    )
+
+    for row in rows:
+        for key in ('avg_input_tokens', 'avg_output_tokens', 'avg_latency_ms'):
+            if row[key] is not None:
+                row[key] = round(row[key])
+        row['total_input_tokens'] = row['total_input_tokens'] or 0
+        row['total_output_tokens'] = row['total_output_tokens'] or 0
+        row['p95_latency_ms'] = _latency_percentile(
+            queryset.filter(test_type=row['test_type'], cache_hit=False), 0.95
+        )
+    return rows
+
+
+def _latency_percentile(queryset, fraction):
+    """Перцентиль времени вызова без выгрузки всех записей (одна строка по OFFSET)"""
+    count = queryset.count()
+    if not count:
+        return None
+    offset = min(int(count * fraction), count - 1)
+    return queryset.order_by('latency_ms').values_list('latency_ms', flat=True)[offset]
@@ -0,0 +1,439 @@
+"""
+Провайдеры LLM для gemini_service
+
+Реестр LLM_PROVIDERS сопоставляет имени класс провайдера и таймаут
+запроса; call_gemini и call_gemini_async обращаются к провайдеру
+LLM_PROVIDER, а при заданном LLM_HEDGE_PROVIDER - еще и к резервному
+(см. llm_hedging):
+    gemini - Google Gemini через google.generativeai (по умолчанию)
+    openai - OpenAI Chat Completions (OPENAI_API_KEY, OPENAI_MODEL)
+    fake   - локальная заглушка без сети для нагрузочных тестов,
+             бенчмарков и CI: шаблонные или заготовленные отчеты,
+             распределение задержки, потоковая выдача, ошибки 429
+             и таймауты
+
+Провайдер возвращает объект с text и usage_metadata, как ответ
+google.generativeai, поэтому повторы, журнал LLMCallLog и кэш ответов
+работают одинаково для всех провайдеров.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from tests.data.personal_qualities_test import PERSONAL_QUALITIES_BLOCKS
+
+from .llm_ledger import current_call_context
+
+try:
+    # Используем старый пакет google.generativeai (новый google.genai имеет другой API)
+    # TODO: Обновить на google.genai после изучения нового API
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+    genai = None
+
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+    openai = None
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = 'gemini-2.5-flash'
+
+
+class LLMProvider:
+    """
+    Интерфейс провайдера
+
+    generate возвращает объект с атрибутами text и usage_metadata
+    (prompt_token_count, candidates_token_count); ошибки провайдер
+    пробрасывает как есть - решение о повторе принимает gemini_service.
+    timeout - таймаут запроса в секундах; on_first_token вызывается, когда
+    модель выдала первый фрагмент ответа (провайдер тогда запрашивает
+    потоковую выдачу). name и timeout экземпляра задает реестр.
+    """
+
+    name = ''
+    model_name = ''
+    timeout = None
+
+    def generate(self, prompt, system_instruction=None, generation_config=None, timeout=None, on_first_token=None):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, system_instruction=None, generation_config=None, timeout=None, on_first_token=None):
+        # Провайдер без асинхронного клиента выполняется в отдельном потоке
+        return await asyncio.to_thread(
+            self.generate, prompt, system_instruction, generation_config, timeout, on_first_token,
+        )
+
+    def stream(self, prompt, system_instruction=None, generation_config=None):
+        """Фрагменты текста ответа по мере генерации"""
+        yield self.generate(prompt, system_instruction, generation_config).text
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini (GEMINI_API_ENDPOINT позволяет направить запросы на fake_gemini_server)"""
+
+    model_name = GEMINI_MODEL
+
+    def __init__(self):
+        if not GEMINI_AVAILABLE:
+            raise ImportError("Библиотека google-generativeai не установлена. Установите: pip install google-generativeai")
+
+        api_key = getattr(settings, 'GEMINI_API_KEY', os.getenv('GEMINI_API_KEY'))
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY не установлен в настройках или переменных окружения")
+
+        # Предупреждение о deprecation можно игнорировать, API все еще работает
+        self.endpoint = getattr(settings, 'GEMINI_API_ENDPOINT', '')
+        if self.endpoint:
+            # Локальный сервер отвечает только по REST
+            genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': self.endpoint})
+        else:
+            genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(self.model_name)
+
+    def _kwargs(self, system_instruction, generation_config, timeout=None):
+        kwargs = {'generation_config': generation_config}
+        if system_instruction:
+            kwargs['system_instruction'] = system_instruction
+        if timeout:
+            kwargs['request_options'] = {'timeout': timeout}
+        return kwargs
+
+    def generate(self, prompt, system_instruction=None, generation_config=None, timeout=None, on_first_token=None):
+        kwargs = self._kwargs(system_instruction, generation_config, timeout)
+        if on_first_token is None:
+            return self.model.generate_content(prompt, **kwargs)
+        # После чтения всех фрагментов у ответа полный text и usage_metadata
+        response = self.model.generate_content(prompt, stream=True, **kwargs)
+        for index, _ in enumerate(response):
+            if index == 0:
+                on_first_token()
+        return response
+
+    async def agenerate(self, prompt, system_instruction=None, generation_config=None, timeout=None, on_first_token=None):
+        if self.endpoint:
+            # Асинхронный клиент google.generativeai работает только через gRPC
+            return await super().agenerate(prompt, system_instruction, generation_config, timeout, on_first_token)
+        kwargs = self._kwargs(system_instruction, generation_config, timeout)
+        if on_first_token is None:
+            return await self.model.generate_content_async(prompt, **kwargs)
+        response = await self.model.generate_content_async(prompt, stream=True, **kwargs)
+        first = True
+        async for _ in response:
+            if first:
+                on_first_token()
+                first = False
+        return response
+
+    def stream(self, prompt, system_instruction=None, generation_config=None):
+        response = self.model.generate_content(
+            prompt, stream=True, **self._kwargs(system_instruction, generation_config)
+        )
+        for chunk in response:
+            yield chunk.text
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI Chat Completions; ответ приводится к виду ответа Gemini"""
+
+    def __init__(self):
+        if not OPENAI_AVAILABLE:
+            raise ImportError("Библиотека openai не установлена. Установите: pip install openai")
+
+        api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY не установлен в настройках или переменных окружения")
+
+        self.model_name = settings.OPENAI_MODEL
+        # Повторы выполняет gemini_service, у клиента они отключены
+        self.client = openai.OpenAI(api_key=api_key, max_retries=0)
+        self.async_client = openai.AsyncOpenAI(api_key=api_key, max_retries=0)
+
+    def _kwargs(self, prompt, system_instruction, generation_config, timeout):
+        messages = [{'role': 'user', 'content': prompt}]
+        if system_instruction:
+            messages.insert(0, {'role': 'system', 'content': system_instruction})
+        kwargs = {'model': self.model_name, 'messages': messages}
+        config = generation_config or {}
+        if 'temperature' in config:
+            kwargs['temperature'] = config['temperature']
+        if 'top_p' in config:
+            kwargs['top_p'] = config['top_p']
+        if 'max_output_tokens' in config:
+            kwargs['max_tokens'] = config['max_output_tokens']
+        if timeout:
+            kwargs['timeout'] = timeout
+        return kwargs
+
+    def _response(self, text, usage):
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=getattr(usage, 'prompt_tokens', None),
+                candidates_token_count=getattr(usage, 'completion_tokens', None),
+            ),
+        )
+
+    def generate(self, prompt, system_instruction=None, generation_config=None, timeout=None, on_first_token=None):
+        kwargs = self._kwargs(prompt, system_instruction, generation_config, timeout)
+        if on_first_token is None:
+            completion = self.client.chat.completions.create(**kwargs)
+            return self._response(completion.choices[0].message.content or '', completion.usage)
+
+        parts = []
+        usage = None
+        for chunk in self.client.chat.completions.create(stream=True, stream_options={'include_usage': True}, **kwargs):
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not parts:
+                    on_first_token()
+                parts.append(chunk.choices[0].delta.content)
+            usage = chunk.usage or usage
+        return self._response(''.join(parts), usage)
+
+    async def agenerate(self, prompt, system_instruction=None, generation_config=None, timeout=None, on_first_token=None):
+        kwargs = self._kwargs(prompt, system_instruction, generation_config, timeout)
+        if on_first_token is None:
+            completion = await self.async_client.chat.completions.create(**kwargs)
+            return self._response(completion.choices[0].message.content or '', completion.usage)
+
+        parts = []
+        usage = None
+        stream = await self.async_client.chat.completions.create(
+            stream=True, stream_options={'include_usage': True}, **kwargs,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not parts:
+                    on_first_token()
+                parts.append(chunk.choices[0].delta.content)
+            usage = chunk.usage or usage
+        return self._response(''.join(parts), usage)
+
+    def stream(self, prompt, system_instruction=None, generation_config=None):
+        kwargs = self._kwargs(prompt, system_instruction, generation_config, None)
+        for chunk in self.client.chat.completions.create(stream=True, **kwargs):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class ResourceExhausted(Exception):
+    """Ошибка квоты (429) заглушки; текст как у google.api_core"""
+
+
+class DeadlineExceeded(Exception):
+    """Таймаут заглушки; имя класса как у google.api_core"""
+
+
+FAKE_FILLER = (
+    'Кандидат приводит конкретные показатели и сравнивает результат с планом. '
+    'Ответы показывают ориентацию на итог, а не на процесс. '
+)
+
+FAKE_TEMPLATES = {
+    'iq_test': (
+        '## ОТЧЕТ ПО ТЕСТУ ИНТЕЛЛЕКТА (LOGIS/RAVEN)\n\n'
+        '3. РЕКОМЕНДАЦИЯ ПО ДОЛЖНОСТИ:\n'
+        'Кандидат способен справляться со стандартными задачами.\n\n'
+        '4. АНАЛИЗ НАДЕЖНОСТИ:\n{filler}'
+    ),
+    'personal_qualities': (
+        '#### ЧАСТЬ 1: ЦИФРОВОЙ ПРОФИЛЬ\n'
+        '| Качество | Балл | Уровень |\n|---|---|---|\n'
+        + ''.join(f'| {block_name} | 12.0 | Средний |\n' for block_name in PERSONAL_QUALITIES_BLOCKS)
+        + '\n#### ЧАСТЬ 2: ДЕТАЛЬНАЯ РАСШИФРОВКА\n{filler}\n\n'
+        '#### ЧАСТЬ 3: ОБЩАЯ КАРТИНА ЛИЧНОСТИ\n'
+        '**Рекомендация по должности:** подходит для работы с клиентами.'
+    ),
+    'productivity': (
+        '### 1. ПОНИМАНИЕ ОЖИДАНИЙ\n{filler}\n\n'
+        '**ИТОГОВЫЙ ВЕРДИКТ:** Результатник.'
+    ),
+    '': '## ОТЧЕТ\n\n{filler}',
+}
+
+
+class FakeProvider(LLMProvider):
+    """
+    Локальная заглушка LLM
+
+    Отчет берется из файла <LLM_FAKE_RESPONSES_DIR>/<тип теста>.md (или
+    default.md), иначе из шаблона FAKE_TEMPLATES, дополненного до
+    LLM_FAKE_REPORT_CHARS символов. Тип теста - из llm_call_context.
+
+    Задержка - логнормальная с медианой LLM_FAKE_LATENCY_MS и разбросом
+    LLM_FAKE_LATENCY_SIGMA (0 - постоянная); при потоковой выдаче она
+    делится между фрагментами по LLM_FAKE_CHUNK_CHARS символов, первый
+    фрагмент (on_first_token) приходит через ее долю на один фрагмент.
+    Исход каждого вызова берется из LLM_FAKE_SCRIPT (ok, 429, timeout по
+    порядку), затем случайно по LLM_FAKE_FAILURE_RATE и LLM_FAKE_TIMEOUT_RATE.
+    При заданном LLM_FAKE_SEED последовательность задержек и ошибок в
+    процессе повторяется от запуска к запуску.
+    """
+
+    model_name = 'fake'
+
+    def __init__(self, **options):
+        def option(name, default):
+            return options.get(name, getattr(settings, f'LLM_FAKE_{name.upper()}', default))
+
+        self.latency_ms = option('latency_ms', 0)
+        self.latency_sigma = option('latency_sigma', 0.0)
+        self.failure_rate = option('failure_rate', 0.0)
+        self.timeout_rate = option('timeout_rate', 0.0)
+        self.report_chars = option('report_chars', 6000)
+        self.chunk_chars = max(1, option('chunk_chars', 400))
+        self.responses_dir = option('responses_dir', '')
+        self.script = list(option('script', []))
+        self.rng = random.Random(option('seed', None))
+        self.lock = threading.Lock()
+        self._canned = {}
+
+    def _next_call(self):
+        """Исход и задержка (секунды) очередного вызова"""
+        with self.lock:
+            if self.script:
+                outcome = self.script.pop(0).strip().lower()
+            else:
+                draw = self.rng.random()
+                if draw < self.failure_rate:
+                    outcome = '429'
+                elif draw < self.failure_rate + self.timeout_rate:
+                    outcome = 'timeout'
+                else:
+                    outcome = 'ok'
+            latency = self.latency_ms / 1000
+            if self.latency_sigma:
+                latency *= self.rng.lognormvariate(0, self.latency_sigma)
+        return outcome, latency
+
+    def _raise_for(self, outcome):
+        if outcome == '429':
+            raise ResourceExhausted('429 Resource has been exhausted (e.g. check quota).')
+        if outcome == 'timeout':
+            raise DeadlineExceeded('504 Deadline Exceeded: request timed out')
+
+    def report(self, test_type=None):
+        """Текст отчета для типа теста (None - из llm_call_context)"""
+        if test_type is None:
+            test_type = current_call_context().get('test_type', '')
+        if self.responses_dir:
+            for name in (test_type or 'default', 'default'):
+                path = Path(self.responses_dir) / f'{name}.md'
+                if path.exists():
+                    if path not in self._canned:
+                        self._canned[path] = path.read_text(encoding='utf-8')
+                    return self._canned[path]
+
+        template = FAKE_TEMPLATES.get(test_type, FAKE_TEMPLATES[''])
+        filler_chars = max(0, self.report_chars - len(template))
+        filler = (FAKE_FILLER * (filler_chars // len(FAKE_FILLER) + 1))[:filler_chars]
+        return template.format(filler=filler)
+
+    def _response(self, prompt, text):
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(prompt) // 4,
+                candidates_token_count=len(text) // 4,
+            ),
+        )
+
+    def _chunks(self, text):
+        return [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or ['']
+
+    def _plan(self, timeout):
+        """
+        Исход, задержка до первого фрагмента и до конца ответа (секунды)
+
+        Ответ, не успевающий за timeout, превращается в таймаут через timeout секунд.
+        """
+        outcome, latency = self._next_call()
+        text = self.report()
+        if timeout and latency > timeout:
+            return 'timeout', timeout, 0.0, text
+        first = latency / len(self._chunks(text))
+        return outcome, first, latency - first, text
+
+    def generate(self, prompt, system_instruction=None, generation_config=None, timeout=None, on_first_token=None):
+        outcome, first, rest, text = self._plan(timeout)
+        time.sleep(first)
+        self._raise_for(outcome)
+        if on_first_token is not None:
+            on_first_token()
+        time.sleep(rest)
+        return self._response(prompt, text)
+
+    async def agenerate(self, prompt, system_instruction=None, generation_config=None, timeout=None, on_first_token=None):
+        outcome, first, rest, text = self._plan(timeout)
+        await asyncio.sleep(first)
+        self._raise_for(outcome)
+        if on_first_token is not None:
+            on_first_token()
+        await asyncio.sleep(rest)
+        return self._response(prompt, text)
+
+    def stream(self, prompt, system_instruction=None, generation_config=None):
+        outcome, latency = self._next_call()
+        chunks = self._chunks(self.report())
+        if outcome != 'ok':
+            # Ошибка приходит вместо первого фрагмента
+            time.sleep(latency / len(chunks))
+            self._raise_for(outcome)
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            yield chunk
+
+
+_providers = {}
+
+
+def get_llm_provider(name=None):
+    """
+    Провайдер из реестра LLM_PROVIDERS (по умолчанию LLM_PROVIDER)
+
+    Экземпляр создается один раз на процесс (у FakeProvider общий генератор
+    случайных чисел и сценарий ошибок); при ошибке создания она
+    пробрасывается и повторится при следующем вызове.
+    """
+    name = name or settings.LLM_PROVIDER
+    provider = _providers.get(name)
+    if provider is None:
+        config = settings.LLM_PROVIDERS.get(name)
+        if config is None:
+            raise ValueError(f"Неизвестный провайдер LLM: {name}. Доступны: {', '.join(settings.LLM_PROVIDERS)}")
+        provider = import_string(config['class'])()
+        provider.name = name
+        provider.timeout = config.get('timeout')
+        _providers[name] = provider
+    return provider
+
+
+def get_hedge_provider():
+    """
+    Резервный провайдер для хеджирования (LLM_HEDGE_PROVIDER) или None
+
+    Ошибка создания резервного провайдера (нет ключа, пакета) не мешает
+    основному: запрос выполняется без хеджирования.
+    """
+    name = settings.LLM_HEDGE_PROVIDER
+    if not name or name == settings.LLM_PROVIDER:
+        return None
+    try:
+        return get_llm_provider(name)
+    except Exception as e:
+        logger.error(f'[LLM] Резервный провайдер {name} недоступен: {type(e).__name__}: {e}')
+        return None
@@ -1,16 +1,34 @@
 """
 Сервис обработки результатов теста личностных качеств с использованием Gemini AI
 """
+from tests.data.personal_qualities_test import get_quality_level
 from .gemini_service import call_gemini
 
 
-def process_personal_qualities_test(answers_data, questions_data=None):
+def process_personal_qualities_test(answers_data, questions_data=None, block_scores=None):
     """
     Обработать результаты теста личностных качеств с помощью Gemini AI
     
     Args:
         answers_data: список ответов [{'question_number': int, 'answer': str, 'block_name': str, 'question_type': str}, ...]
         questions_data: словарь с вопросами (опционально) для формирования полного промпта
+        block_scores: уже подсчитанные баллы по блокам {блок: float} (опционально)
+    """
+    context = prepare_personal_qualities_test(answers_data, questions_data, block_scores)
+    try:
+        # Вызываем Gemini API
+        report = call_gemini(context['prompt'])
+    except Exception as e:
+        return finalize_personal_qualities_test(context, error=e)
+    return finalize_personal_qualities_test(context, report=report)
+
+
+def prepare_personal_qualities_test(answers_data, questions_data=None, block_scores=None):
+    """
+    Сгруппировать ответы по блокам и сформировать промпт для Gemini
+    
+    Returns:
+        dict: данные для finalize_personal_qualities_test, промпт в ключе 'prompt'
     """
     # Группируем ответы по блокам
     blocks = {}
@@ -47,6 +65,12 @@ def process_personal_qualities_test(answers_data, questions_data=None):
             answers_text += f"Вопрос {item['question_number']} {q_type_marker}: {item['answer']}\n"
         answers_text += "\n"
     
+    if block_scores:
+        answers_text += "БАЛЛЫ ПО БЛОКАМ (подсчитаны по правилам из раздела 1):\n"
+        for block_name, score in block_scores.items():
+            answers_text += f"{block_name}: {score:.1f}/20\n"
+        answers_text += "\n"
+    
     # Промпт для Gemini согласно методологии
     prompt = f"""Ты — эксперт-психолог и HR-аналитик.
 Твоя задача — обработать ответы кандидата, подсчитать баллы по 10 шкалам и составить развернутый психологический портрет.
@@ -135,46 +159,85 @@ def process_personal_qualities_test(answers_data, questions_data=None):
 - Детальная расшифровка должна быть для всех 10 качеств.
 - Все три части отчета должны быть полностью заполнены."""
     
-    try:
-        # Вызываем Gemini API
-        report = call_gemini(prompt)
-        
-        # Парсим баллы из отчета (попытка извлечь структурированные данные)
-        scores = {}
-        lines = report.split('\n')
-        for line in lines:
-            if '|' in line and 'Качество' not in line and '---' not in line:
-                parts = [p.strip() for p in line.split('|') if p.strip()]
-                if len(parts) >= 3:
-                    quality = parts[0]
-                    try:
-                        score = float(parts[1].split()[0])
-                        level = parts[2]
-                        scores[quality] = {
-                            'score': score,
-                            'level': level.lower() if 'низкий' in level.lower() else ('high' if 'высокий' in level.lower() else 'medium'),
-                        }
-                    except:
-                        pass
-        
-        report_json = {
-            'scores': scores,
-            'full_report': report,
+    return {
+        'prompt': prompt,
+        'answers_data': answers_data,
+        'answers_text': answers_text,
+        'block_scores': block_scores,
+    }
+
+
+def finalize_personal_qualities_test(context, report=None, error=None):
+    """
+    Сформировать результат теста личностных качеств по ответу Gemini
+    
+    Args:
+        context: результат prepare_personal_qualities_test
+        report: отчет, полученный от Gemini
+        error: ошибка вызова Gemini; тогда в отчет попадают ответы кандидата
+    """
+    answers_data = context['answers_data']
+    block_scores = context['block_scores']
+    
+    if error is None:
+        try:
+            return _result_from_report(report, answers_data, block_scores)
+        except Exception as e:
+            error = e
+    
+    # Fallback на простую обработку при ошибке API
+    return {
+        'scores_json': _scores_from_blocks(block_scores) if block_scores else {},
+        'report': f"Ошибка обработки с помощью ИИ: {str(error)}\n\nОтветы кандидата:\n{context['answers_text']}",
+        'report_json': {
+            'error': str(error),
             'answers': answers_data,
+        },
+    }
+
+
+def _result_from_report(report, answers_data, block_scores):
+    # Парсим баллы из отчета (попытка извлечь структурированные данные)
+    scores = {}
+    lines = report.split('\n')
+    for line in lines:
+        if '|' in line and 'Качество' not in line and '---' not in line:
+            parts = [p.strip() for p in line.split('|') if p.strip()]
+            if len(parts) >= 3:
+                quality = parts[0]
+                try:
+                    score = float(parts[1].split()[0])
+                    level = parts[2]
+                    scores[quality] = {
+                        'score': score,
+                        'level': level.lower() if 'низкий' in level.lower() else ('high' if 'высокий' in level.lower() else 'medium'),
+                    }
+                except:
+                    pass
+    
+    if not scores and block_scores:
+        scores = _scores_from_blocks(block_scores)
+    
+    report_json = {
+        'scores': scores,
+        'full_report': report,
+        'answers': answers_data,
+    }
+    
+    return {
+        'scores_json': scores,
+        'report': report,
+        'report_json': report_json,
+    }
+
+
+def _scores_from_blocks(block_scores):
+    """Баллы по блокам в формате scores_json"""
+    scores = {}
+    for block_name, score in block_scores.items():
+        level = get_quality_level(round(score))
+        scores[block_name] = {
+            'score': score,
+            'level': 'low' if 'низкий' in level.lower() else ('high' if 'высокий' in level.lower() else 'medium'),
         }
-        
-        return {
-            'scores_json': scores,
-            'report': report,
-            'report_json': report_json,
-        }
-    except Exception as e:
-        # Fallback на простую обработку при ошибке API
-        return {
-            'scores_json': {},
-            'report': f"Ошибка обработки с помощью ИИ: {str(e)}\n\nОтветы кандидата:\n{answers_text}",
-            'report_json': {
-                'error': str(e),
-                'answers': answers_data,
-            },
-        }
+    return scores
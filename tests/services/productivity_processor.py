@@ -11,6 +11,22 @@ def process_productivity_test(answers_data):
     Args:
         answers_data: список ответов [{'question_number': int, 'answer': str}, ...]
     """
+    context = prepare_productivity_test(answers_data)
+    try:
+        # Вызываем Gemini API
+        report = call_gemini(context['prompt'])
+    except Exception as e:
+        return finalize_productivity_test(context, error=e)
+    return finalize_productivity_test(context, report=report)
+
+
+def prepare_productivity_test(answers_data):
+    """
+    Сформировать промпт для Gemini по ответам кандидата
+    
+    Returns:
+        dict: данные для finalize_productivity_test, промпт в ключе 'prompt'
+    """
     # Формируем текст с ответами кандидата
     answers_text = "ОТВЕТЫ КАНДИДАТА:\n\n"
     for answer_data in answers_data:
@@ -73,33 +89,48 @@ def process_productivity_test(answers_data):
 
 ВАЖНО: Отчет должен быть на одной странице. В отчете отображаются ответы Соискателя."""
     
-    try:
-        # Вызываем Gemini API
-        report = call_gemini(prompt)
-        
-        # Определяем тип кандидата из отчета
-        candidate_type = 'Смешанный тип'
-        if 'Результатник' in report:
-            candidate_type = 'Результатник'
-        elif 'Процессник' in report:
-            candidate_type = 'Процессник'
-        
-        report_json = {
-            'candidate_type': candidate_type,
-            'answers': answers_data,
-            'full_report': report,
-        }
-        
-        return {
-            'report': report,
-            'report_json': report_json,
-        }
-    except Exception as e:
+    return {
+        'prompt': prompt,
+        'answers_data': answers_data,
+        'answers_text': answers_text,
+    }
+
+
+def finalize_productivity_test(context, report=None, error=None):
+    """
+    Сформировать результат теста продуктивности по ответу Gemini
+    
+    Args:
+        context: результат prepare_productivity_test
+        report: отчет, полученный от Gemini
+        error: ошибка вызова Gemini; тогда в отчет попадают ответы кандидата
+    """
+    answers_data = context['answers_data']
+    
+    if error is not None:
         # Fallback на простую обработку при ошибке API
         return {
-            'report': f"Ошибка обработки с помощью ИИ: {str(e)}\n\nОтветы кандидата:\n{answers_text}",
+            'report': f"Ошибка обработки с помощью ИИ: {str(error)}\n\nОтветы кандидата:\n{context['answers_text']}",
             'report_json': {
-                'error': str(e),
+                'error': str(error),
                 'answers': answers_data,
             },
         }
+    
+    # Определяем тип кандидата из отчета
+    candidate_type = 'Смешанный тип'
+    if 'Результатник' in report:
+        candidate_type = 'Результатник'
+    elif 'Процессник' in report:
+        candidate_type = 'Процессник'
+    
+    report_json = {
+        'candidate_type': candidate_type,
+        'answers': answers_data,
+        'full_report': report,
+    }
+    
+    return {
+        'report': report,
+        'report_json': report_json,
+    }
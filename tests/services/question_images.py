@@ -0,0 +1,227 @@
+"""
+Уменьшенные копии изображений вопросов (WebP/AVIF)
+
+Для каждого изображения вопроса строятся копии нескольких ширин
+(settings.QUESTION_IMAGE_WIDTHS) в форматах settings.QUESTION_IMAGE_FORMATS.
+В имя файла входит хэш содержимого исходника, поэтому файлы можно отдавать
+с долгим кэшированием (immutable): при замене изображения меняется имя.
+
+Сведения о копиях хранятся в TestQuestion.image_variants:
+    {
+        'hash': 'a1b2c3d4e5f6',
+        'width': 1200, 'height': 800,
+        'files': [{'format': 'webp', 'width': 480, 'height': 320,
+                   'name': 'question_variants/A1.a1b2c3d4e5f6.480.webp', 'size': 10240}, ...]
+    }
+
+Манифест изображений теста (get_asset_manifest) перечисляет все изображения
+вопросов с размерами и хэшами; страница теста по нему загружает изображения
+следующих вопросов заранее.
+"""
+import hashlib
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, features
+
+from tests.models import TestQuestion
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'question_variants'
+
+# Формат -> (имя в Pillow, MIME-тип)
+FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+
+def supported_formats():
+    """Форматы из настроек, которые поддерживает установленный Pillow"""
+    formats = []
+    for fmt in settings.QUESTION_IMAGE_FORMATS:
+        fmt = fmt.strip().lower()
+        if fmt not in FORMATS:
+            continue
+        if not features.check(fmt):
+            logger.warning('Pillow собран без поддержки %s, копии в этом формате не создаются', fmt)
+            continue
+        formats.append(fmt)
+    return formats
+
+
+def _target_widths(source_width):
+    """Ширины копий: из настроек, не больше исходной, плюс исходная ширина"""
+    widths = sorted({w for w in settings.QUESTION_IMAGE_WIDTHS if 0 < w < source_width})
+    widths.append(source_width)
+    return widths
+
+
+def _encode(image, fmt, width):
+    height = max(1, round(image.height * width / image.width))
+    resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, FORMATS[fmt][0], quality=settings.QUESTION_IMAGE_QUALITY)
+    return buffer.getvalue(), height
+
+
+def _variants_current(variants, content_hash):
+    if not variants or variants.get('hash') != content_hash:
+        return False
+    formats = {f['format'] for f in variants.get('files', [])}
+    if formats != set(supported_formats()):
+        return False
+    return all(default_storage.exists(f['name']) for f in variants['files'])
+
+
+def build_image_variants(question, force=False):
+    """
+    Построить копии изображения вопроса и сохранить их описание в image_variants
+
+    Returns:
+        bool: были ли созданы новые копии
+    """
+    if not question.question_image:
+        if question.image_variants:
+            _delete_files(question.image_variants)
+            TestQuestion.objects.filter(pk=question.pk).update(image_variants={})
+            question.image_variants = {}
+            invalidate_asset_manifest(question.test_id)
+        return False
+
+    with question.question_image.open('rb') as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()[:12]
+
+    if not force and _variants_current(question.image_variants, content_hash):
+        return False
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    stem = os.path.splitext(os.path.basename(question.question_image.name))[0]
+    files = []
+    for fmt in supported_formats():
+        for width in _target_widths(image.width):
+            name = f'{VARIANTS_DIR}/{stem}.{content_hash}.{width}.{fmt}'
+            encoded, height = _encode(image, fmt, width)
+            # Имя определяется содержимым: существующий файл совпадает с новым
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(encoded))
+            files.append({
+                'format': fmt,
+                'width': width,
+                'height': height,
+                'name': name,
+                'size': len(encoded),
+            })
+
+    variants = {
+        'hash': content_hash,
+        'width': image.width,
+        'height': image.height,
+        'files': files,
+    }
+
+    _delete_files(question.image_variants, keep={f['name'] for f in files})
+    TestQuestion.objects.filter(pk=question.pk).update(image_variants=variants)
+    question.image_variants = variants
+    invalidate_asset_manifest(question.test_id)
+    return True
+
+
+def _delete_files(variants, keep=()):
+    for f in (variants or {}).get('files', []):
+        if f['name'] in keep:
+            continue
+        try:
+            default_storage.delete(f['name'])
+        except Exception as e:
+            logger.warning('Не удалось удалить %s: %s', f['name'], e)
+
+
+def get_srcset(variants):
+    """
+    srcset для каждого формата: {'avif': 'url 480w, url 960w', 'webp': ...}
+
+    Порядок ключей соответствует предпочтению форматов в настройках.
+    """
+    srcset = {}
+    for f in (variants or {}).get('files', []):
+        srcset.setdefault(f['format'], []).append(f'{default_storage.url(f["name"])} {f["width"]}w')
+    return {fmt: ', '.join(entries) for fmt, entries in srcset.items()}
+
+
+def _manifest_cache_key(test_id):
+    return f'tests:asset_manifest:{test_id}'
+
+
+def get_asset_manifest(test_id):
+    """
+    Манифест изображений вопросов теста
+
+    Returns:
+        dict: {'version': хэш набора изображений, 'prefetch_ahead': N,
+               'images': [{'question_number', 'url', 'hash', 'width', 'height',
+                           'variants': [{'format', 'width', 'url', 'size'}]}]}
+
+    Размер исходника не читается из хранилища (для S3 и подобных это запрос
+    на каждый файл): размеры в байтах указаны для копий.
+    """
+    key = _manifest_cache_key(test_id)
+    try:
+        manifest = cache.get(key)
+    except Exception as e:
+        logger.warning('Кэш недоступен: %s', e)
+        manifest = None
+    if manifest is not None:
+        return manifest
+
+    images = []
+    questions = TestQuestion.objects.filter(test_id=test_id).exclude(question_image='').exclude(
+        question_image__isnull=True
+    ).order_by('order', 'question_number').values_list('question_number', 'question_image', 'image_variants')
+    for question_number, image_name, variants in questions:
+        variants = variants or {}
+        files = variants.get('files', [])
+        images.append({
+            'question_number': question_number,
+            'url': default_storage.url(image_name),
+            'hash': variants.get('hash'),
+            'width': variants.get('width'),
+            'height': variants.get('height'),
+            'variants': [
+                {'format': f['format'], 'width': f['width'], 'url': default_storage.url(f['name']), 'size': f['size']}
+                for f in files
+            ],
+        })
+
+    version = hashlib.sha256(
+        '|'.join(f'{i["question_number"]}:{i["url"]}:{i["hash"]}' for i in images).encode()
+    ).hexdigest()[:12]
+    manifest = {
+        'version': version,
+        'prefetch_ahead': settings.QUESTION_IMAGE_PREFETCH_AHEAD,
+        'images': images,
+    }
+    try:
+        cache.set(key, manifest, settings.QUESTION_ASSET_MANIFEST_TTL)
+    except Exception as e:
+        logger.warning('Кэш недоступен: %s', e)
+    return manifest
+
+
+def invalidate_asset_manifest(test_id):
+    """Сбросить кэшированный манифест изображений теста"""
+    try:
+        cache.delete(_manifest_cache_key(test_id))
+    except Exception as e:
+        logger.warning('Кэш недоступен: %s', e)
@@ -0,0 +1,136 @@
+"""
+Заполнение вопросов встроенных тестов из tests/data
+
+Заполнение идемпотентно: недостающие вопросы вставляются одним bulk_create
+с ignore_conflicts по уникальному ключу (test, question_number), поэтому
+повторный и параллельный запуск не создает дублей и не падает.
+Запускается командой init_tests и после migrate (сигнал post_migrate).
+"""
+from django.db import connections
+
+from tests.models import Test, TestQuestion
+from tests.services.session_scores import invalidate_question_map
+
+DEFAULT_TESTS = [
+    {
+        'test_type': 'iq_test',
+        'name': 'IQ-тест',
+        'description': 'IQ-тест (прогрессивные матрицы Равена) предназначен для диагностики уровня интеллектуального развития.',
+        'duration_minutes': 20,
+        'questions_count': 60,
+        'is_active': True
+    },
+    {
+        'test_type': 'personal_qualities',
+        'name': 'Оценка личностных качеств',
+        'description': 'Тест для оценки личностных качеств кандидата: внимательность, позитивность, самообладание, ответственность и др.',
+        'duration_minutes': 35,
+        'questions_count': 200,
+        'is_active': True
+    },
+    {
+        'test_type': 'productivity',
+        'name': 'Оценка продуктивности',
+        'description': 'Тест для оценки продуктивности кандидата и его ориентации на результат.',
+        'duration_minutes': 20,
+        'questions_count': 20,
+        'is_active': True
+    },
+]
+
+# Варианты ответов для теста личностных качеств
+PERSONAL_QUALITIES_ANSWER_OPTIONS = [
+    {"value": "yes", "label": "Да"},
+    {"value": "no", "label": "Нет"},
+    {"value": "sometimes", "label": "Иногда"}
+]
+
+
+def build_questions(test):
+    """
+    Несохраненные вопросы теста из встроенных данных
+
+    Для IQ теста вопросы не создаются - они заносятся вручную или импортом.
+    """
+    questions = []
+
+    if test.test_type == 'personal_qualities':
+        from tests.data.personal_qualities_test import PERSONAL_QUALITIES_BLOCKS
+
+        q_num = 1
+        for block_name, block_data in PERSONAL_QUALITIES_BLOCKS.items():
+            for question in block_data.get('questions', []):
+                questions.append(TestQuestion(
+                    test=test,
+                    question_number=q_num,
+                    question_text=question.get('text', ''),
+                    question_type=question.get('type', '+'),
+                    block_name=block_name,
+                    answer_options=PERSONAL_QUALITIES_ANSWER_OPTIONS,
+                    display_type='radio',
+                    order=q_num
+                ))
+                q_num += 1
+
+    elif test.test_type == 'productivity':
+        from tests.data.productivity_test import PRODUCTIVITY_QUESTIONS
+
+        # Для теста продуктивности - открытые вопросы без вариантов
+        for question_data in PRODUCTIVITY_QUESTIONS:
+            questions.append(TestQuestion(
+                test=test,
+                question_number=question_data['number'],
+                question_text=question_data['question'],
+                block_name=question_data.get('block', ''),
+                answer_options=[],  # Нет вариантов, открытый текст
+                display_type='textarea',
+                order=question_data['number']
+            ))
+
+    return questions
+
+
+def seed_test_questions(test, using='default'):
+    """
+    Добавить недостающие вопросы теста (существующие не изменяются)
+
+    Returns:
+        int: количество вопросов теста после заполнения
+    """
+    existing = set(
+        TestQuestion.objects.using(using).filter(test=test).values_list('question_number', flat=True)
+    )
+    missing = [question for question in build_questions(test) if question.question_number not in existing]
+    if missing:
+        TestQuestion.objects.using(using).bulk_create(missing, ignore_conflicts=True)
+        invalidate_question_map(test.id)
+    return len(existing) + len(missing)
+
+
+def seed_existing_tests(using='default'):
+    """Заполнить вопросы всех существующих тестов со встроенными данными"""
+    for test in Test.objects.using(using).exclude(test_type='iq_test'):
+        seed_test_questions(test, using=using)
+
+
+def _columns(model):
+    return {field.column for field in model._meta.concrete_fields}
+
+
+def seed_after_migrate(sender, using='default', plan=None, apps=None, **kwargs):
+    """Обработчик post_migrate: заполнить вопросы тестов, созданных ранее"""
+    # После отката схема отстает от текущих моделей, а заполнение работает
+    # с ними; тесты, созданные при такой схеме, заполнит следующий migrate
+    if any(backwards for _, backwards in plan or ()):
+        return
+    if apps is not None:
+        try:
+            state_models = (apps.get_model('tests', 'Test'), apps.get_model('tests', 'TestQuestion'))
+        except LookupError:
+            return
+        if any(_columns(state) != _columns(model) for state, model in zip(state_models, (Test, TestQuestion))):
+            return
+    tables = connections[using].introspection.table_names()
+    if Test._meta.db_table not in tables or TestQuestion._meta.db_table not in tables:
+        return
+    seed_existing_tests(using=using)
@@ -10,24 +10,55 @@ from tests.data.raven_test import (
 from .gemini_service import call_gemini
 
 
-def process_raven_test(session, answers):
+def process_raven_test(session, answers=None, series_scores=None):
     """
     Обработать результаты IQ-теста
     
+    Args:
+        session: TestSession объект
+        answers: список ответов в формате [{'question_number': int, 'answer': int}, ...]
+        series_scores: уже подсчитанные верные ответы по сериям {'A': int, ...}
+    """
+    context = prepare_raven_test(session, answers, series_scores)
+    try:
+        # Вызываем Gemini API для формирования отчета
+        report = call_gemini(context['prompt'])
+    except Exception as e:
+        return finalize_raven_test(context, error=e)
+    return finalize_raven_test(context, report=report)
+
+
+def prepare_raven_test(session, answers=None, series_scores=None):
+    """
+    Подсчитать баллы IQ-теста и сформировать промпт для Gemini
+    
+    Не обращается к Gemini: ответ модели передается в finalize_raven_test
+    (синхронно из process_raven_test или асинхронно в ASGI-режиме).
+    
     Args:
         session: TestSession объект
         answers: список ответов в формате [{'question_number': int, 'answer': int}, ...]
                  answer - число от 1 до 8
+        series_scores: уже подсчитанные верные ответы по сериям {'A': int, ...};
+                       если переданы, answers не используются
+    
+    Returns:
+        dict: данные для finalize_raven_test, промпт в ключе 'prompt'
     """
-    # Подсчет сырого балла
-    raw_score = 0
-    series_scores = {
-        'A': 0,
-        'B': 0,
-        'C': 0,
-        'D': 0,
-        'E': 0,
-    }
+    if series_scores is not None:
+        series_scores = {series: series_scores.get(series, 0) for series in 'ABCDE'}
+        raw_score = sum(series_scores.values())
+        answers = []
+    else:
+        # Подсчет сырого балла
+        raw_score = 0
+        series_scores = {
+            'A': 0,
+            'B': 0,
+            'C': 0,
+            'D': 0,
+            'E': 0,
+        }
     
     # Формируем ответы по сериям для отчета
     series_answers = {
@@ -173,12 +204,38 @@ def process_raven_test(session, answers):
 4. АНАЛИЗ НАДЕЖНОСТИ:
 Если в последних сериях (D, E) баллов больше, чем в первых (A, B) — напиши предупреждение: "Внимание: Результат может быть недостоверным (случайное угадывание)". Обычно результативность падает от A к E."""
     
-    try:
-        # Вызываем Gemini API для формирования отчета
-        report = call_gemini(prompt)
-    except Exception as e:
+    return {
+        'prompt': prompt,
+        'series_scores': series_scores,
+        'raw_score': raw_score,
+        'base_iq': base_iq,
+        'final_iq': final_iq,
+        'iq_level': iq_level,
+        'age': age,
+        'reliability_warning': reliability_warning,
+    }
+
+
+def finalize_raven_test(context, report=None, error=None):
+    """
+    Сформировать результат IQ-теста по ответу Gemini
+    
+    Args:
+        context: результат prepare_raven_test
+        report: отчет, полученный от Gemini
+        error: ошибка вызова Gemini; тогда отчет строится без ИИ
+    """
+    series_scores = context['series_scores']
+    raw_score = context['raw_score']
+    base_iq = context['base_iq']
+    final_iq = context['final_iq']
+    iq_level = context['iq_level']
+    age = context['age']
+    reliability_warning = context['reliability_warning']
+    job_recommendation = ""
+    
+    if error is not None:
         # Fallback на базовый отчет при ошибке API
-        job_recommendation = ""
         if final_iq > 111:
             job_recommendation = "Кандидат обладает высокой способностью к обучению и анализу. Рекомендован на руководящие позиции, работу с аналитикой, решение нестандартных задач (бизнесмен, администратор, топ-менеджер)."
         elif 91 <= final_iq <= 110:
@@ -207,7 +264,7 @@ def process_raven_test(session, answers):
 4. АНАЛИЗ НАДЕЖНОСТИ:
 {reliability_warning if reliability_warning else "Результаты теста соответствуют ожидаемому паттерну."}
 
-Ошибка обработки с помощью ИИ: {str(e)}"""
+Ошибка обработки с помощью ИИ: {str(error)}"""
     
     report_json = {
         'series_scores': series_scores,
@@ -216,7 +273,7 @@ def process_raven_test(session, answers):
         'final_iq': final_iq,
         'iq_level': iq_level,
         'age': age,
-        'job_recommendation': job_recommendation if 'job_recommendation' in locals() else '',
+        'job_recommendation': job_recommendation,
         'reliability_warning': reliability_warning,
     }
     
@@ -0,0 +1,134 @@
+"""
+Кэш состояния сессий тестирования
+
+Во время прохождения теста страница соискателя десятки раз обращается к одной
+сессии. Поля, которые меняются только при переходах статуса (тест, тип теста,
+статус, дедлайн, владелец, способ хранения ответов), кэшируются в двух слоях:
+    - в памяти воркера на SESSION_STATE_LOCAL_TTL секунд;
+    - в общем кэше Django (Redis) на SESSION_STATE_CACHE_TTL секунд.
+
+Переходы статуса (start_test, complete_test, фоновое завершение) сбрасывают
+запись в обоих слоях. Локальные копии других воркеров живут не дольше
+SESSION_STATE_LOCAL_TTL. Истечение сессии фоновой командой кэш не сбрасывает:
+дедлайн проверяется по expires_at из кэша.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from tests.models import TestSession
+
+logger = logging.getLogger(__name__)
+
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _cache_key(session_id):
+    return f'test_session_state:{session_id}'
+
+
+def _normalize_id(session_id):
+    """UUID сессии в каноническом виде или None для некорректного значения"""
+    try:
+        return str(uuid.UUID(str(session_id)))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def _local_get(key):
+    ttl = settings.SESSION_STATE_LOCAL_TTL
+    if ttl <= 0:
+        return None
+    with _local_lock:
+        entry = _local.get(key)
+        if entry is None:
+            return None
+        state, stored_at = entry
+        if time.monotonic() - stored_at > ttl:
+            del _local[key]
+            return None
+        return state
+
+
+def _local_set(key, state):
+    if settings.SESSION_STATE_LOCAL_TTL <= 0:
+        return
+    with _local_lock:
+        # Защита от неограниченного роста словаря в долгоживущем воркере
+        if len(_local) >= 10000:
+            _local.clear()
+        _local[key] = (state, time.monotonic())
+
+
+def _load_state(session_id):
+    return (
+        TestSession.objects.filter(pk=session_id)
+        .values(
+            'id', 'user_id', 'test_id', 'test__test_type', 'test__questions_count',
+            'status', 'expires_at', 'answer_storage',
+        )
+        .first()
+    )
+
+
+def get_session_state(session_id):
+    """
+    Получить состояние сессии: {'id', 'user_id', 'test_id', 'test__test_type',
+    'test__questions_count', 'status', 'expires_at', 'answer_storage'}
+    или None, если сессии нет
+    """
+    session_id = _normalize_id(session_id)
+    if session_id is None:
+        return None
+    key = _cache_key(session_id)
+
+    state = _local_get(key)
+    if state is not None:
+        return state
+
+    try:
+        state = cache.get(key)
+    except Exception as e:
+        logger.warning(f'[Session cache] Кэш недоступен: {type(e).__name__}: {e}')
+        state = None
+
+    if state is None:
+        state = _load_state(session_id)
+        if state is None:
+            return None
+        try:
+            cache.set(key, state, settings.SESSION_STATE_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f'[Session cache] Кэш недоступен: {type(e).__name__}: {e}')
+
+    _local_set(key, state)
+    return state
+
+
+def invalidate_session_state(session_id):
+    """Сбросить состояние сессии в обоих слоях кэша"""
+    session_id = _normalize_id(session_id)
+    if session_id is None:
+        return
+    key = _cache_key(session_id)
+    with _local_lock:
+        _local.pop(key, None)
+    try:
+        cache.delete(key)
+    except Exception as e:
+        logger.warning(f'[Session cache] Кэш недоступен: {type(e).__name__}: {e}')
+
+
+def is_state_deadline_passed(state, grace_seconds=0, now=None):
+    """Аналог TestSession.is_deadline_passed для закэшированного состояния"""
+    expires_at = state.get('expires_at')
+    if not expires_at:
+        return False
+    now = now or timezone.now()
+    return now > expires_at + timezone.timedelta(seconds=grace_seconds)
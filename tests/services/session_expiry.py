@@ -0,0 +1,86 @@
+"""
+Сервис перевода просроченных сессий в статус «Истек»
+
+Просроченная сессия - в статусе in_progress с expires_at в прошлом (с учетом
+допуска SESSION_DEADLINE_GRACE_SECONDS). Поиск идет по частичному индексу
+session_in_progress_expiry_idx, поэтому стоимость пропорциональна числу
+просроченных сессий, а не размеру таблицы.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from tests.models import TestSession
+from .session_results import process_session_results, save_session_result, ResultProcessingError
+
+logger = logging.getLogger(__name__)
+
+
+def get_expiry_cutoff(now=None):
+    """Момент, раньше которого дедлайн считается окончательно пропущенным"""
+    now = now or timezone.now()
+    return now - timedelta(seconds=settings.SESSION_DEADLINE_GRACE_SECONDS)
+
+
+def expire_overdue_sessions(now=None):
+    """
+    Перевести все просроченные сессии в статус «Истек» одним UPDATE
+
+    Returns:
+        int: количество переведенных сессий
+    """
+    now = now or timezone.now()
+    return TestSession.objects.filter(
+        status=TestSession.STATUS_IN_PROGRESS,
+        expires_at__lt=get_expiry_cutoff(now),
+    ).update(status=TestSession.STATUS_EXPIRED, updated_at=now)
+
+
+def auto_complete_overdue_sessions(limit=50, now=None):
+    """
+    Завершить просроченные сессии, в которых есть ответы, и обработать частичные ответы
+
+    Каждая сессия сначала захватывается в статус «Обработка результатов»
+    (TestSession.claim_processing), чтобы не обработать ее повторно, если
+    соискатель успел нажать «Завершить».
+
+    Returns:
+        tuple: (завершено, переведено в «Истек» из-за отсутствия валидных ответов)
+    """
+    now = now or timezone.now()
+    sessions = list(
+        TestSession.objects.filter(
+            status=TestSession.STATUS_IN_PROGRESS,
+            expires_at__lt=get_expiry_cutoff(now),
+        ).filter(
+            Q(answers__isnull=False) | Q(answer_storage=TestSession.ANSWER_STORAGE_PACKED)
+        ).select_related('test', 'user').order_by().distinct()[:limit]
+    )
+
+    completed = 0
+    expired = 0
+    for session in sessions:
+        if not session.claim_processing(settings.SESSION_PROCESSING_STALE_SECONDS, now=now):
+            continue
+
+        try:
+            result_data = process_session_results(session)
+        except ResultProcessingError as e:
+            logger.warning(f'[Expiry] Сессия {session.pk}: {e}. Переводим в «Истек»')
+            result_data = None
+        except Exception as e:
+            logger.error(f'[Expiry] Ошибка обработки сессии {session.pk}: {type(e).__name__}: {e}')
+            result_data = None
+
+        if not result_data:
+            session.release_processing(status=TestSession.STATUS_EXPIRED)
+            expired += 1
+            continue
+
+        save_session_result(session, result_data)
+        completed += 1
+
+    return completed, expired
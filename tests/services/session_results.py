@@ -0,0 +1,178 @@
+"""
+Сервис обработки результатов сессии тестирования
+
+Используется обработчиком complete и фоновой командой expire_sessions
+(автозавершение просроченных сессий с частичными ответами).
+
+Обработка разделена на подготовку (подсчет баллов и промпт, обращается к БД),
+вызов Gemini и формирование результата по ответу модели. В ASGI-режиме
+(aprocess_session_results) ожидание Gemini не занимает поток.
+"""
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.services.email_outbox import enqueue_email
+from tests.models import TestQuestion, TestResult
+from .gemini_service import call_gemini, call_gemini_async
+from .llm_ledger import llm_call_context
+from .raven_processor import prepare_raven_test, finalize_raven_test
+from .personal_qualities_processor import prepare_personal_qualities_test, finalize_personal_qualities_test
+from .productivity_processor import prepare_productivity_test, finalize_productivity_test
+from .session_scores import compute_scores, get_running_scores
+
+FINALIZERS = {
+    'iq_test': finalize_raven_test,
+    'personal_qualities': finalize_personal_qualities_test,
+    'productivity': finalize_productivity_test,
+}
+
+
+class ResultProcessingError(Exception):
+    """Результаты сессии невозможно обработать (нет валидных ответов, неизвестный тип теста)"""
+
+
+def collect_answers(session):
+    """Получить все ответы сессии в формате [{'question_number', 'answer', 'series'}, ...]"""
+    return session.get_answers()
+
+
+def process_session_results(session, answers_data=None):
+    """
+    Обработать ответы сессии процессором, соответствующим типу теста
+
+    Returns:
+        dict: данные результата для TestResult
+
+    Raises:
+        ResultProcessingError: если обрабатывать нечего
+    """
+    prepared = prepare_session_results(session, answers_data)
+    try:
+        with llm_call_context(session, prepared['test_type']):
+            report = call_gemini(prepared['context']['prompt'])
+    except Exception as e:
+        return finalize_session_results(prepared, error=e)
+    return finalize_session_results(prepared, report=report)
+
+
+async def aprocess_session_results(session, answers_data=None):
+    """Асинхронный вариант process_session_results для ASGI-режима"""
+    prepared = await sync_to_async(prepare_session_results)(session, answers_data)
+    try:
+        with llm_call_context(session, prepared['test_type']):
+            report = await call_gemini_async(prepared['context']['prompt'])
+    except Exception as e:
+        return finalize_session_results(prepared, error=e)
+    return finalize_session_results(prepared, report=report)
+
+
+def finalize_session_results(prepared, report=None, error=None):
+    """
+    Сформировать данные результата по ответу Gemini (без обращений к БД)
+
+    Args:
+        prepared: результат prepare_session_results
+        report: отчет, полученный от Gemini
+        error: ошибка вызова Gemini; тогда отчет строится без ИИ
+    """
+    return FINALIZERS[prepared['test_type']](prepared['context'], report=report, error=error)
+
+
+def prepare_session_results(session, answers_data=None):
+    """
+    Подсчитать баллы и сформировать промпт для Gemini
+
+    Returns:
+        dict: {'test_type': тип теста, 'context': данные процессора с промптом в 'prompt'}
+
+    Raises:
+        ResultProcessingError: если обрабатывать нечего
+    """
+    test_type = session.test.test_type
+    if test_type == 'iq_test':
+        # Верные ответы по сериям уже накоплены при сохранении ответов
+        if answers_data is None:
+            scores = get_running_scores(session)
+        else:
+            scores = compute_scores(test_type, session.test_id, answers_data)
+
+        if not any(entry['answered'] for entry in scores.values()):
+            raise ResultProcessingError('Нет валидных ответов для обработки')
+        series_scores = {series: int(entry['points']) for series, entry in scores.items()}
+        return {'test_type': test_type, 'context': prepare_raven_test(session, series_scores=series_scores)}
+
+    if answers_data is None:
+        answers_data = collect_answers(session)
+
+    if test_type == 'personal_qualities':
+        # Получаем вопросы с их типами и блоками
+        questions = TestQuestion.objects.filter(test=session.test).only(
+            'question_number', 'block_name', 'question_type'
+        )
+        question_map = {q.question_number: q for q in questions}
+
+        # Формируем ответы с информацией о блоках и типах
+        formatted_answers = []
+        for a in answers_data:
+            q_num = a['question_number']
+            question = question_map.get(q_num)
+            formatted_answers.append({
+                'question_number': q_num,
+                'answer': a['answer'],
+                'block_name': (question.block_name if question else '') or '',
+                'question_type': (question.question_type if question else '') or '+',
+            })
+
+        block_scores = {
+            block_name: entry['points']
+            for block_name, entry in get_running_scores(session, answers_data).items()
+        }
+        return {
+            'test_type': test_type,
+            'context': prepare_personal_qualities_test(formatted_answers, block_scores=block_scores),
+        }
+
+    elif test_type == 'productivity':
+        return {'test_type': test_type, 'context': prepare_productivity_test(answers_data)}
+
+    raise ResultProcessingError('Неизвестный тип теста')
+
+
+def save_session_result(session, result_data):
+    """
+    Сохранить результат, завершить сессию и поставить в очередь письмо владельцу
+
+    Повторный вызов для той же сессии (например, после перехвата зависшей
+    обработки) возвращает уже сохраненный результат без повторного письма.
+
+    Returns:
+        TestResult: результат сессии
+    """
+    with transaction.atomic():
+        test_result, created = TestResult.objects.get_or_create(
+            session=session,
+            defaults={
+                'raw_score': result_data.get('raw_score'),
+                'final_score': result_data.get('final_score'),
+                'iq_score': result_data.get('iq_score'),
+                'iq_level': result_data.get('iq_level', ''),
+                'scores_json': result_data.get('scores_json', {}),
+                'report': result_data.get('report', ''),
+                'report_json': result_data.get('report_json', {}),
+                'is_processed': True,
+                'processed_at': timezone.now(),
+            }
+        )
+        session.complete_test()
+
+        # Письмо пользователю с результатами отправит фоновый диспетчер
+        if created and session.user_id:
+            enqueue_email(
+                f'Результаты тестирования: {session.candidate_email}',
+                f'Результаты тестирования для {session.candidate_email}:\n\n'
+                f'{test_result.report}',
+                [session.user.email],
+            )
+
+    return test_result
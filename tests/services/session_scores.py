@@ -0,0 +1,266 @@
+"""
+Промежуточные баллы сессии, обновляемые по мере поступления ответов
+
+Для IQ-теста накапливается число верных ответов по сериям A-E, для теста
+личностных качеств - сумма баллов по блокам. Строки TestSessionScore
+создаются при старте сессии и изменяются на разницу между новым и прежним
+ответом, поэтому при завершении теста баллы не пересчитываются заново.
+
+Для сессий с упакованными ответами (TestSession.packed_answers) баллы
+считаются по массиву ответов: он занимает десятки байт.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from tests.data.personal_qualities_test import get_answer_points
+from tests.data.raven_test import get_correct_answer
+from tests.models import TestQuestion, TestAnswer, TestSession, TestSessionScore
+from tests.utils.answer_packing import RAVEN_MAX_OPTION, RAVEN_SERIES, raven_series
+
+SCORED_TEST_TYPES = ('iq_test', 'personal_qualities')
+
+# Карта вопросов теста {номер: (блок, тип)} в памяти процесса
+_QUESTION_MAP_TTL = 300
+_question_maps = {}
+_question_maps_lock = threading.Lock()
+
+
+def _question_map(test_id):
+    now = time.monotonic()
+    with _question_maps_lock:
+        entry = _question_maps.get(test_id)
+        if entry and now - entry[1] < _QUESTION_MAP_TTL:
+            return entry[0]
+
+    question_map = {
+        question_number: (block_name or '', question_type or '+')
+        for question_number, block_name, question_type in TestQuestion.objects.filter(
+            test_id=test_id
+        ).values_list('question_number', 'block_name', 'question_type')
+    }
+    # Пустую карту не кэшируем: вопросы могут еще не быть заполнены
+    if question_map:
+        with _question_maps_lock:
+            _question_maps[test_id] = (question_map, now)
+    return question_map
+
+
+def invalidate_question_map(test_id):
+    """Сбросить карту вопросов теста в памяти процесса (после заполнения или импорта)"""
+    with _question_maps_lock:
+        _question_maps.pop(test_id, None)
+
+
+def score_answer(test_type, test_id, question_number, answer_value):
+    """
+    Вклад ответа в промежуточные баллы
+
+    Returns:
+        tuple: (серия или блок, баллы) или None, если вопрос не оценивается
+    """
+    if answer_value is None:
+        return None
+
+    if test_type == 'iq_test':
+        key = raven_series(question_number)
+        if not key:
+            return None
+        try:
+            option = int(answer_value)
+        except (ValueError, TypeError):
+            return None
+        if not 1 <= option <= RAVEN_MAX_OPTION:
+            return None
+        return key, Decimal(1 if option == get_correct_answer(question_number) else 0)
+
+    if test_type == 'personal_qualities':
+        question = _question_map(test_id).get(question_number)
+        if question is None:
+            return None
+        block_name, question_type = question
+        return block_name, Decimal(str(get_answer_points(question_type, answer_value)))
+
+    return None
+
+
+def _score_keys(test_type, test_id):
+    if test_type == 'iq_test':
+        return list(RAVEN_SERIES)
+    if test_type == 'personal_qualities':
+        return sorted({block_name for block_name, _ in _question_map(test_id).values()})
+    return []
+
+
+def seed_session_scores(session):
+    """Создать нулевые строки баллов для сессии (при старте теста)"""
+    test_type = session.test.test_type
+    if test_type not in SCORED_TEST_TYPES or session.uses_packed_answers:
+        return
+    TestSessionScore.objects.bulk_create(
+        [TestSessionScore(session=session, key=key) for key in _score_keys(test_type, session.test_id)],
+        ignore_conflicts=True,
+    )
+
+
+def _apply_delta(session_id, test_type, test_id, question_number, previous_value, new_value):
+    previous = score_answer(test_type, test_id, question_number, previous_value)
+    current = score_answer(test_type, test_id, question_number, new_value)
+
+    if previous and current and previous[0] == current[0]:
+        if previous[1] != current[1]:
+            TestSessionScore.objects.filter(session_id=session_id, key=current[0]).update(
+                points=F('points') + (current[1] - previous[1])
+            )
+        return
+
+    if previous:
+        TestSessionScore.objects.filter(session_id=session_id, key=previous[0]).update(
+            points=F('points') - previous[1], answered=F('answered') - 1
+        )
+    if current:
+        TestSessionScore.objects.filter(session_id=session_id, key=current[0]).update(
+            points=F('points') + current[1], answered=F('answered') + 1
+        )
+
+
+def _lock_session(session_id):
+    # Блокировка строки ответа не защищает первый ответ на вопрос: строки еще
+    # нет, и два запроса прочитали бы пустой прежний ответ и оба добавили
+    # баллы. Ответы сессии записываются по очереди под блокировкой сессии.
+    TestSession.objects.select_for_update().filter(pk=session_id).values_list('pk', flat=True).first()
+
+
+def record_answer(state, question_number, answer_value, series=''):
+    """
+    Сохранить ответ (запись TestAnswer) и обновить промежуточные баллы
+
+    Args:
+        state: состояние сессии из session_cache.get_session_state
+
+    Returns:
+        tuple: (TestAnswer, создан ли ответ)
+    """
+    session_id = state['id']
+    test_type = state['test__test_type']
+    with transaction.atomic():
+        _lock_session(session_id)
+        previous_value = TestAnswer.objects.filter(
+            session_id=session_id, question_number=question_number
+        ).values_list('answer_value', flat=True).first()
+
+        answer, created = TestAnswer.objects.update_or_create(
+            session_id=session_id,
+            question_number=question_number,
+            defaults={
+                'answer_value': str(answer_value),
+                'series': series or ''
+            }
+        )
+
+        if test_type in SCORED_TEST_TYPES:
+            _apply_delta(session_id, test_type, state['test_id'], question_number, previous_value, answer.answer_value)
+
+    return answer, created
+
+
+def record_answers(state, answers):
+    """
+    Сохранить несколько ответов (записи TestAnswer) и обновить промежуточные баллы
+
+    Прежние ответы читаются одним запросом, ответы записываются одним
+    bulk_create с обновлением при конфликте, баллы - одним UPDATE на серию
+    или блок.
+
+    Args:
+        state: состояние сессии из session_cache.get_session_state
+        answers: {номер вопроса: (значение, серия)}
+    """
+    session_id = state['id']
+    test_type = state['test__test_type']
+    with transaction.atomic():
+        _lock_session(session_id)
+        previous = dict(TestAnswer.objects.filter(
+            session_id=session_id, question_number__in=list(answers)
+        ).values_list('question_number', 'answer_value'))
+
+        TestAnswer.objects.bulk_create(
+            [
+                TestAnswer(
+                    session_id=session_id,
+                    question_number=question_number,
+                    answer_value=str(answer_value),
+                    series=series or '',
+                )
+                for question_number, (answer_value, series) in answers.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['session', 'question_number'],
+            update_fields=['answer_value', 'series'],
+        )
+
+        if test_type not in SCORED_TEST_TYPES:
+            return
+
+        deltas = {}
+        for question_number, (answer_value, _) in answers.items():
+            before = score_answer(test_type, state['test_id'], question_number, previous.get(question_number))
+            after = score_answer(test_type, state['test_id'], question_number, str(answer_value))
+            for scored, sign in ((before, -1), (after, 1)):
+                if scored:
+                    delta = deltas.setdefault(scored[0], [Decimal(0), 0])
+                    delta[0] += sign * scored[1]
+                    delta[1] += sign
+
+        for key, (points, answered) in deltas.items():
+            if points or answered:
+                TestSessionScore.objects.filter(session_id=session_id, key=key).update(
+                    points=F('points') + points, answered=F('answered') + answered
+                )
+
+
+def compute_scores(test_type, test_id, answers):
+    """
+    Посчитать баллы по списку ответов [{'question_number', 'answer'}, ...]
+
+    Returns:
+        dict: {серия или блок: {'points': float, 'answered': int}}
+    """
+    scores = {key: {'points': Decimal(0), 'answered': 0} for key in _score_keys(test_type, test_id)}
+    for answer in answers:
+        scored = score_answer(test_type, test_id, answer['question_number'], answer['answer'])
+        if not scored:
+            continue
+        entry = scores.setdefault(scored[0], {'points': Decimal(0), 'answered': 0})
+        entry['points'] += scored[1]
+        entry['answered'] += 1
+    return {key: {'points': float(v['points']), 'answered': v['answered']} for key, v in scores.items()}
+
+
+def get_running_scores(session, answers=None):
+    """
+    Текущие баллы сессии
+
+    Args:
+        answers: уже загруженные ответы сессии, если баллы придется считать по ним
+
+    Returns:
+        dict: {серия или блок: {'points': float, 'answered': int}} или None,
+              если тест не оценивается по мере прохождения
+    """
+    test_type = session.test.test_type
+    if test_type not in SCORED_TEST_TYPES:
+        return None
+
+    if not session.uses_packed_answers:
+        rows = list(session.scores.values_list('key', 'points', 'answered'))
+        if rows:
+            return {key: {'points': float(points), 'answered': answered} for key, points, answered in rows}
+
+    # Упакованные ответы или сессия, начатая до появления промежуточных баллов
+    if answers is None:
+        answers = session.get_answers()
+    return compute_scores(test_type, session.test_id, answers)
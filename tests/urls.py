@@ -1,12 +1,25 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TestViewSet, TestSessionViewSet, TestResultViewSet
+from .views import TestViewSet, TestSessionViewSet, TestResultViewSet, LLMUsageViewSet
 
 router = DefaultRouter()
 router.register(r'tests', TestViewSet, basename='test')
 router.register(r'sessions', TestSessionViewSet, basename='test-session')
 router.register(r'results', TestResultViewSet, basename='test-result')
+router.register(r'llm-usage', LLMUsageViewSet, basename='llm-usage')
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASGI_MODE:
+    from . import async_views
+    
+    # Перекрывают действия complete и download_pdf роутера
+    urlpatterns += [
+        path('sessions/<str:pk>/complete/', async_views.complete_session),
+        path('sessions/<str:pk>/download_pdf/', async_views.download_session_pdf),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
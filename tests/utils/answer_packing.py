@@ -0,0 +1,140 @@
+"""
+Упаковка ответов закрытых тестов в байтовый массив
+
+Ответ на вопрос N хранится в фиксированной позиции массива:
+    - личностные качества: 2 бита на ответ (0 - нет ответа, 1 - да, 2 - нет, 3 - иногда);
+    - IQ-тест: 4 бита на ответ (0 - нет ответа, 1-8 - номер варианта).
+
+200 ответов теста личностных качеств занимают 50 байт, 60 ответов IQ-теста - 30 байт.
+"""
+
+PACKED_TEST_TYPES = ('iq_test', 'personal_qualities')
+
+_BITS_PER_ANSWER = {
+    'iq_test': 4,
+    'personal_qualities': 2,
+}
+
+_PQ_CODES = {
+    'yes': 1, 'да': 1,
+    'no': 2, 'нет': 2,
+    'sometimes': 3, 'иногда': 3,
+}
+_PQ_VALUES = {1: 'yes', 2: 'no', 3: 'sometimes'}
+
+RAVEN_MAX_OPTION = 8
+RAVEN_SERIES = 'ABCDE'
+RAVEN_SERIES_SIZE = 12
+
+
+def supports_packing(test_type):
+    """Можно ли хранить ответы теста в упакованном виде"""
+    return test_type in PACKED_TEST_TYPES
+
+
+def packed_size(test_type, questions_count):
+    """Размер массива в байтах для теста с questions_count вопросами"""
+    bits = _BITS_PER_ANSWER[test_type]
+    return (questions_count * bits + 7) // 8
+
+
+def encode_answer(test_type, value):
+    """
+    Код ответа для упаковки
+
+    Raises:
+        ValueError: если значение недопустимо для теста
+    """
+    if test_type == 'personal_qualities':
+        code = _PQ_CODES.get(str(value).strip().lower())
+        if code is None:
+            raise ValueError(f'Недопустимый ответ: {value}')
+        return code
+
+    if test_type == 'iq_test':
+        try:
+            code = int(value)
+        except (ValueError, TypeError):
+            raise ValueError(f'Недопустимый ответ: {value}')
+        if not 1 <= code <= RAVEN_MAX_OPTION:
+            raise ValueError(f'Недопустимый ответ: {value}')
+        return code
+
+    raise ValueError(f'Тест {test_type} не поддерживает упакованное хранение ответов')
+
+
+def decode_answer(test_type, code):
+    """Значение ответа в том виде, в котором его присылает страница теста"""
+    if test_type == 'personal_qualities':
+        return _PQ_VALUES[code]
+    return str(code)
+
+
+def answer_position(test_type, question_number):
+    """
+    Позиция ответа в массиве
+
+    Returns:
+        tuple: (индекс байта, сдвиг в битах, маска ответа в байте)
+    """
+    bits = _BITS_PER_ANSWER[test_type]
+    bit_offset = (question_number - 1) * bits
+    shift = bit_offset % 8
+    return bit_offset // 8, shift, ((1 << bits) - 1) << shift
+
+
+def pack_answer(data, test_type, question_number, value):
+    """Вернуть копию массива с записанным ответом"""
+    code = encode_answer(test_type, value)
+    index, shift, mask = answer_position(test_type, question_number)
+    buffer = bytearray(data or b'')
+    if index >= len(buffer):
+        buffer.extend(b'\x00' * (index + 1 - len(buffer)))
+    buffer[index] = (buffer[index] & ~mask & 0xFF) | (code << shift)
+    return bytes(buffer)
+
+
+def raven_series(question_number):
+    """Серия вопроса IQ-теста (A-E) по его номеру"""
+    index = (question_number - 1) // RAVEN_SERIES_SIZE
+    return RAVEN_SERIES[index] if 0 <= index < len(RAVEN_SERIES) else ''
+
+
+def unpack_answers(data, test_type):
+    """
+    Распаковать ответы
+
+    Returns:
+        list: [{'question_number': int, 'answer': str, 'series': str}, ...]
+              в порядке номеров вопросов, без вопросов без ответа
+    """
+    bits = _BITS_PER_ANSWER[test_type]
+    mask = (1 << bits) - 1
+    per_byte = 8 // bits
+    answers = []
+    for index, byte in enumerate(bytes(data or b'')):
+        if not byte:
+            continue
+        for slot in range(per_byte):
+            code = (byte >> (slot * bits)) & mask
+            if not code:
+                continue
+            question_number = index * per_byte + slot + 1
+            answers.append({
+                'question_number': question_number,
+                'answer': decode_answer(test_type, code),
+                'series': raven_series(question_number) if test_type == 'iq_test' else '',
+            })
+    return answers
+
+
+def count_answers(data, test_type):
+    """Количество вопросов с ответом"""
+    bits = _BITS_PER_ANSWER[test_type]
+    mask = (1 << bits) - 1
+    per_byte = 8 // bits
+    return sum(
+        1
+        for byte in bytes(data or b'') if byte
+        for slot in range(per_byte) if (byte >> (slot * bits)) & mask
+    )
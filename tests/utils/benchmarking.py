@@ -0,0 +1,65 @@
+"""
+Общие функции и данные команд-бенчмарков (benchmark_processors, benchmark_pdf, loadtest)
+"""
+import json
+import platform
+import statistics
+import subprocess
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+# Фразы синтетических ответов на вопросы теста продуктивности
+PRODUCTIVITY_ANSWER_PARTS = [
+    'Увеличил продажи отдела на 23% за полгода.',
+    'Занимался сопровождением клиентов и участвовал в планерках.',
+    'Внедрил CRM и сократил время обработки заявки с 2 дней до 4 часов.',
+    'Отвечал за работу склада, старался выполнять план.',
+    'Был в тройке лучших менеджеров по выручке из 15 человек.',
+    'Кризис на рынке не позволил выполнить план.',
+]
+
+
+def summarize(samples):
+    """Сводка замеров (секунды) в миллисекундах"""
+    ordered = sorted(samples)
+    return {
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 4),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 4),
+        'p95_ms': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 4),
+        'max_ms': round(ordered[-1] * 1000, 4),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(**options):
+    """Сведения о прогоне для JSON результатов: время, ревизия, окружение и параметры"""
+    return {
+        'created_at': timezone.now().isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        **options,
+    }
+
+
+def load_results(path):
+    """Результаты прошлого прогона из JSON файла (--output)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)['results']
+    except (OSError, ValueError, KeyError) as e:
+        raise CommandError(f'Не удалось прочитать {path}: {e}')
+
+
+def save_results(path, meta, results):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
@@ -17,6 +17,9 @@ from reportlab.graphics import renderPDF
 from reportlab.platypus import Image as RLImage
 import re
 import os
+import time
+
+from personnel_testing.prometheus_metrics import PDF_RENDER_LATENCY
 
 # Регистрируем шрифты с поддержкой кириллицы
 def _register_cyrillic_fonts():
@@ -72,6 +75,8 @@ def generate_pdf_report(result_data):
     Returns:
         BytesIO: буфер с PDF файлом
     """
+    started = time.perf_counter()
+    
     # Регистрируем шрифты перед созданием документа
     _register_cyrillic_fonts()
     
@@ -367,6 +372,7 @@ def generate_pdf_report(result_data):
     # Генерация PDF
     doc.build(story)
     buffer.seek(0)
+    PDF_RENDER_LATENCY.labels(test_type or 'unknown').observe(time.perf_counter() - started)
     return buffer
 
 
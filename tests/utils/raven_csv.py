@@ -0,0 +1,129 @@
+"""
+Генерация CSV с вопросами IQ-теста по ключу ответов
+
+Строки строятся по таблице серий, выведенной из ключа вида {'A1': 4, 'A2': 5, ...},
+и передаются в csv.writer по одной, без накопления в памяти. Поддерживаются
+произвольные банки заданий: любое число серий и вопросов в серии, параллельные
+формы (отдельный ключ и каталог изображений).
+
+Используется командами generate_raven_csv и import_raven_questions.
+"""
+import csv
+import re
+from importlib import import_module
+
+from tests.data.raven_test import RAVEN_TEST_ANSWER_KEY
+
+FIELDNAMES = [
+    'id', 'question_number', 'question_text', 'question_image',
+    'series', 'question_type', 'block_name', 'correct_answer',
+    'order', 'created_at', 'updated_at', 'test_id',
+    'answer_options', 'display_type'
+]
+
+DEFAULT_QUESTION_TEXT = (
+    'Вашей задачей является найти в ряде фрагментов тот, который точно вписался бы '
+    'в свободное место и ввести соответствующий номер фрагмента в поле ответа.'
+)
+
+_KEY_RE = re.compile(r'^([A-Za-z]+)(\d+)$')
+
+
+def load_answer_key(path):
+    """
+    Загрузить ключ ответов по пути вида module.path:NAME
+
+    Raises:
+        ValueError: если путь некорректен или объект не является словарем
+    """
+    module_path, _, name = path.partition(':')
+    if not module_path or not name:
+        raise ValueError('Ключ ответов должен иметь вид module.path:NAME')
+    try:
+        answer_key = getattr(import_module(module_path), name)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f'Не удалось загрузить ключ ответов {path}: {str(e)}')
+    if not isinstance(answer_key, dict):
+        raise ValueError(f'{path} не является словарем')
+    return answer_key
+
+
+def series_layout(answer_key=None):
+    """
+    Таблица серий ключа ответов
+
+    Returns:
+        list: [(серия, число вопросов, номер первого вопроса), ...] в порядке серий
+    """
+    answer_key = RAVEN_TEST_ANSWER_KEY if answer_key is None else answer_key
+    sizes = {}
+    for key in answer_key:
+        match = _KEY_RE.match(key)
+        if not match:
+            raise ValueError(f'Некорректный ключ вопроса: {key}')
+        series, number = match.group(1).upper(), int(match.group(2))
+        sizes[series] = max(sizes.get(series, 0), number)
+
+    layout = []
+    start = 1
+    for series in sorted(sizes, key=lambda s: (len(s), s)):
+        layout.append((series, sizes[series], start))
+        start += sizes[series]
+    return layout
+
+
+def series_offsets(answer_key=None):
+    """Номер первого и последнего вопроса каждой серии: {'A': (1, 12), ...}"""
+    return {
+        series: (start, start + count - 1)
+        for series, count, start in series_layout(answer_key)
+    }
+
+
+def iter_question_rows(answer_key=None, image_dir='test_questions', image_ext='png',
+                       question_text=DEFAULT_QUESTION_TEXT, test_id='1'):
+    """
+    Строки CSV (словари с полями FIELDNAMES) по одной на вопрос
+
+    Варианты ответа: 1-6 для серий, где все ответы не больше 6, иначе 1-8.
+    """
+    answer_key = RAVEN_TEST_ANSWER_KEY if answer_key is None else answer_key
+    for series, count, start in series_layout(answer_key):
+        series_answers = [answer_key.get(f'{series}{i}') for i in range(1, count + 1)]
+        options_count = 8 if max((a for a in series_answers if a), default=0) > 6 else 6
+        answer_options = str(list(range(1, options_count + 1)))
+
+        for i, correct_answer in enumerate(series_answers, start=1):
+            yield {
+                'id': '',  # Будет заполнено при импорте
+                'question_number': i,  # Номер в серии
+                'question_text': question_text,
+                'question_image': f'{image_dir}/{series}{i}.{image_ext}',
+                'series': series,
+                'question_type': '',
+                'block_name': '',
+                'correct_answer': '' if correct_answer is None else str(correct_answer),
+                'order': start + i - 1,  # Общий номер вопроса
+                'created_at': '',
+                'updated_at': '',
+                'test_id': test_id,
+                'answer_options': answer_options,
+                'display_type': 'number',
+            }
+
+
+def write_question_rows(stream, rows, header=False):
+    """
+    Записать строки в CSV поток
+
+    Returns:
+        int: количество записанных строк
+    """
+    writer = csv.DictWriter(stream, fieldnames=FIELDNAMES, quoting=csv.QUOTE_MINIMAL)
+    if header:
+        writer.writeheader()
+    written = 0
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+    return written
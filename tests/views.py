@@ -1,19 +1,37 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.exceptions import NotFound
+from datetime import timedelta
+from django.contrib.auth import get_user_model
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse
 from .models import Test, TestQuestion, TestSession, TestAnswer, TestResult
 from .serializers import TestSerializer, TestSessionSerializer, TestAnswerSerializer, TestResultSerializer
-from .services.raven_processor import process_raven_test
-from .services.personal_qualities_processor import process_personal_qualities_test
-from .services.productivity_processor import process_productivity_test
+from .services.answer_journal import JournalError, apply_entries, parse_entries
+from .services.answer_storage import save_packed_answer
+from .services.question_images import get_asset_manifest
+from .services.question_seeding import seed_test_questions
+from .services.session_cache import get_session_state, is_state_deadline_passed
+from .services.session_scores import seed_session_scores, record_answer, get_running_scores
+from .services.session_results import process_session_results, save_session_result, ResultProcessingError
+from .services.llm_ledger import get_usage_summary
+from .services.invitation_service import build_invitation_message, parse_candidates, MAX_BULK_CANDIDATES
+from .utils.answer_packing import raven_series
 from .utils.pdf_generator import generate_pdf_report
+from accounts.services.email_outbox import enqueue_email, enqueue_emails
+
+
+def _bulk_session_data(session):
+    return {
+        'id': str(session.id),
+        'candidate_email': session.candidate_email,
+        'candidate_name': session.candidate_name,
+        'test_link': f"{settings.SITE_URL}/test/{session.id}/",
+    }
 
 
 class TestViewSet(viewsets.ReadOnlyModelViewSet):
@@ -22,6 +40,58 @@ class TestViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
 
 
+def is_overdue(session):
+    """
+    Запрос завершения пришел после дедлайна (с допуском SESSION_DEADLINE_GRACE_SECONDS)
+
+    Такую сессию завершает только фоновый expire_sessions: с --auto-complete
+    по ответам, данным вовремя, иначе переводит в «Истек».
+    """
+    return session.status == TestSession.STATUS_IN_PROGRESS and session.is_deadline_passed(
+        grace_seconds=settings.SESSION_DEADLINE_GRACE_SECONDS
+    )
+
+
+def unclaimed_completion_response(session):
+    """
+    Ответ на запрос завершения, если обработку захватить не удалось
+    (общий для синхронного complete и асинхронного варианта в async_views)
+    
+    Returns:
+        tuple: (данные ответа, HTTP-статус)
+    """
+    session.refresh_from_db(fields=['status', 'processing_started_at'])
+    
+    if session.status == TestSession.STATUS_PROCESSING:
+        return {'status': TestSession.STATUS_PROCESSING}, status.HTTP_202_ACCEPTED
+    
+    if session.status == TestSession.STATUS_COMPLETED:
+        test_result = TestResult.objects.filter(session=session).first()
+        if test_result:
+            return TestResultSerializer(test_result).data, status.HTTP_200_OK
+    
+    if session.status == TestSession.STATUS_EXPIRED:
+        return {'error': 'Время прохождения теста истекло'}, status.HTTP_400_BAD_REQUEST
+    
+    return {'error': 'Тест не в процессе выполнения'}, status.HTTP_400_BAD_REQUEST
+
+
+def pdf_report_response(session, pdf_buffer):
+    """HTTP-ответ с PDF отчетом (общий для download_pdf и async_views)"""
+    # Формирование имени файла
+    candidate_name = session.candidate_name or session.candidate_email
+    safe_name = "".join(c for c in candidate_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    safe_name = safe_name.replace(' ', '_')
+    test_name = session.test.name.replace(' ', '_')
+    date_str = timezone.now().strftime('%Y-%m-%d')
+    filename = f"Отчет_{safe_name}_{test_name}_{date_str}.pdf"
+    
+    # Создание HTTP ответа
+    response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename*=UTF-8\'\'{filename}'
+    return response
+
+
 class TestSessionViewSet(viewsets.ModelViewSet):
     serializer_class = TestSessionSerializer
     permission_classes = [AllowAny]  # Для прохождения теста соискателями
@@ -52,6 +122,32 @@ class TestSessionViewSet(viewsets.ModelViewSet):
         self.check_object_permissions(self.request, obj)
         return obj
     
+    def get_candidate_session(self):
+        """
+        Загрузить сессию для действий соискателя (start, questions, submit_answer, complete)
+        
+        Сессия и тест получаются одним запросом без сортировки, результат
+        кэшируется на время обработки запроса.
+        """
+        session = getattr(self, '_candidate_session', None)
+        if session is not None:
+            return session
+        
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        session = (
+            self.get_queryset()
+            .select_related('test')
+            .order_by()
+            .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .first()
+        )
+        if session is None:
+            raise NotFound('Сессия не найдена')
+        
+        self.check_object_permissions(self.request, session)
+        self._candidate_session = session
+        return session
+    
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def create_session(self, request):
         """Создать сессию тестирования для соискателя (только для авторизованных пользователей)"""
@@ -59,19 +155,9 @@ class TestSessionViewSet(viewsets.ModelViewSet):
         from django.utils import timezone
         from datetime import timedelta
         
-        user = request.user
-        
-        # Проверка наличия активной подписки
         from accounts.models import Subscription
-        subscription = Subscription.objects.filter(
-            user=user,
-            is_active=True,
-            remaining_tests__gt=0
-        ).first()
         
-        if not subscription:
-            return Response({'error': 'Нет активной подписки или не осталось тестов'}, 
-                          status=status.HTTP_400_BAD_REQUEST)
+        user = request.user
         
         test_id = request.data.get('test_id')
         candidate_email = request.data.get('candidate_email', '').strip()
@@ -106,10 +192,9 @@ class TestSessionViewSet(viewsets.ModelViewSet):
         # Создание сессии в транзакции для предотвращения race condition
         try:
             with transaction.atomic():
-                # Повторная проверка подписки внутри транзакции
-                subscription.refresh_from_db()
-                if subscription.remaining_tests <= 0:
-                    return Response({'error': 'Не осталось тестов'}, 
+                # Атомарное списание теста с подписки (один UPDATE с проверкой остатка)
+                if not Subscription.reserve_tests(user):
+                    return Response({'error': 'Нет активной подписки или не осталось тестов'}, 
                                   status=status.HTTP_400_BAD_REQUEST)
                 
                 # Создание сессии
@@ -123,103 +208,123 @@ class TestSessionViewSet(viewsets.ModelViewSet):
                     status=TestSession.STATUS_PENDING
                 )
                 
-                # Уменьшение количества оставшихся тестов
-                subscription.remaining_tests -= 1
-                subscription.save(update_fields=['remaining_tests'])
-                
-                # Отправка email соискателю
-                test_link = f"{settings.SITE_URL}/test/{session.id}/"
-                email_sent = False
-                email_error = None
-                
-                try:
-                    from django.core.mail import EmailMessage
-                    from django.template.loader import render_to_string
-                    
-                    # Проверяем, что email backend настроен правильно
-                    if settings.EMAIL_BACKEND == 'django.core.mail.backends.console.EmailBackend':
-                        # Если используется console backend, выводим предупреждение
-                        print(f"\n{'='*60}")
-                        print(f"ВНИМАНИЕ: Используется console email backend!")
-                        print(f"Письмо не будет отправлено реально.")
-                        print(f"Настройте EMAIL_BACKEND в .env для реальной отправки.")
-                        print(f"{'='*60}\n")
-                    
-                    # Создаем HTML письмо
-                    subject = 'Приглашение пройти тестирование'
-                    message = f'''Здравствуйте{f", {candidate_name}" if candidate_name else ""}!
-
-Вам направлено приглашение пройти тестирование.
-Перейдите по ссылке для начала: {test_link}
-
-Тест: {test.name}
-Длительность: {test.duration_minutes} минут
-
-С уважением,
-Команда системы тестирования персонала
-'''
-                    
-                    # Отправляем письмо
-                    result = send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [candidate_email],
-                        fail_silently=False,  # Не скрываем ошибки
-                    )
-                    
-                    if result:
-                        email_sent = True
-                        print(f"✓ Email успешно отправлен на {candidate_email}")
-                    else:
-                        email_error = "Email backend вернул False"
-                        print(f"✗ Ошибка отправки email: {email_error}")
-                        
-                except Exception as e:
-                    email_error = str(e)
-                    # Логируем ошибку подробно
-                    import traceback
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    
-                    error_details = f"""
-{'='*60}
-ОШИБКА ОТПРАВКИ EMAIL:
-Email: {candidate_email}
-Ошибка: {email_error}
-Traceback:
-{traceback.format_exc()}
-{'='*60}
-"""
-                    logger.error(error_details)
-                    print(error_details)
-                    
-                    # Если это не console backend, пробуем отправить через другой способ
-                    if settings.EMAIL_BACKEND != 'django.core.mail.backends.console.EmailBackend':
-                        # Пробуем использовать send_mail с fail_silently=True как fallback
-                        try:
-                            send_mail(
-                                subject,
-                                message,
-                                settings.DEFAULT_FROM_EMAIL,
-                                [candidate_email],
-                                fail_silently=True,
-                            )
-                            print(f"Попытка отправки с fail_silently=True выполнена")
-                        except:
-                            pass
+                # Приглашение ставится в очередь отправки в той же транзакции,
+                # SMTP вызывается фоновым диспетчером (dispatch_emails)
+                subject, message = build_invitation_message(session, test)
+                enqueue_email(subject, message, [candidate_email])
                 
                 serializer = self.get_serializer(session)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
-            return Response({'error': f'Ошибка создания сессии: {str(e)}'}, 
+            return Response({'error': f'Ошибка создания сессии: {str(e)}'},
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk_create_sessions(self, request):
+        """
+        Массовое приглашение соискателей (только для авторизованных пользователей)
+
+        Принимает test_id и список кандидатов в поле candidates (JSON),
+        в поле csv (текст) или CSV файлом в поле file (колонки: email, name, age).
+        """
+        from accounts.models import Subscription
+
+        user = request.user
+        test_id = request.data.get('test_id')
+        if not test_id:
+            return Response({'error': 'test_id обязателен'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            test = Test.objects.get(id=test_id, is_active=True)
+        except (Test.DoesNotExist, ValueError, TypeError):
+            return Response({'error': 'Тест не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+        csv_text = request.data.get('csv')
+        uploaded_file = request.FILES.get('file')
+        if uploaded_file:
+            try:
+                csv_text = uploaded_file.read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                return Response({'error': 'CSV файл должен быть в кодировке UTF-8'},
+                              status=status.HTTP_400_BAD_REQUEST)
+
+        candidates = request.data.get('candidates')
+        if candidates is not None and not isinstance(candidates, list):
+            return Response({'error': 'candidates должен быть списком'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        candidates, errors = parse_candidates(candidates=candidates, csv_text=csv_text)
+        if not candidates:
+            return Response({'error': 'Не передано ни одного корректного кандидата', 'errors': errors},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if len(candidates) > MAX_BULK_CANDIDATES:
+            return Response({'error': f'Не более {MAX_BULK_CANDIDATES} кандидатов за один запрос'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Запросы одного пользователя выполняются по очереди, чтобы повтор,
+            # пришедший во время обработки первого, увидел созданные им сессии
+            get_user_model().objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True).first()
+
+            # Защита от повторной отправки: кандидатам, которым этот тест недавно
+            # уже отправлен, сессия не создается и тест не списывается
+            recent_threshold = timezone.now() - timedelta(seconds=settings.BULK_INVITATION_DUPLICATE_SECONDS)
+            recent_sessions = {}
+            for session in TestSession.objects.filter(
+                user=user,
+                test=test,
+                status=TestSession.STATUS_PENDING,
+                created_at__gte=recent_threshold,
+            ).order_by('created_at'):
+                recent_sessions[session.candidate_email.lower()] = session
+            duplicates = [
+                recent_sessions[candidate['candidate_email'].lower()]
+                for candidate in candidates
+                if candidate['candidate_email'].lower() in recent_sessions
+            ]
+
+            sessions = [
+                TestSession(
+                    user=user,
+                    test=test,
+                    candidate_email=candidate['candidate_email'],
+                    candidate_name=candidate['candidate_name'],
+                    candidate_age=candidate['candidate_age'],
+                    time_limit_minutes=test.duration_minutes,
+                    status=TestSession.STATUS_PENDING
+                )
+                for candidate in candidates
+                if candidate['candidate_email'].lower() not in recent_sessions
+            ]
+
+            if sessions:
+                # Списываем сразу N тестов одним UPDATE
+                if not Subscription.reserve_tests(user, count=len(sessions)):
+                    return Response({'error': f'Недостаточно тестов в подписке для {len(sessions)} кандидатов'},
+                                  status=status.HTTP_400_BAD_REQUEST)
+
+                TestSession.objects.bulk_create(sessions, batch_size=500)
+
+                messages = []
+                for session in sessions:
+                    subject, message = build_invitation_message(session, test)
+                    messages.append((subject, message, settings.DEFAULT_FROM_EMAIL, [session.candidate_email]))
+
+                # Все приглашения попадают в очередь одним INSERT
+                enqueue_emails(messages)
+
+        return Response({
+            'created': len(sessions),
+            'sessions': [_bulk_session_data(session) for session in sessions],
+            'duplicates': [_bulk_session_data(session) for session in duplicates],
+            'errors': errors,
+        }, status=status.HTTP_201_CREATED if sessions else status.HTTP_200_OK)
+
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def start(self, request, pk=None):
         """Начать тест"""
         try:
-            session = self.get_object()
+            session = self.get_candidate_session()
         except NotFound as e:
             return Response({'error': f'Сессия не найдена: {str(e)}'}, 
                           status=status.HTTP_404_NOT_FOUND)
@@ -233,6 +338,7 @@ Traceback:
         
         try:
             session.start_test()
+            seed_session_scores(session)
             serializer = self.get_serializer(session)
             # Добавляем time_limit_minutes в ответ, если его нет
             response_data = serializer.data
@@ -247,17 +353,17 @@ Traceback:
     def questions(self, request, pk=None):
         """Получить вопросы для теста"""
         import random
-        session = self.get_object()
+        session = self.get_candidate_session()
         
         # Получить вопросы для теста
         from .serializers import TestQuestionSerializer
         
         questions = TestQuestion.objects.filter(test=session.test)
         
-        # Если вопросов нет в базе, создать их из данных теста (кроме IQ теста)
-        if not questions.exists() and session.test.test_type != 'iq_test':
-            self._create_questions_for_test(session.test)
-            questions = TestQuestion.objects.filter(test=session.test)
+        # Вопросы заполняются init_tests и после migrate; здесь только страховка
+        # для теста, созданного в обход них (заполнение идемпотентно)
+        if session.test.test_type != 'iq_test' and not questions.exists():
+            seed_test_questions(session.test)
         
         # Для теста личностных качеств - перемешиваем вопросы случайным образом
         if session.test.test_type == 'personal_qualities':
@@ -273,61 +379,30 @@ Traceback:
         serializer = TestQuestionSerializer(questions, many=True)
         return Response(serializer.data)
     
-    def _create_questions_for_test(self, test):
-        """Создать вопросы для теста на основе его типа (кроме IQ теста - вопросы заносятся вручную)"""
-        if test.test_type == 'iq_test':
-            # Для IQ теста вопросы не создаем автоматически - заносятся вручную
-            return
-        
-        elif test.test_type == 'personal_qualities':
-            from .data.personal_qualities_test import PERSONAL_QUALITIES_BLOCKS
-            
-            # Варианты ответов для теста личностных качеств
-            answer_options = [
-                {"value": "yes", "label": "Да"},
-                {"value": "no", "label": "Нет"},
-                {"value": "sometimes", "label": "Иногда"}
-            ]
-            
-            q_num = 1
-            for block_name, block_data in PERSONAL_QUALITIES_BLOCKS.items():
-                if 'questions' in block_data:
-                    for question in block_data['questions']:
-                        TestQuestion.objects.create(
-                            test=test,
-                            question_number=q_num,
-                            question_text=question.get('text', ''),
-                            question_type=question.get('type', '+'),
-                            block_name=block_name,
-                            answer_options=answer_options,
-                            display_type='radio',
-                            order=q_num
-                        )
-                        q_num += 1
-        
-        elif test.test_type == 'productivity':
-            from .data.productivity_test import PRODUCTIVITY_QUESTIONS
-            
-            # Для теста продуктивности - открытые вопросы
-            for question_data in PRODUCTIVITY_QUESTIONS:
-                TestQuestion.objects.create(
-                    test=test,
-                    question_number=question_data['number'],
-                    question_text=question_data['question'],
-                    block_name=question_data.get('block', ''),
-                    answer_options=[],  # Нет вариантов, открытый текст
-                    display_type='textarea',
-                    order=question_data['number']
-                )
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def assets(self, request, pk=None):
+        """Манифест изображений вопросов теста для предварительной загрузки"""
+        session = self.get_candidate_session()
+        return Response(get_asset_manifest(session.test_id))
     
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])
     def submit_answer(self, request, pk=None):
         """Отправить ответ на вопрос"""
-        session = self.get_object()
+        # Состояние сессии берется из кэша: строка TestSession не читается
+        state = get_session_state(pk)
+        if state is None or (
+            request.user.is_authenticated and state['user_id'] != request.user.id
+        ):
+            raise NotFound('Сессия не найдена')
+        session_id = state['id']
         
-        if session.status != TestSession.STATUS_IN_PROGRESS:
+        if state['status'] != TestSession.STATUS_IN_PROGRESS:
             return Response({'error': 'Тест не начат'}, status=status.HTTP_400_BAD_REQUEST)
         
+        if is_state_deadline_passed(state, grace_seconds=settings.SESSION_DEADLINE_GRACE_SECONDS):
+            return Response({'error': 'Время прохождения теста истекло'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        
         question_number = request.data.get('question_number')
         answer_value = request.data.get('answer_value')
         series = request.data.get('series', '')
@@ -343,165 +418,138 @@ Traceback:
             return Response({'error': 'question_number должен быть числом'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Используем транзакцию для предотвращения race condition
+        if state['answer_storage'] == TestSession.ANSWER_STORAGE_PACKED:
+            return self._submit_packed_answer(state, question_number, answer_value)
+        
+        # Ответ и промежуточные баллы сохраняются в одной транзакции
         try:
-            with transaction.atomic():
-                answer, created = TestAnswer.objects.update_or_create(
-                    session=session,
-                    question_number=question_number,
-                    defaults={
-                        'answer_value': str(answer_value),
-                        'series': series or ''
-                    }
-                )
-            
-            serializer = TestAnswerSerializer(answer)
-            return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
-        except Exception as e:
-            # Если возникла ошибка уникальности, пытаемся обновить существующую запись
+            answer, created = record_answer(state, question_number, answer_value, series)
+        except IntegrityError:
+            # Параллельный запрос успел создать ответ - повторяем как перезапись
             try:
-                answer = TestAnswer.objects.get(session=session, question_number=question_number)
-                answer.answer_value = str(answer_value)
-                answer.series = series or ''
-                answer.save()
-                serializer = TestAnswerSerializer(answer)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except TestAnswer.DoesNotExist:
+                answer, created = record_answer(state, question_number, answer_value, series)
+            except Exception as e:
                 return Response({'error': f'Ошибка сохранения ответа: {str(e)}'}, 
                               status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception as e:
+            return Response({'error': f'Ошибка сохранения ответа: {str(e)}'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        serializer = TestAnswerSerializer(answer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])
-    def complete(self, request, pk=None):
-        """Завершить тест и обработать результаты"""
-        session = self.get_object()
+    def submit_answers(self, request, pk=None):
+        """Отправить пачку ответов из журнала страницы теста"""
+        state = get_session_state(pk)
+        if state is None or (
+            request.user.is_authenticated and state['user_id'] != request.user.id
+        ):
+            raise NotFound('Сессия не найдена')
+        
+        if state['status'] != TestSession.STATUS_IN_PROGRESS:
+            return Response({'error': 'Тест не начат'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if is_state_deadline_passed(state, grace_seconds=settings.SESSION_DEADLINE_GRACE_SECONDS):
+            return Response({'error': 'Время прохождения теста истекло'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        raw_entries = request.data.get('answers')
+        if not isinstance(raw_entries, list):
+            return Response({'error': 'answers должен быть списком'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_entries) > settings.ANSWER_JOURNAL_MAX_BATCH:
+            return Response({'error': f'Не более {settings.ANSWER_JOURNAL_MAX_BATCH} ответов за запрос'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        entries, rejected = parse_entries(raw_entries)
+        try:
+            result = apply_entries(state, entries, rejected)
+        except JournalError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({'error': f'Ошибка сохранения ответов: {str(e)}'}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        if session.status != TestSession.STATUS_IN_PROGRESS:
-            return Response({'error': 'Тест не в процессе выполнения'}, 
+        return Response(result)
+    
+    def _submit_packed_answer(self, state, question_number, answer_value):
+        """Записать ответ в упакованный массив сессии"""
+        test_type = state['test__test_type']
+        if not 1 <= question_number <= state['test__questions_count']:
+            return Response({'error': 'Неверный номер вопроса'}, 
                           status=status.HTTP_400_BAD_REQUEST)
+        try:
+            saved = save_packed_answer(state['id'], test_type, question_number, answer_value)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not saved:
+            return Response({'error': 'Тест не начат'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'session': state['id'],
+            'question_number': question_number,
+            'answer_value': str(answer_value),
+            'series': raven_series(question_number) if test_type == 'iq_test' else '',
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['post'], permission_classes=[AllowAny])
+    def complete(self, request, pk=None):
+        """
+        Завершить тест и обработать результаты
         
-        session.complete_test()
+        Запрос идемпотентен: обработку захватывает только первый запрос
+        (статус «Обработка результатов»), повторные получают 202, пока
+        обработка идет, и готовый результат после ее окончания.
+        """
+        session = self.get_candidate_session()
         
-        # Получение всех ответов
-        answers = TestAnswer.objects.filter(session=session).order_by('question_number')
-        answers_data = [
-            {
-                'question_number': answer.question_number,
-                'answer': answer.answer_value,
-                'series': answer.series
-            }
-            for answer in answers
-        ]
+        if is_overdue(session):
+            return Response({'error': 'Время прохождения теста истекло'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        if not session.claim_processing(settings.SESSION_PROCESSING_STALE_SECONDS):
+            data, status_code = unclaimed_completion_response(session)
+            return Response(data, status=status_code)
         
         # Обработка результатов в зависимости от типа теста
-        result_data = {}
         try:
-            if session.test.test_type == 'iq_test':
-                # Преобразование ответов для IQ теста
-                raven_answers = []
-                for a in answers_data:
-                    try:
-                        answer_value = int(a['answer'])
-                        if 1 <= answer_value <= 6:
-                            raven_answers.append({
-                                'question_number': a['question_number'],
-                                'answer': answer_value
-                            })
-                    except (ValueError, TypeError):
-                        continue
-                
-                if raven_answers:
-                    result_data = process_raven_test(session, raven_answers)
-                else:
-                    return Response({'error': 'Нет валидных ответов для обработки'}, 
-                                  status=status.HTTP_400_BAD_REQUEST)
-                    
-            elif session.test.test_type == 'personal_qualities':
-                # Обработка теста личностных качеств
-                # Получаем вопросы с их типами и блоками
-                from .models import TestQuestion
-                questions = TestQuestion.objects.filter(test=session.test).select_related()
-                question_map = {q.question_number: q for q in questions}
-                
-                # Формируем ответы с информацией о блоках и типах
-                formatted_answers = []
-                for a in answers_data:
-                    q_num = a['question_number']
-                    question = question_map.get(q_num)
-                    if question:
-                        formatted_answers.append({
-                            'question_number': q_num,
-                            'answer': a['answer'],
-                            'block_name': question.block_name or '',
-                            'question_type': question.question_type or '+',
-                        })
-                    else:
-                        formatted_answers.append({
-                            'question_number': q_num,
-                            'answer': a['answer'],
-                            'block_name': '',
-                            'question_type': '+',
-                        })
-                
-                result_data = process_personal_qualities_test(formatted_answers)
-                
-            elif session.test.test_type == 'productivity':
-                # Обработка теста продуктивности
-                result_data = process_productivity_test(answers_data)
-            else:
-                return Response({'error': 'Неизвестный тип теста'}, 
-                              status=status.HTTP_400_BAD_REQUEST)
+            result_data = process_session_results(session)
+        except ResultProcessingError as e:
+            session.release_processing()
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            session.release_processing()
             return Response({'error': f'Ошибка обработки результатов: {str(e)}'}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # Создание результата
         if not result_data:
+            session.release_processing()
             return Response({'error': 'Не удалось обработать результаты'}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        test_result = TestResult.objects.create(
-            session=session,
-            raw_score=result_data.get('raw_score'),
-            final_score=result_data.get('final_score'),
-            iq_score=result_data.get('iq_score'),
-            iq_level=result_data.get('iq_level', ''),
-            scores_json=result_data.get('scores_json', {}),
-            report=result_data.get('report', ''),
-            report_json=result_data.get('report_json', {}),
-            is_processed=True,
-            processed_at=timezone.now()
-        )
-        
-        # Отправка email пользователю с результатами
-        if session.user:
-            try:
-                send_mail(
-                    f'Результаты тестирования: {session.candidate_email}',
-                    f'Результаты тестирования для {session.candidate_email}:\n\n'
-                    f'{test_result.report}',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [session.user.email],
-                    fail_silently=True,  # Не прерывать выполнение при ошибке email
-                )
-            except Exception as e:
-                # Логируем ошибку, но не прерываем выполнение
-                import logging
-                import traceback
-                logger = logging.getLogger(__name__)
-                error_details = f"""
-ОШИБКА ОТПРАВКИ EMAIL (сессия {session.id}):
-Получатель: {session.user.email if session.user else 'N/A'}
-Отправитель: {settings.DEFAULT_FROM_EMAIL}
-Ошибка: {str(e)}
-Тип ошибки: {type(e).__name__}
-Traceback:
-{traceback.format_exc()}
-"""
-                logger.error(error_details)
+        test_result = save_session_result(session, result_data)
         
         serializer = TestResultSerializer(test_result)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def progress(self, request, pk=None):
+        """Ход прохождения теста: число ответов и промежуточные баллы"""
+        session = self.get_candidate_session()
+        
+        return Response({
+            'id': session.id,
+            'status': session.status,
+            'started_at': session.started_at,
+            'expires_at': session.expires_at,
+            'answers_count': session.get_answers_count(),
+            'questions_count': session.test.questions_count,
+            'scores': get_running_scores(session),
+        })
+    
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_sessions(self, request):
         """Получить все сессии текущего пользователя"""
@@ -555,18 +603,7 @@ Traceback:
             # Генерация PDF на сервере
             pdf_buffer = generate_pdf_report(result_data)
             
-            # Формирование имени файла
-            candidate_name = session.candidate_name or session.candidate_email
-            safe_name = "".join(c for c in candidate_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            safe_name = safe_name.replace(' ', '_')
-            test_name = session.test.name.replace(' ', '_')
-            date_str = timezone.now().strftime('%Y-%m-%d')
-            filename = f"Отчет_{safe_name}_{test_name}_{date_str}.pdf"
-            
-            # Создание HTTP ответа
-            response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename*=UTF-8\'\'{filename}'
-            return response
+            return pdf_report_response(session, pdf_buffer)
             
         except TestResult.DoesNotExist:
             return Response({'error': 'Результаты теста не найдены'}, 
@@ -584,3 +621,22 @@ class TestResultViewSet(viewsets.ReadOnlyModelViewSet):
     
     def get_queryset(self):
         return TestResult.objects.filter(session__user=self.request.user).order_by('-created_at')
+
+
+class LLMUsageViewSet(viewsets.ViewSet):
+    """Сводка журнала вызовов LLM по типам тестов (для администраторов)"""
+    permission_classes = [IsAdminUser]
+    
+    def list(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+        except (ValueError, TypeError):
+            return Response({'error': 'days должен быть числом'}, 
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        from datetime import timedelta
+        since = timezone.now() - timedelta(days=days) if days > 0 else None
+        return Response({
+            'days': days,
+            'by_test_type': get_usage_summary(since),
+        })